@@ -1,16 +1,19 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
 from sqlalchemy.orm import Session
 from app.db.session import get_db
-from app.schemas.chat import ChatSessionOut, ChatMessageCreate
+from app.schemas.chat import ChatSessionOut, ChatMessageCreate, ChatBatchCreate, ChatBatchOut
 from app.models.user import User
 from app.api.deps import get_current_active_user
 from app.services.chat_service import (
     create_chat_session_helper,
     send_chat_message_helper,
+    answer_batch_helper,
+    stream_chat_message_helper,
     get_chat_sessions_helper,
     get_chat_history_helper,
     delete_chat_session_helper,
-    get_all_sessions_helper
+    get_all_sessions_helper,
+    get_rag_stats_helper
 )
 
 
@@ -32,13 +35,39 @@ def create_chat_session(
 # SEND MESSAGE IN CHAT SESSION
 # ============================================
 @router.post('/session/{session_id}/message')
-def send_chat_message(
+async def send_chat_message(
     session_id: int, 
     message: ChatMessageCreate, 
     db: Session = Depends(get_db), 
     current_user: User = Depends(get_current_active_user)
 ):
-    return send_chat_message_helper(session_id, message, db, current_user)
+    return await send_chat_message_helper(session_id, message, db, current_user)
+
+
+# ============================================
+# ASK MANY QUESTIONS AT ONCE
+# ============================================
+@router.post('/batch', response_model=ChatBatchOut)
+async def answer_batch(
+    batch: ChatBatchCreate, 
+    db: Session = Depends(get_db), 
+    current_user: User = Depends(get_current_active_user)
+):
+    return await answer_batch_helper(batch, db, current_user)
+
+
+# ============================================
+# SEND MESSAGE IN CHAT SESSION -> STREAM TOKENS (SSE)
+# ============================================
+@router.post('/session/{session_id}/message/stream')
+def stream_chat_message(
+    session_id: int, 
+    message: ChatMessageCreate, 
+    request: Request, 
+    db: Session = Depends(get_db), 
+    current_user: User = Depends(get_current_active_user)
+):
+    return stream_chat_message_helper(session_id, message, db, current_user, request)
 
 
 # ============================================
@@ -86,3 +115,13 @@ def get_all_sessions(
     current_user: User = Depends(get_current_active_user)
 ):
     return get_all_sessions_helper(db, current_user)
+
+
+# ============================================
+# RAG CACHE STATS (ADMIN ONLY)
+# ============================================
+@router.get("/admin/rag-stats")
+def get_rag_stats(
+    current_user: User = Depends(get_current_active_user)
+):
+    return get_rag_stats_helper(current_user)
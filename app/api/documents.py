@@ -1,11 +1,12 @@
+from typing import Optional
 from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
 from sqlalchemy.orm import Session
 from app.db.session import get_db
-from app.schemas.document import DocumentOut, DocumentListOut
+from app.schemas.document import DocumentOut, DocumentListOut, DocumentStatusOut, BulkUploadOut
 from app.models.user import User
 from app.models.document import Document
 from app.api.deps import require_admin_staff, require_admin
-from app.services.document_service import upload_document, search_document, list_all_documents, delete_document
+from app.services.document_service import upload_document, update_document, bulk_upload_documents, search_document, list_all_documents, delete_document, get_ingestion_status
 
 
 router = APIRouter()
@@ -14,7 +15,7 @@ router = APIRouter()
 # ============================================
 #  ADMIN & STAFF -> UPLOAD DOCUMENT
 # ============================================
-@router.post('/upload', response_model=DocumentOut)
+@router.post('/upload', response_model=DocumentOut, status_code=202)
 def upload_doc(
     file: UploadFile = File(...), 
     access_level: int = Form(...), 
@@ -24,6 +25,46 @@ def upload_doc(
     return upload_document(file, access_level, db, user)
 
 
+# ============================================
+#  ADMIN & STAFF -> UPDATE DOCUMENT (re-embeds only changed chunks)
+# ============================================
+@router.put('/update/{doc_id}', response_model=DocumentOut, status_code=202)
+def update_doc(
+    doc_id: int, 
+    file: UploadFile = File(...), 
+    access_level: Optional[int] = Form(None), 
+    db: Session = Depends(get_db), 
+    user: User = Depends(require_admin_staff)
+):
+    return update_document(doc_id, file, access_level, db, user)
+
+
+# ============================================
+#  ADMIN & STAFF -> BULK UPLOAD (MANY FILES / ZIP), ingested in the background
+# ============================================
+@router.post('/bulk_upload', response_model=BulkUploadOut, status_code=202)
+def bulk_upload_docs(
+    files: list[UploadFile] = File(...), 
+    access_level: Optional[int] = Form(None), 
+    manifest: Optional[str] = Form(None, description='JSON object of filename -> access level'), 
+    db: Session = Depends(get_db), 
+    user: User = Depends(require_admin_staff)
+):
+    return bulk_upload_documents(files, access_level, manifest, db, user)
+
+
+# ============================================
+#  ADMIN & STAFF -> POLL INGESTION STATUS
+# ============================================
+@router.get('/status/{doc_id}', response_model=DocumentStatusOut)
+def ingestion_status(
+    doc_id: int, 
+    db: Session = Depends(get_db), 
+    user: User = Depends(require_admin_staff)
+):
+    return get_ingestion_status(doc_id, db, user)
+
+
 # ============================================
 # ADMIN & STAFF -> SEARCH DOCUMENTS
 # ============================================
@@ -17,5 +17,110 @@ INITIAL_STAFF_PASSWORD = os.getenv('INITIAL_STAFF_PASSWORD')
 INITIAL_USER_EMAIL = os.getenv('INITIAL_USER_EMAIL')
 INITIAL_USER_PASSWORD = os.getenv('INITIAL_USER_PASSWORD')
 
+# LLM provider
+LLM_REPO_ID = os.getenv('LLM_REPO_ID', 'mistralai/Mistral-7B-Instruct-v0.2')
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 8))       # in-flight calls per provider
+
+# LLM resilience
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', 30))            # one attempt
+LLM_DEADLINE_SECONDS = float(os.getenv('LLM_DEADLINE_SECONDS', 60))          # all attempts of one call
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 2))
+LLM_RETRY_BASE_DELAY = float(os.getenv('LLM_RETRY_BASE_DELAY', 0.5))         # seconds, doubled per retry (with jitter)
+LLM_RETRY_MAX_DELAY = float(os.getenv('LLM_RETRY_MAX_DELAY', 4))
+LLM_CIRCUIT_FAILURES = int(os.getenv('LLM_CIRCUIT_FAILURES', 5))             # failures in a row that open the circuit
+LLM_CIRCUIT_RESET_SECONDS = float(os.getenv('LLM_CIRCUIT_RESET_SECONDS', 30))
+LLM_MIN_CONCURRENCY = int(os.getenv('LLM_MIN_CONCURRENCY', 1))               # adaptive limit floor (ceiling = LLM_MAX_CONCURRENCY)
+LLM_LATENCY_TARGET_SECONDS = float(os.getenv('LLM_LATENCY_TARGET_SECONDS', 15))   # slower calls shrink the limit
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv('LLM_QUEUE_TIMEOUT_SECONDS', 5))     # wait for a slot, then 503
+
+# Chat pipeline
+CHAT_MAX_CONCURRENCY = int(os.getenv('CHAT_MAX_CONCURRENCY', 32))    # questions answered at once, process wide
+BATCH_MAX_QUESTIONS = int(os.getenv('BATCH_MAX_QUESTIONS', 200))      # questions per /chat/batch request
+BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', 8))    # questions of one batch answered at once
+# batch questions in flight across all batches; kept below LLM_MAX_CONCURRENCY so chat questions always find a free LLM slot
+BATCH_SHARED_CONCURRENCY = int(os.getenv('BATCH_SHARED_CONCURRENCY', max(1, LLM_MAX_CONCURRENCY // 4)))
+SINGLE_FLIGHT_ENABLED = os.getenv('SINGLE_FLIGHT_ENABLED', 'true').lower() == 'true'   # identical concurrent questions share one answer
+
+# Semantic answer cache
+ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'true').lower() == 'true'
+ANSWER_CACHE_THRESHOLD = float(os.getenv('ANSWER_CACHE_THRESHOLD', 0.95))     # cosine similarity to reuse an answer
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', 1000))   # per access-level partition
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv('ANSWER_CACHE_TTL_SECONDS', 3600))
+
+# Session candidate cache -> follow-ups re-score the last search's candidates instead of searching again
+SESSION_CACHE_ENABLED = os.getenv('SESSION_CACHE_ENABLED', 'true').lower() == 'true'
+SESSION_CACHE_THRESHOLD = float(os.getenv('SESSION_CACHE_THRESHOLD', 0.5))     # best cached score needed to reuse
+SESSION_CACHE_TTL_SECONDS = int(os.getenv('SESSION_CACHE_TTL_SECONDS', 900))
+SESSION_CACHE_MAX_SESSIONS = int(os.getenv('SESSION_CACHE_MAX_SESSIONS', 1000))
+SESSION_CACHE_CANDIDATES = int(os.getenv('SESSION_CACHE_CANDIDATES', 30))      # chunks kept per session
+
+# Background ingestion
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', 2))
+INGEST_QUEUE_SIZE = int(os.getenv('INGEST_QUEUE_SIZE', 100))      # waiting jobs before uploads get a 503
+
+# Embedding during ingestion
+EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', 64))          # chunks per embed + store call
+EMBED_MAX_INFLIGHT = int(os.getenv('EMBED_MAX_INFLIGHT', 2))       # batches held in memory at once
+EMBED_PROCESSES = int(os.getenv('EMBED_PROCESSES', 0))             # > 1 -> multi-process pool (CPU-only hosts)
+
+# Persistent embedding cache -> (model, text hash) -> vector
+EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE_ENABLED', 'true').lower() == 'true'
+EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', 'embedding_cache')
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', 100000))  # vectors kept on disk
+
+# Query embedding cache -> normalized question -> vector, in process
+QUERY_CACHE_ENABLED = os.getenv('QUERY_CACHE_ENABLED', 'true').lower() == 'true'
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv('QUERY_CACHE_MAX_ENTRIES', 2048))
+QUERY_CACHE_TTL_SECONDS = int(os.getenv('QUERY_CACHE_TTL_SECONDS', 600))
+
+# Vector store -> 'chroma' (chroma_db/), 'memmap' (NumPy, memory-mapped) or 'sharded' (memmap shards
+# in worker processes); switching needs a re-ingest
+VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'chroma')
+VECTOR_STORE_DIR = os.getenv('VECTOR_STORE_DIR', 'vector_index')     # memmap / sharded backend files
+VECTOR_SHARDS = int(os.getenv('VECTOR_SHARDS', 4))                   # processes, chunks split by document_id hash
+
+# memmap / sharded backends: scan 'float16' / 'int8' codes (of the first VECTOR_TRUNCATE_DIM dims, 0 = all) first,
+# then re-score the best k * VECTOR_RESCORE_FACTOR exactly from the float32 vectors
+# -> less RAM / page cache, more disk (the codes are kept next to the vectors); only int8 also searches faster
+VECTOR_QUANTIZATION = os.getenv('VECTOR_QUANTIZATION', 'none')
+VECTOR_TRUNCATE_DIM = int(os.getenv('VECTOR_TRUNCATE_DIM', 0))
+VECTOR_RESCORE_FACTOR = int(os.getenv('VECTOR_RESCORE_FACTOR', 4))
+
+# Retrieval
+RETRIEVAL_K = int(os.getenv('RETRIEVAL_K', 5))                     # chunks sent to the LLM
+HYBRID_SEARCH_ENABLED = os.getenv('HYBRID_SEARCH_ENABLED', 'true').lower() == 'true'
+HYBRID_CANDIDATES = int(os.getenv('HYBRID_CANDIDATES', 20))        # per retriever, before fusion
+RRF_K = int(os.getenv('RRF_K', 60))                                # reciprocal rank fusion constant
+KEYWORD_INDEX_DIR = os.getenv('KEYWORD_INDEX_DIR', 'keyword_index')
+KEYWORD_MAX_DF = float(os.getenv('KEYWORD_MAX_DF', 0.5))         # BM25 skips terms found in more of the chunks than this
+DOCUMENT_ROUTING_ENABLED = os.getenv('DOCUMENT_ROUTING_ENABLED', 'false').lower() == 'true'
+ROUTING_TOP_DOCUMENTS = int(os.getenv('ROUTING_TOP_DOCUMENTS', 5))   # documents whose chunks are searched
+ROUTING_INDEX_DIR = os.getenv('ROUTING_INDEX_DIR', 'routing_index')
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 1500))  # tokens of document context per prompt
+
+# Adaptive k: every chunk above the score threshold, up to RETRIEVAL_MAX_K (score = cosine similarity)
+RETRIEVAL_ADAPTIVE_K = os.getenv('RETRIEVAL_ADAPTIVE_K', 'false').lower() == 'true'
+RETRIEVAL_SCORE_THRESHOLD = float(os.getenv('RETRIEVAL_SCORE_THRESHOLD', 0.35))
+RETRIEVAL_MAX_K = int(os.getenv('RETRIEVAL_MAX_K', 8))
+
+# MMR: trade relevance (lambda=1) for diversity (lambda=0) among MMR_CANDIDATES chunks
+RETRIEVAL_MMR = os.getenv('RETRIEVAL_MMR', 'false').lower() == 'true'
+MMR_LAMBDA = float(os.getenv('MMR_LAMBDA', 0.5))
+MMR_CANDIDATES = int(os.getenv('MMR_CANDIDATES', 20))
+
+# Reranking -> 'none', 'cross-encoder' or 'package.module:function'
+RERANKER = os.getenv('RERANKER', 'none')
+RERANKER_MODEL = os.getenv('RERANKER_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+RERANK_CANDIDATES = int(os.getenv('RERANK_CANDIDATES', 20))        # N fetched, the best RETRIEVAL_K are kept
+RERANK_BATCH_SIZE = int(os.getenv('RERANK_BATCH_SIZE', 32))
+RERANK_LATENCY_BUDGET_MS = int(os.getenv('RERANK_LATENCY_BUDGET_MS', 500))  # skip reranking past this
+RERANK_PROBE_EVERY = int(os.getenv('RERANK_PROBE_EVERY', 20))      # while skipping, every n-th request reranks to re-measure
+
+# Bulk upload
+BULK_PARSE_WORKERS = int(os.getenv('BULK_PARSE_WORKERS', 4))       # processes parsing + splitting files in parallel
+BULK_PARSE_MAX_PAGES = int(os.getenv('BULK_PARSE_MAX_PAGES', 200))  # bigger PDFs are streamed page by page instead
+BULK_ZIP_MAX_MEMBERS = int(os.getenv('BULK_ZIP_MAX_MEMBERS', 5000))  # files per ZIP archive
+BULK_ZIP_MAX_BYTES = int(os.getenv('BULK_ZIP_MAX_BYTES', 1024 ** 3))  # uncompressed size per ZIP archive (zip bombs)
+
 # Set HuggingFace token in environment
 os.environ['HUGGINGFACEHUB_API_TOKEN'] = HUGGINGFACEHUB_API_TOKEN
@@ -1,5 +1,6 @@
 from app.db.session import create_database_if_not_exists, engine, Base, Local_session
 from app.core.config import INITIAL_ADMIN_EMAIL, INITIAL_ADMIN_PASSWORD, INITIAL_STAFF_EMAIL, INITIAL_STAFF_PASSWORD, INITIAL_USER_EMAIL, INITIAL_USER_PASSWORD
+from sqlalchemy import inspect, text
 from sqlalchemy.orm import Session
 from app.models.user import User
 
@@ -11,6 +12,9 @@ def prepare_database():
     
     # Create all tables
     Base.metadata.create_all(bind=engine)
+
+    # create_all never alters existing tables -> add columns introduced since
+    add_missing_columns()
     
     # Note: Add your default user insertion logic here if needed
     seed_initial_users()
@@ -19,6 +23,28 @@ def prepare_database():
 
 
 
+# table -> (column, DDL) added after the table first shipped; the DDL default fills the existing rows
+ADDED_COLUMNS = {
+    'document': [
+        # documents from before the ingestion queue were ingested during the upload -> completed
+        ('status', "VARCHAR(20) DEFAULT 'completed'"),
+        ('progress', 'INTEGER DEFAULT 100'),
+        ('error', 'TEXT NULL')
+    ]
+}
+
+
+def add_missing_columns():
+    """Idempotent: only columns the table does not have yet are added"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table, columns in ADDED_COLUMNS.items():
+            existing = {column['name'] for column in inspector.get_columns(table)}
+            for name, ddl in columns:
+                if name not in existing:
+                    conn.execute(text(f'ALTER TABLE `{table}` ADD COLUMN `{name}` {ddl}'))
+
+
 def seed_initial_users():
     db:Session = Local_session()
 
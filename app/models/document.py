@@ -1,5 +1,5 @@
 from app.db.session import Base
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text
 from datetime import datetime
 
 
@@ -15,3 +15,8 @@ class Document(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)    # deletion time
     is_deleted = Column(Boolean, default=False)
+
+    # background ingestion
+    status = Column(String(20), default='queued')   # queued    processing    completed    failed
+    progress = Column(Integer, default=0)           # 0-100
+    error = Column(Text, nullable=True)
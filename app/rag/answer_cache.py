@@ -0,0 +1,130 @@
+import threading
+import time
+import numpy as np
+from app.core.config import ANSWER_CACHE_ENABLED, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL_SECONDS
+
+
+def _normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class _Partition:
+    """Cached answers visible to exactly one set of access levels"""
+
+    def __init__(self):
+        self.vectors = None         # (n, dim) unit vectors of the cached questions
+        self.entries = []           # dicts: answer, document_ids, latency, created_at
+
+    def add(self, vector: np.ndarray, entry: dict, max_entries: int):
+        row = vector[np.newaxis, :]
+        self.vectors = row if self.vectors is None else np.vstack([self.vectors, row])
+        self.entries.append(entry)
+        if len(self.entries) > max_entries:     # drop the oldest
+            self.keep(np.arange(len(self.entries)) >= len(self.entries) - max_entries)
+
+    def keep(self, mask: np.ndarray):
+        self.entries = [e for e, k in zip(self.entries, mask) if k]
+        self.vectors = self.vectors[mask] if self.entries else None
+
+
+class SemanticAnswerCache:
+    """
+    Reuse answers for questions that mean the same thing.
+    Partitions are keyed by the exact allowed access levels, so an answer built
+    from admin documents is never served to a staff member or a public user.
+    Every invalidation bumps generation: an answer computed from before it (still in flight
+    while a document was deleted or re-leveled) is not stored.
+    """
+
+    def __init__(self, threshold: float, max_entries: int, ttl_seconds: int, enabled: bool = True):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._partitions: dict[tuple, _Partition] = {}
+        self._lock = threading.Lock()
+        self.generation = 0         # read before lookup, handed back to store
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+
+    @staticmethod
+    def _key(allowed_levels) -> tuple:
+        return tuple(sorted(set(allowed_levels)))
+
+    def lookup(self, query_embedding, allowed_levels) -> str | None:
+        if not self.enabled:
+            return None
+        vector = _normalize(query_embedding)
+        with self._lock:
+            partition = self._partitions.get(self._key(allowed_levels))
+            if partition is not None and partition.entries:
+                # expire old answers first
+                now = time.time()
+                fresh = np.array([now - e['created_at'] < self.ttl_seconds for e in partition.entries])
+                if not fresh.all():
+                    partition.keep(fresh)
+
+            if partition is not None and partition.entries:
+                scores = partition.vectors @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    entry = partition.entries[best]
+                    self.hits += 1
+                    self.latency_saved += entry['latency']
+                    return entry['answer']
+            self.misses += 1
+            return None
+
+    def store(self, query_embedding, allowed_levels, answer: str, document_ids, latency: float, generation: int = None):
+        """generation -> the value read before the lookup; the answer is dropped if an invalidation ran since"""
+        if not self.enabled:
+            return
+        entry = {
+            'answer': answer,
+            'document_ids': set(document_ids),
+            'latency': latency,
+            'created_at': time.time()
+        }
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            partition = self._partitions.setdefault(self._key(allowed_levels), _Partition())
+            partition.add(_normalize(query_embedding), entry, self.max_entries)
+
+    def invalidate_document(self, document_id: int):
+        """Drop every answer that was built from this document"""
+        with self._lock:
+            self.generation += 1
+            for partition in self._partitions.values():
+                if partition.entries:
+                    partition.keep(np.array([document_id not in e['document_ids'] for e in partition.entries]))
+
+    def invalidate_access_level(self, access_level: int):
+        """A new document at this level may change answers in every partition that can see it"""
+        with self._lock:
+            self.generation += 1
+            for key in [k for k in self._partitions if access_level in k]:
+                del self._partitions[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': sum(len(p.entries) for p in self._partitions.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'latency_saved_seconds': round(self.latency_saved, 3)
+            }
+
+
+answer_cache = SemanticAnswerCache(
+    threshold=ANSWER_CACHE_THRESHOLD,
+    max_entries=ANSWER_CACHE_MAX_ENTRIES,
+    ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+    enabled=ANSWER_CACHE_ENABLED
+)
@@ -0,0 +1,76 @@
+import logging
+from app.core.config import CONTEXT_TOKEN_BUDGET
+
+
+logger = logging.getLogger(__name__)
+
+MAX_OVERLAP = 250           # ingestion splits with chunk_overlap=200
+MIN_OVERLAP = 20            # shorter matches are probably a coincidence
+
+
+def count_tokens(text: str) -> int:
+    # ~4 characters per token for English text, good enough for budgeting
+    return (len(text) + 3) // 4
+
+
+def _strip_overlap(left: str, right: str) -> str:
+    """right without the beginning it shares with the end of left"""
+    for size in range(min(len(left), len(right), MAX_OVERLAP), MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return right[size:]
+    return '\n' + right
+
+
+def _merge_adjacent(hits) -> list[tuple[int, str]]:
+    """
+    Neighbouring chunks (same document_id, consecutive chunk_index) become one passage without the repeated overlap.
+    A passage keeps the best rank (position in hits) of its chunks.
+    """
+    runs = {}
+    for rank, hit in enumerate(hits):
+        runs.setdefault(hit.metadata.get('document_id'), []).append((rank, hit))
+
+    passages = []
+    for doc_hits in runs.values():
+        doc_hits.sort(key=lambda ranked: ranked[1].metadata.get('chunk_index', 0))
+        text, best_rank, last_index = None, 0, None
+        for rank, hit in doc_hits:
+            index = hit.metadata.get('chunk_index')
+            if text is not None and index is not None and last_index is not None and index == last_index + 1:
+                text += _strip_overlap(text, hit.text)
+                best_rank = min(best_rank, rank)
+            else:
+                if text is not None:
+                    passages.append((best_rank, text))
+                text, best_rank = hit.text, rank
+            last_index = index
+        passages.append((best_rank, text))
+    return passages
+
+
+# ============================================
+#  CONTEXT PACKING
+# ============================================
+def pack_context(hits, token_budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    """
+    Merge neighbouring chunks, then fill the token budget in the order retrieval ranked them
+    (fused BM25 + dense rank, or the reranker's) -> the lowest ranked passages are dropped first
+    """
+    raw_tokens = count_tokens('\n\n'.join(hit.text for hit in hits))
+    passages = sorted(_merge_adjacent(hits))
+
+    packed, used = [], 0
+    for _, text in passages:
+        tokens = count_tokens(text)
+        if used + tokens > token_budget:
+            continue        # a smaller passage further down may still fit
+        packed.append(text)
+        used += tokens
+
+    # the best passage alone is over budget -> send as much of it as fits
+    if not packed and passages:
+        packed.append(passages[0][1][:token_budget * 4])
+
+    context = '\n\n'.join(packed)
+    logger.info('Context packed: %d -> %d tokens (%d saved)', raw_tokens, count_tokens(context), raw_tokens - count_tokens(context))
+    return context
@@ -0,0 +1,162 @@
+import os
+import threading
+import numpy as np
+
+
+# ============================================
+#  DOCUMENT ROUTING INDEX
+# ============================================
+class DocumentRoutingIndex:
+    """
+    One vector per document: the normalized centroid of its chunk embeddings. Retrieval ranks the
+    documents a user may read by centroid similarity first, then searches chunks of the best M only,
+    so the chunk search stays the same size however many documents are stored.
+    Per document it keeps the running sum of its unit chunk vectors and their count, so ingestion adds
+    (and re-ingestion subtracts) one batch at a time and never loads a whole document's vectors.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, 'centroids.npz')
+        self._lock = threading.Lock()
+        self._documents: dict[int, list] = {}      # document id -> [access level, sum of unit chunk vectors, chunk count]
+        self._matrix = None         # stacked centroids for routing, rebuilt after changes
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        data = np.load(self.path, allow_pickle=False)
+        if 'sums' not in data:
+            return      # older file with centroids only -> can't be updated incrementally, rebuilt from the store
+        for document_id, level, total, count in zip(data['document_ids'], data['access_levels'], data['sums'], data['counts']):
+            self._documents[int(document_id)] = [int(level), total, int(count)]
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = self.path + '.tmp.npz'
+            documents = list(self._documents.items())
+            np.savez(
+                tmp_path,
+                document_ids=np.array([d for d, _ in documents], dtype=np.int64),
+                access_levels=np.array([entry[0] for _, entry in documents], dtype=np.int8),
+                sums=np.array([entry[1] for _, entry in documents], dtype=np.float32),
+                counts=np.array([entry[2] for _, entry in documents], dtype=np.int64)
+            )
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+    def clear(self):
+        """Forget every document and the file (routing is off -> the index would go stale)"""
+        with self._lock:
+            self._documents = {}
+            self._matrix = None
+            self._dirty = False
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    # ---------- updates ----------
+    @staticmethod
+    def _group(metadatas, vectors) -> dict:
+        """document id -> (access level, sum of the unit vectors, count)"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(metadatas), -1)
+        vectors = vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+        document_ids = np.array([m['document_id'] for m in metadatas], dtype=np.int64)
+        groups = {}
+        for document_id in np.unique(document_ids).tolist():
+            rows = np.flatnonzero(document_ids == document_id)
+            groups[document_id] = (metadatas[rows[0]]['access_level'], vectors[rows].sum(axis=0), len(rows))
+        return groups
+
+    def add_chunks(self, metadatas: list[dict], vectors):
+        """Add newly stored chunks to their documents' centroids (a known document keeps its access level)"""
+        if not len(metadatas):
+            return
+        groups = self._group(metadatas, vectors)
+        with self._lock:
+            for document_id, (level, total, count) in groups.items():
+                entry = self._documents.get(document_id)
+                if entry is None:
+                    self._documents[document_id] = [level, total, count]
+                else:
+                    entry[1] = entry[1] + total
+                    entry[2] += count
+            self._matrix = None
+            self._dirty = True
+
+    def remove_chunks(self, metadatas: list[dict], vectors):
+        """Take deleted chunks out of their documents' centroids"""
+        if not len(metadatas):
+            return
+        groups = self._group(metadatas, vectors)
+        with self._lock:
+            for document_id, (_, total, count) in groups.items():
+                entry = self._documents.get(document_id)
+                if entry is None:
+                    continue
+                entry[1] = entry[1] - total
+                entry[2] -= count
+                if entry[2] <= 0:
+                    del self._documents[document_id]
+            self._matrix = None
+            self._dirty = True
+
+    def set_access_level(self, document_id: int, access_level: int):
+        with self._lock:
+            entry = self._documents.get(document_id)
+            if entry is not None and entry[0] != access_level:
+                entry[0] = access_level
+                self._matrix = None
+                self._dirty = True
+
+    def remove_document(self, document_id: int):
+        with self._lock:
+            if self._documents.pop(document_id, None) is not None:
+                self._matrix = None
+                self._dirty = True
+
+    def __len__(self):
+        return len(self._documents)
+
+    # ---------- routing ----------
+    def route(self, query_embedding, allowed_levels: list[int], top_documents: int, document_ids: list[int] = None) -> list[int] | None:
+        """
+        Ids of the top_documents readable documents (among document_ids if given) closest to the query,
+        None when that is all of them anyway
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) + 1e-12)
+        with self._lock:
+            if self._matrix is None:
+                ids = list(self._documents)
+                centroids = np.array([self._documents[d][1] for d in ids], dtype=np.float32).reshape(len(ids), -1)
+                centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+                self._matrix = (
+                    np.array(ids, dtype=np.int64),
+                    np.array([self._documents[d][0] for d in ids], dtype=np.int8),
+                    centroids
+                )
+            ids, levels, centroids = self._matrix
+
+        allowed = np.isin(levels, allowed_levels)
+        if document_ids is not None:
+            allowed &= np.isin(ids, document_ids)
+        candidates = np.flatnonzero(allowed)
+        if len(candidates) <= top_documents:
+            return None
+        scores = centroids[candidates] @ query
+        best = np.argpartition(-scores, top_documents - 1)[:top_documents]
+        return ids[candidates[best]].tolist()
+
+
+def rebuild_from_vector_store(index: DocumentRoutingIndex, store, page_size: int = 1000):
+    """Centroids for documents that were stored before the routing index existed, page_size vectors at a time"""
+    ids = store.get(include=[])['ids']
+    for start in range(0, len(ids), page_size):
+        page = store.get(ids=ids[start:start + page_size], include=['metadatas', 'embeddings'])
+        index.add_chunks(page['metadatas'], page['embeddings'])
+    index.save()
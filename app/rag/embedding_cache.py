@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+# ============================================
+#  PERSISTENT EMBEDDING CACHE
+# ============================================
+class DiskEmbeddingCache:
+    """
+    (model id, text hash) -> vector, kept across restarts.
+    Vectors live in a memory-mapped float32 file with a fixed number of slots; a JSON index maps
+    keys to slots in least-recently-used order, and the oldest key gives up its slot when full.
+    Each slot also records the key it holds, and reads check it: the index is only written every
+    flush_every entries, so after a crash it can point at a slot that was given to another key since.
+    """
+
+    def __init__(self, directory: str, model_id: str, max_entries: int, flush_every: int = 1000):
+        self.directory = directory
+        self.model_id = model_id
+        self.max_entries = max_entries
+        self.flush_every = flush_every
+        self._vectors_path = os.path.join(directory, 'vectors.f32')
+        self._index_path = os.path.join(directory, 'index.json')
+        self._keys_path = os.path.join(directory, 'keys.bin')
+        self._slots = OrderedDict()         # key -> slot, least recently used first
+        self._vectors = None
+        self._keys = None                   # memmap (max_entries, 16) bytes of the key in each slot
+        self._free = []                     # slots given back by stale index entries
+        self._next_slot = 0                 # slots from here on were never used
+        self.dim = None
+        self._dirty = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self):
+        if not all(os.path.exists(path) for path in (self._index_path, self._vectors_path, self._keys_path)):
+            return
+        with open(self._index_path) as f:
+            index = json.load(f)
+        # different model or size -> the cached vectors are useless, start over on the first write
+        if index['model_id'] != self.model_id or index['max_entries'] != self.max_entries:
+            return
+        self.dim = index['dim']
+        self._slots = OrderedDict(index['slots'])
+        self._next_slot = max(self._slots.values(), default=-1) + 1
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r+', shape=(self.max_entries, self.dim))
+        self._keys = np.memmap(self._keys_path, dtype=np.uint8, mode='r+', shape=(self.max_entries, 16))
+
+    def _create(self, dim: int):
+        os.makedirs(self.directory, exist_ok=True)
+        self.dim = dim
+        self._slots = OrderedDict()
+        self._free, self._next_slot = [], 0
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='w+', shape=(self.max_entries, dim))
+        self._keys = np.memmap(self._keys_path, dtype=np.uint8, mode='w+', shape=(self.max_entries, 16))
+
+    @staticmethod
+    def _key_bytes(key: str):
+        return np.frombuffer(bytes.fromhex(key), dtype=np.uint8)
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f'{self.model_id}\0{text}'.encode('utf-8')).hexdigest()[:32]
+
+    def get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        found = {}
+        with self._lock:
+            if self._vectors is not None:
+                for key in keys:
+                    slot = self._slots.get(key)
+                    if slot is None:
+                        continue
+                    if not np.array_equal(self._keys[slot], self._key_bytes(key)):
+                        self._free.append(self._slots.pop(key))     # stale index entry from before a crash
+                        continue
+                    self._slots.move_to_end(key)
+                    found[key] = self._vectors[slot].tolist()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: dict[str, list[float]]):
+        with self._lock:
+            for key, vector in items.items():
+                if self._vectors is None:
+                    self._create(len(vector))
+                if key in self._slots or len(vector) != self.dim:
+                    continue
+                if self._free:
+                    slot = self._free.pop()
+                elif self._next_slot < self.max_entries:
+                    slot = self._next_slot
+                    self._next_slot += 1
+                else:
+                    _, slot = self._slots.popitem(last=False)     # evict least recently used
+                # clear the slot's key first: a crash mid-write leaves a slot no key matches
+                self._keys[slot] = 0
+                self._vectors[slot] = vector
+                self._keys[slot] = self._key_bytes(key)
+                self._slots[key] = slot
+            self._dirty += len(items)
+            if self._dirty >= self.flush_every:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._vectors is None or not self._dirty:
+            return
+        self._vectors.flush()
+        self._keys.flush()
+        index = {
+            'model_id': self.model_id,
+            'max_entries': self.max_entries,
+            'dim': self.dim,
+            'slots': list(self._slots.items())
+        }
+        # write + rename so a crash never leaves a half written index
+        tmp_path = self._index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self._index_path)
+        self._dirty = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': True,
+                'entries': len(self._slots),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+# ============================================
+#  QUERY EMBEDDING CACHE (IN PROCESS)
+# ============================================
+class QueryEmbeddingCache:
+    """Normalized question -> query vector, bounded by size (LRU) and age (TTL)"""
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()       # key -> (vector, stored_at), least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text: str) -> str:
+        # resubmits and retries differ in case / spacing only
+        return ' '.join(text.lower().split())
+
+    def get(self, text: str) -> list[float] | None:
+        key = self.key(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, text: str, vector: list[float]):
+        with self._lock:
+            self._entries[self.key(text)] = (vector, time.monotonic())
+            self._entries.move_to_end(self.key(text))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': True,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
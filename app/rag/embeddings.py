@@ -0,0 +1,110 @@
+import threading
+from langchain_core.embeddings import Embeddings
+from langchain_huggingface import HuggingFaceEmbeddings
+
+
+# ============================================
+#  POOLED EMBEDDINGS
+# ============================================
+class PooledEmbeddings(Embeddings):
+    """
+    HuggingFaceEmbeddings with a fixed batch size and, on CPU-only hosts, a long-lived
+    multi-process pool. HuggingFaceEmbeddings(multi_process=True) would start and stop
+    a pool on every call, which costs more than it saves for batch-sized calls.
+    """
+
+    def __init__(self, base: HuggingFaceEmbeddings, batch_size: int, processes: int = 0):
+        self.base = base
+        self.batch_size = batch_size
+        self.processes = processes
+        self._pool = None
+        self._pool_lock = threading.Lock()      # one pool, its input/output queues can't be shared by callers
+
+    def _encode_multi_process(self, texts: list[str]) -> list[list[float]]:
+        model = self.base._client       # the SentenceTransformer behind HuggingFaceEmbeddings
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = model.start_multi_process_pool(target_devices=['cpu'] * self.processes)
+            vectors = model.encode_multi_process(texts, self._pool, batch_size=self.batch_size)
+        return vectors.tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        if self.processes > 1:
+            return self._encode_multi_process(texts)
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self.base.embed_documents(texts[start:start + self.batch_size]))
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.base.embed_query(text)
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        # many questions -> batched forward passes, same vectors as embed_query (no instruction prefix)
+        return self.embed_documents(texts)
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self.base._client.stop_multi_process_pool(self._pool)
+                self._pool = None
+
+
+# ============================================
+#  DISK-CACHED EMBEDDINGS
+# ============================================
+class CachedEmbeddings(Embeddings):
+    """Look chunks up in the persistent embedding cache first, only embed what is missing"""
+
+    def __init__(self, inner: Embeddings, cache):
+        self.inner = inner
+        self.cache = cache
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self.cache.key(text) for text in texts]
+        vectors = self.cache.get_many(keys)
+        missing = [i for i, key in enumerate(keys) if key not in vectors]
+        if missing:
+            computed = dict(zip((keys[i] for i in missing), self.inner.embed_documents([texts[i] for i in missing])))
+            self.cache.put_many(computed)
+            vectors.update(computed)
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.inner.embed_query(text)
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        # questions stay out of the chunk cache
+        return self.inner.embed_queries(texts)
+
+
+# ============================================
+#  QUERY-CACHED EMBEDDINGS
+# ============================================
+class QueryCachedEmbeddings(Embeddings):
+    """Serve repeated / retried questions from the in-process query cache"""
+
+    def __init__(self, inner: Embeddings, cache):
+        self.inner = inner
+        self.cache = cache
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        vector = self.cache.get(text)
+        if vector is None:
+            vector = self.inner.embed_query(text)
+            self.cache.put(text, vector)
+        return vector
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        vectors = [self.cache.get(text) for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            for i, vector in zip(missing, self.inner.embed_queries([texts[i] for i in missing])):
+                self.cache.put(texts[i], vector)
+                vectors[i] = vector
+        return vectors
@@ -1,52 +1,334 @@
 import os
+import time
+import hashlib
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, ALL_COMPLETED
 from fastapi import HTTPException
-from langchain_community.document_loaders import TextLoader, PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from app.rag.vector_store import vector_store
+from app.rag.vector_store import vector_store, keyword_index, document_index
+from app.rag.loaders import load_and_split, iter_page_chunks, count_pages
+from app.rag.answer_cache import answer_cache
+from app.rag.session_cache import session_cache
+from app.core.config import EMBED_BATCH_SIZE, EMBED_MAX_INFLIGHT, BULK_PARSE_WORKERS, BULK_PARSE_MAX_PAGES, DOCUMENT_ROUTING_ENABLED
+
+
+logger = logging.getLogger(__name__)
 
 
 # ============================================
-#  UPLOAD DOCUMENT
+#  EMBED + STORE IN BATCHES
 # ============================================
-def ingest_document(file_path: str, document_id: int, access_level: int) -> None:
-    # Check file exists
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail=f'Document not found at {file_path}')
-    
-    # Load the document
-    ext = os.path.splitext(file_path)[1].lower()
-    loader_class = {'.pdf': PyPDFLoader, '.txt': TextLoader}
-    loader = loader_class.get(ext)(file_path)
-    if not loader_class:
-        raise Exception(f"Unsupported file type: {ext}")
-    document = loader.load()
-    if not document:
-        raise Exception(f"No content extracted from the document")
-
-    # Split into chunks
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,           # Smaller chunks for better retrieval
-        chunk_overlap=200,         # Overlap to maintain context
-        separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""],
-        length_function=len
-    )
-    chunks = splitter.split_documents(documents=document)
-    if not chunks:
-        raise Exception("No chunks created from document")
-    
-    # Add some extra metadata in each chunk
-    for i, chunk in enumerate(chunks):
+def _store_batch(batch) -> int:
+    ids = [c.id for c in batch]
+    texts = [c.page_content for c in batch]
+    metadatas = [c.metadata for c in batch]
+    vectors = vector_store.embedding_function.embed_documents(texts)
+    vector_store.add_embedded(ids, texts, vectors, metadatas)
+    keyword_index.add(ids, texts, metadatas)
+    if DOCUMENT_ROUTING_ENABLED:
+        # running centroid sums -> a document's vectors are never loaded back for routing
+        document_index.add_chunks(metadatas, vectors)
+    return len(ids)
+
+
+def _unroute_chunks(chunk_ids: list[str]):
+    """Take chunks that are about to be deleted out of the routing centroids, one batch of vectors at a time"""
+    if not DOCUMENT_ROUTING_ENABLED:
+        return
+    for start in range(0, len(chunk_ids), EMBED_BATCH_SIZE):
+        stored = vector_store.get(ids=chunk_ids[start:start + EMBED_BATCH_SIZE], include=['metadatas', 'embeddings'])
+        document_index.remove_chunks(stored['metadatas'], stored['embeddings'])
+
+
+def _batched(items, size: int):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def store_chunks(chunks, on_batch_stored=None) -> int:
+    """
+    Embed and store chunks EMBED_BATCH_SIZE at a time with at most EMBED_MAX_INFLIGHT
+    batches in flight, so memory stays flat no matter how big the document is.
+    chunks can be a generator: the next batch is only pulled once there's room for it.
+    on_batch_stored(stored_so_far) is called after each batch lands in the vector store.
+    """
+    stored = 0
+    with ThreadPoolExecutor(max_workers=EMBED_MAX_INFLIGHT, thread_name_prefix='embed') as pool:
+        inflight = set()
+
+        def drain(return_when):
+            nonlocal stored, inflight
+            done, inflight = wait(inflight, return_when=return_when)
+            for future in done:
+                stored += future.result()
+                if on_batch_stored:
+                    on_batch_stored(stored)
+
+        for batch in _batched(chunks, EMBED_BATCH_SIZE):
+            inflight.add(pool.submit(_store_batch, batch))
+            if len(inflight) >= EMBED_MAX_INFLIGHT:
+                drain(FIRST_COMPLETED)
+        if inflight:
+            drain(ALL_COMPLETED)
+    return stored
+
+
+def _add_metadata(chunks, file_path: str, document_id: int, access_level: int, first_index: int = 0, seen: dict = None):
+    """
+    Chunk id = document id + content hash (+ occurrence for repeated text), so the same text
+    always gets the same id -> re-ingesting an edited file can tell which chunks are unchanged.
+    seen counts hashes across calls when a document is labelled page by page.
+    """
+    seen = {} if seen is None else seen
+    for i, chunk in enumerate(chunks, first_index):
+        chunk_hash = hashlib.sha256(chunk.page_content.encode('utf-8')).hexdigest()[:16]
+        occurrence = seen.get(chunk_hash, 0)
+        seen[chunk_hash] = occurrence + 1
+        chunk.id = f'{document_id}-{chunk_hash}-{occurrence}'
         chunk.metadata.update({
             "document_id": document_id,
             "access_level": access_level,
             "chunk_index": i,
+            "chunk_hash": chunk_hash,
             "source": file_path
         })
+
+
+# ============================================
+#  UPLOAD DOCUMENT
+# ============================================
+def ingest_document(file_path: str, document_id: int, access_level: int, progress_callback=None) -> dict:
+    # progress_callback(percent) lets the background worker publish how far along we are
+    report = progress_callback or (lambda percent: None)
+    started = time.perf_counter()
+
+    # Check file exists
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail=f'Document not found at {file_path}')
     
-    # Add metadata+content of every chunk in vector store
-    added = vector_store.add_documents(documents=chunks)
-    if not added:
-        raise HTTPException(status_code=422, detail="Failed to add document to vector store")
+    # Pages stream into the splitter and chunks stream into the vector store in bounded batches
+    # -> only a few pages and EMBED_MAX_INFLIGHT batches are in memory, whatever the document size
+    total_pages = count_pages(file_path)
+    pages_read = 0
+
+    def chunk_stream():
+        nonlocal pages_read
+        next_index, seen = 0, {}
+        for page_number, chunks in iter_page_chunks(file_path):
+            # Add some extra metadata in each chunk
+            _add_metadata(chunks, file_path, document_id, access_level, first_index=next_index, seen=seen)
+            next_index += len(chunks)
+            pages_read = page_number
+            yield from chunks
+
+    def on_batch_stored(done):
+        if total_pages:
+            report(min(99, 100 * pages_read // total_pages))
+
+    try:
+        stored = store_chunks(chunk_stream(), on_batch_stored=on_batch_stored)
+    except Exception:
+        # a page failed half way -> drop the chunks that already made it in
+        remove_document_from_vector_store(document_id)
+        raise
+    vector_store.save()
+    keyword_index.save()
+    document_index.save()
+
+    # cached answers / session candidates for users who can see this document may now be incomplete
+    answer_cache.invalidate_access_level(access_level)
+    session_cache.invalidate_access_level(access_level)
+
+    seconds = time.perf_counter() - started
+    throughput = stored / seconds if seconds else 0.0
+    logger.info('Ingested document %s: %d chunks in %.2fs (%.1f chunks/sec)', document_id, stored, seconds, throughput)
+    return {'chunks': stored, 'seconds': round(seconds, 3), 'chunks_per_sec': round(throughput, 1)}
+
+
+# ============================================
+#  UPDATE DOCUMENT (INCREMENTAL RE-INGESTION)
+# ============================================
+def reingest_document(file_path: str, document_id: int, access_level: int, progress_callback=None, previous_access_level: int = None) -> dict:
+    """
+    Diff the new version of a document against the chunks already stored for it:
+    only new chunks are embedded, vanished ones are deleted, unchanged vectors stay as they are
+    (their metadata is refreshed when e.g. the chunk index or access level moved).
+    A failure part way rolls the stored chunks back to the previous version.
+    """
+    report = progress_callback or (lambda percent: None)
+    started = time.perf_counter()
+
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail=f'Document not found at {file_path}')
+
+    existing = vector_store.get(where={'document_id': document_id}, include=['metadatas'])
+    existing_metadata = dict(zip(existing['ids'], existing['metadatas']))
+    kept_ids, changed_ids, changed_metadata, added_ids = set(), [], [], []
+
+    total_pages = count_pages(file_path)
+    pages_read = 0
+
+    def new_chunks():
+        nonlocal pages_read
+        next_index, seen = 0, {}
+        for page_number, chunks in iter_page_chunks(file_path):
+            _add_metadata(chunks, file_path, document_id, access_level, first_index=next_index, seen=seen)
+            next_index += len(chunks)
+            pages_read = page_number
+            for chunk in chunks:
+                old_metadata = existing_metadata.get(chunk.id)
+                if old_metadata is None:
+                    added_ids.append(chunk.id)
+                    yield chunk         # new text -> needs an embedding
+                    continue
+                kept_ids.add(chunk.id)
+                if old_metadata != chunk.metadata:
+                    changed_ids.append(chunk.id)
+                    changed_metadata.append(chunk.metadata)
+
+    def on_batch_stored(done):
+        if total_pages:
+            report(min(99, 100 * pages_read // total_pages))
+
+    try:
+        added = store_chunks(new_chunks(), on_batch_stored=on_batch_stored)
+        if changed_ids:
+            # metadata only, the stored vectors are reused
+            vector_store.update_metadata(changed_ids, changed_metadata)
+            keyword_index.update_metadata(changed_ids, changed_metadata)
+    except Exception:
+        # some chunks of the new version are in, or carry the new access level -> back to the old version
+        _rollback_reingest(added_ids, changed_ids, existing_metadata)
+        raise
+
+    # deleting the vanished chunks is the last step: nothing after it can fail half way
+    vanished = [chunk_id for chunk_id in existing_metadata if chunk_id not in kept_ids]
+    if vanished:
+        _unroute_chunks(vanished)
+        vector_store.delete(ids=vanished)
+        keyword_index.remove_ids(vanished)
+    vector_store.save()
+    keyword_index.save()
+    if DOCUMENT_ROUTING_ENABLED:
+        document_index.set_access_level(document_id, access_level)
+        document_index.save()
+
+    answer_cache.invalidate_document(document_id)
+    session_cache.invalidate_document(document_id)
+    answer_cache.invalidate_access_level(access_level)
+    session_cache.invalidate_access_level(access_level)
+    if previous_access_level is not None and previous_access_level != access_level:
+        answer_cache.invalidate_access_level(previous_access_level)
+        session_cache.invalidate_access_level(previous_access_level)
+
+    seconds = time.perf_counter() - started
+    logger.info('Re-ingested document %s: %d added, %d deleted, %d unchanged in %.2fs', document_id, added, len(vanished), len(kept_ids), seconds)
+    return {'added': added, 'deleted': len(vanished), 'unchanged': len(kept_ids), 'seconds': round(seconds, 3)}
+
+
+def _rollback_reingest(added_ids: list[str], changed_ids: list[str], existing_metadata: dict):
+    if added_ids:
+        _unroute_chunks(added_ids)
+        vector_store.delete(ids=added_ids)
+        keyword_index.remove_ids(added_ids)
+    if changed_ids:
+        old_metadata = [existing_metadata[chunk_id] for chunk_id in changed_ids]
+        vector_store.update_metadata(changed_ids, old_metadata)
+        keyword_index.update_metadata(changed_ids, old_metadata)
+    vector_store.save()
+    keyword_index.save()
+    document_index.save()
+
+
+# ============================================
+#  BULK UPLOAD
+# ============================================
+_parse_pool = None
+
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    # spawn -> children only import app.rag.loaders, never the embedding model or the vector store
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ProcessPoolExecutor(max_workers=BULK_PARSE_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _parse_pool
+
+
+def ingest_documents_bulk(files: list[tuple[str, int, int]], on_document_done=None) -> dict[int, dict]:
+    """
+    Ingest many (file_path, document_id, access_level) at once: BULK_PARSE_WORKERS files at a time are
+    parsed + split in parallel processes, stored through the embedding batches and released before the
+    next window -> memory depends on the window, not on the number of files. PDFs over
+    BULK_PARSE_MAX_PAGES pages are streamed page by page instead (ingest_document).
+    on_document_done(document_id, result) is called once a document's chunks are saved (or it failed).
+    Returns {document_id: {'chunks': n} or {'error': message}}.
+    """
+    started = time.perf_counter()
+    results = {}
+    stored = 0
+    report = on_document_done or (lambda document_id, result: None)
+
+    for window in _batched(files, BULK_PARSE_WORKERS):
+        futures = {}
+        for path, doc_id, level in window:
+            try:
+                pages = count_pages(path)
+                if pages and pages > BULK_PARSE_MAX_PAGES:
+                    results[doc_id] = {'chunks': ingest_document(path, doc_id, level)['chunks']}
+                    report(doc_id, results[doc_id])
+                    continue
+            except Exception as e:
+                results[doc_id] = {'error': getattr(e, 'detail', None) or str(e)}
+                report(doc_id, results[doc_id])
+                continue
+            futures[_get_parse_pool().submit(load_and_split, path)] = (path, doc_id, level)
+
+        documents = []      # (document id, chunks) parsed in this window
+        for future, (path, doc_id, level) in futures.items():
+            try:
+                chunks = future.result()
+                _add_metadata(chunks, path, doc_id, level)
+                documents.append((doc_id, chunks))
+            except Exception as e:
+                results[doc_id] = {'error': getattr(e, 'detail', None) or str(e)}
+
+        # the window's chunks share the embedding batches -> 2,000 small files are not 2,000 tiny upserts
+        try:
+            stored += store_chunks(chunk for _, chunks in documents for chunk in chunks)
+            for doc_id, chunks in documents:
+                results[doc_id] = {'chunks': len(chunks)}
+        except Exception:
+            # a batch failed -> store the documents one by one to find the broken one, without half documents
+            for doc_id, chunks in documents:
+                try:
+                    remove_document_from_vector_store(doc_id)
+                    stored += store_chunks(chunks)
+                    results[doc_id] = {'chunks': len(chunks)}
+                except Exception as e:
+                    remove_document_from_vector_store(doc_id)
+                    results[doc_id] = {'error': getattr(e, 'detail', None) or str(e)}
+
+        parsed = [doc_id for doc_id, _ in documents if 'chunks' in results[doc_id]]
+        if parsed:
+            vector_store.save()
+            keyword_index.save()
+            document_index.save()
+            for level in {level for _, doc_id, level in window if doc_id in parsed}:
+                answer_cache.invalidate_access_level(level)
+                session_cache.invalidate_access_level(level)
+        for doc_id in (doc_id for _, doc_id, _ in futures.values()):
+            report(doc_id, results[doc_id])
+
+    seconds = time.perf_counter() - started
+    logger.info('Bulk ingested %d documents: %d chunks in %.2fs (%.1f chunks/sec)', len(results), stored, seconds, stored / seconds if seconds else 0.0)
+    return results
 
 
 # ============================================
@@ -55,5 +337,12 @@ def ingest_document(file_path: str, document_id: int, access_level: int) -> None
 def remove_document_from_vector_store(doc_id: int):
     try:
         vector_store.delete(where={'document_id': doc_id})
+        keyword_index.remove_document(doc_id)
+        vector_store.save()
+        keyword_index.save()
+        document_index.remove_document(doc_id)
+        document_index.save()
+        answer_cache.invalidate_document(doc_id)
+        session_cache.invalidate_document(doc_id)
     except Exception as e:
         raise Exception(f"Failed to remove document from vector store: {str(e)}")
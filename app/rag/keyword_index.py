@@ -0,0 +1,298 @@
+import os
+import re
+import math
+import json
+import time
+import threading
+from collections import Counter
+import numpy as np
+
+
+TOKEN_PATTERN = re.compile(r'\w+(?:[-./]\w+)*')      # keeps policy numbers / codes like HR-204 or 4.2.1 whole
+MIN_CHUNKS_FOR_DF_CUTOFF = 100     # in a tiny index every term looks common
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+# ============================================
+#  INVERTED KEYWORD INDEX (BM25)
+# ============================================
+class KeywordIndex:
+    """
+    BM25 over chunk text, maintained next to the vector store by ingestion.
+
+    On disk everything is one compressed .npz: per term a run of delta-encoded chunk numbers
+    (uint32) and term frequencies (uint8), plus small columns per chunk (id, document id,
+    access level, length). Deltas of sorted ids are small numbers, so they compress well.
+
+    Searches score with NumPy: every query term's postings are cached as arrays, the per-chunk
+    columns are arrays indexed by chunk number, and the scoring runs outside the lock. Terms found
+    in more than max_df of the chunks (the, and, policy...) add almost nothing to BM25 and are skipped.
+
+    save() copies the postings under the lock and sorts / compresses / writes them outside it, at most
+    once per save_interval seconds (later calls schedule one write) -> a bulk upload that saves after
+    every window doesn't rewrite the whole index each time. Chunk numbers are only compacted on disk.
+    """
+
+    def __init__(self, directory: str, k1: float = 1.5, b: float = 0.75, max_df: float = 0.5, save_interval: float = 10.0):
+        self.directory = directory
+        self.path = os.path.join(directory, 'postings.npz')
+        self.k1 = k1
+        self.b = b
+        self.max_df = max_df
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()      # one writer at a time, in snapshot order
+        self._save_timer = None
+        self._last_save = 0.0
+        self._postings: dict[str, dict[int, int]] = {}      # term -> {chunk number: tf}
+        self._chunk_numbers: dict[str, int] = {}            # chunk id -> chunk number
+        self._chunks: dict[int, list] = {}                  # chunk number -> [chunk id, document id, access level, length, terms]
+        self._arrays: dict[str, tuple] = {}                 # term -> (chunk numbers, tfs) for searches, dropped on change
+        self._document_ids = np.zeros(0, dtype=np.int64)    # columns by chunk number
+        self._access_levels = np.zeros(0, dtype=np.int8)
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._next_number = 0
+        self._total_length = 0
+        self._dirty = False
+        self._load()
+
+    # ---------- persistence ----------
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        data = np.load(self.path, allow_pickle=False)
+        chunk_ids = json.loads(str(data['chunk_ids']))
+        terms = json.loads(str(data['terms']))
+        for number, (chunk_id, document_id, level, length) in enumerate(zip(chunk_ids, data['document_ids'], data['access_levels'], data['lengths'])):
+            self._chunk_numbers[chunk_id] = number
+            self._chunks[number] = [chunk_id, int(document_id), int(level), int(length), []]
+            self._total_length += int(length)
+        self._next_number = len(chunk_ids)
+        self._document_ids = data['document_ids'].astype(np.int64)
+        self._access_levels = data['access_levels'].astype(np.int8)
+        self._lengths = data['lengths'].astype(np.float32)
+
+        offsets, deltas, tfs = data['offsets'], data['deltas'], data['tfs']
+        for i, term in enumerate(terms):
+            numbers = np.cumsum(deltas[offsets[i]:offsets[i + 1]], dtype=np.int64)
+            self._postings[term] = dict(zip(numbers.tolist(), tfs[offsets[i]:offsets[i + 1]].tolist()))
+            for number in numbers.tolist():
+                self._chunks[number][4].append(term)
+
+    def save(self, force: bool = False):
+        """Write the index now, or schedule it when the last write was less than save_interval ago"""
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                wait = self._last_save + self.save_interval - time.monotonic()
+                if wait > 0 and not force:
+                    if self._save_timer is None:
+                        self._save_timer = threading.Timer(wait, self._scheduled_save)
+                        self._save_timer.daemon = True
+                        self._save_timer.start()
+                    return
+                # snapshot: plain copies, the expensive part below runs without the lock
+                chunks = sorted((number, chunk[:4]) for number, chunk in self._chunks.items())
+                postings = [(term, list(p.items())) for term, p in self._postings.items() if p]
+                self._dirty = False
+                self._last_save = time.monotonic()
+            try:
+                self._write(chunks, postings)
+            except Exception:
+                with self._lock:
+                    self._dirty = True
+                raise
+
+    def _scheduled_save(self):
+        with self._lock:
+            self._save_timer = None
+        self.save(force=True)
+
+    def close(self):
+        """Write pending changes (at shutdown)"""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+        self.save(force=True)
+
+    def _write(self, chunks: list, postings: list):
+        # renumber live chunks 0..n-1 -> deleted chunks leave no gaps on disk
+        renumber = {old: new for new, (old, _) in enumerate(chunks)}
+        postings.sort()
+        terms = [term for term, _ in postings]
+        offsets, deltas, tfs = [0], [], []
+        for _, term_postings in postings:
+            term_postings = sorted((renumber[n], tf) for n, tf in term_postings)
+            numbers = np.array([n for n, _ in term_postings], dtype=np.int64)
+            deltas.append(np.diff(numbers, prepend=0).astype(np.uint32))
+            tfs.append(np.minimum([tf for _, tf in term_postings], 255).astype(np.uint8))
+            offsets.append(offsets[-1] + len(term_postings))
+
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.path + '.tmp.npz'
+        np.savez_compressed(
+            tmp_path,
+            chunk_ids=np.array(json.dumps([c[0] for _, c in chunks])),
+            document_ids=np.array([c[1] for _, c in chunks], dtype=np.int64),
+            access_levels=np.array([c[2] for _, c in chunks], dtype=np.int8),
+            lengths=np.array([c[3] for _, c in chunks], dtype=np.int32),
+            terms=np.array(json.dumps(terms)),
+            offsets=np.array(offsets, dtype=np.int64),
+            deltas=np.concatenate(deltas) if deltas else np.zeros(0, dtype=np.uint32),
+            tfs=np.concatenate(tfs) if tfs else np.zeros(0, dtype=np.uint8)
+        )
+        os.replace(tmp_path, self.path)
+
+    # ---------- updates ----------
+    def add(self, chunk_ids: list[str], texts: list[str], metadatas: list[dict]):
+        with self._lock:
+            for chunk_id, text, metadata in zip(chunk_ids, texts, metadatas):
+                self._remove(chunk_id)
+                counts = Counter(tokenize(text))
+                number = self._next_number
+                self._next_number += 1
+                length = sum(counts.values())
+                self._chunk_numbers[chunk_id] = number
+                self._chunks[number] = [chunk_id, metadata['document_id'], metadata['access_level'], length, list(counts)]
+                self._total_length += length
+                self._grow(number + 1)
+                self._document_ids[number] = metadata['document_id']
+                self._access_levels[number] = metadata['access_level']
+                self._lengths[number] = length
+                for term, tf in counts.items():
+                    self._postings.setdefault(term, {})[number] = tf
+                    self._arrays.pop(term, None)
+            self._dirty = True
+
+    def _grow(self, required: int):
+        # columns grow by doubling; searches keep using the arrays they started with
+        if required <= len(self._lengths):
+            return
+        capacity = max(1024, len(self._lengths))
+        while capacity < required:
+            capacity *= 2
+        for name in ('_document_ids', '_access_levels', '_lengths'):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+    def _remove(self, chunk_id: str):
+        number = self._chunk_numbers.pop(chunk_id, None)
+        if number is None:
+            return
+        _, _, _, length, terms = self._chunks.pop(number)
+        self._total_length -= length
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(number, None)
+                self._arrays.pop(term, None)
+                if not postings:
+                    del self._postings[term]
+        self._dirty = True
+
+    def remove_ids(self, chunk_ids: list[str]):
+        with self._lock:
+            for chunk_id in chunk_ids:
+                self._remove(chunk_id)
+
+    def remove_document(self, document_id: int):
+        with self._lock:
+            for chunk_id in [c[0] for c in self._chunks.values() if c[1] == document_id]:
+                self._remove(chunk_id)
+
+    def update_metadata(self, chunk_ids: list[str], metadatas: list[dict]):
+        with self._lock:
+            for chunk_id, metadata in zip(chunk_ids, metadatas):
+                number = self._chunk_numbers.get(chunk_id)
+                if number is not None:
+                    self._chunks[number][2] = metadata['access_level']
+                    self._access_levels[number] = metadata['access_level']
+                    self._dirty = True
+
+    def clear(self):
+        """Forget every chunk (before a rebuild from the vector store)"""
+        with self._lock:
+            self._postings, self._chunk_numbers, self._chunks, self._arrays = {}, {}, {}, {}
+            self._document_ids = np.zeros(0, dtype=np.int64)
+            self._access_levels = np.zeros(0, dtype=np.int8)
+            self._lengths = np.zeros(0, dtype=np.float32)
+            self._next_number = 0
+            self._total_length = 0
+            self._dirty = True
+
+    def __len__(self):
+        return len(self._chunks)
+
+    # ---------- search ----------
+    def _term_arrays(self, term: str):
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            postings = self._postings[term]
+            arrays = (np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                      np.fromiter(postings.values(), dtype=np.float32, count=len(postings)))
+            self._arrays[term] = arrays
+        return arrays
+
+    def search(self, query: str, k: int, allowed_levels: list[int], document_ids: set[int] = None) -> list[tuple[str, float]]:
+        """Top-k (chunk id, bm25 score) among the chunks of the allowed access levels"""
+        # under the lock: only grab the arrays this query needs
+        with self._lock:
+            total = len(self._chunks)
+            if not total:
+                return []
+            average_length = self._total_length / total
+            terms = [self._term_arrays(term) for term in set(tokenize(query)) if term in self._postings]
+            chunks, document_column, level_column, length_column = self._chunks, self._document_ids, self._access_levels, self._lengths
+        if not terms:
+            return []
+
+        # very common terms barely move BM25 but have the longest postings -> skip them (unless that's all there is)
+        if total >= MIN_CHUNKS_FOR_DF_CUTOFF:
+            rare = [arrays for arrays in terms if len(arrays[0]) <= self.max_df * total]
+            terms = rare or [min(terms, key=lambda arrays: len(arrays[0]))]
+
+        scores = np.zeros(len(length_column), dtype=np.float32)
+        for numbers, tfs in terms:
+            idf = math.log(1 + (total - len(numbers) + 0.5) / (len(numbers) + 0.5))
+            norm = tfs + self.k1 * (1 - self.b + self.b * length_column[numbers] / average_length)
+            scores[numbers] += idf * tfs * (self.k1 + 1) / norm       # a term lists each chunk once
+
+        candidates = np.flatnonzero(scores)
+        allowed = np.isin(level_column[candidates], list(allowed_levels))
+        if document_ids is not None:
+            allowed &= np.isin(document_column[candidates], list(document_ids))
+        candidates = candidates[allowed]
+        if not len(candidates):
+            return []
+        top = min(k, len(candidates))
+        best = candidates[np.argpartition(-scores[candidates], top - 1)[:top]]
+        best = best[np.argsort(-scores[best])]
+        # chunks removed since the arrays were taken are skipped
+        found = [(chunks.get(number), float(scores[number])) for number in best.tolist()]
+        return [(chunk[0], score) for chunk, score in found if chunk is not None]
+
+
+def rebuild_from_vector_store(index: KeywordIndex, store, page_size: int = 1000):
+    """Index every chunk of the vector store (first start, or an index that no longer matches it)"""
+    result = store.get(include=['documents', 'metadatas'])
+    for start in range(0, len(result['ids']), page_size):
+        end = start + page_size
+        index.add(result['ids'][start:end], result['documents'][start:end], result['metadatas'][start:end])
+    index.save()
+
+
+def reconcile_with_vector_store(index: KeywordIndex, store):
+    """
+    Saves are debounced -> a crash inside the window leaves an index on disk that is behind (or ahead
+    of, after deletions) the vector store. Different chunk counts at startup -> rebuild it from the store.
+    """
+    if len(index) != store.count():
+        index.clear()
+        rebuild_from_vector_store(index, store)
@@ -0,0 +1,174 @@
+import time
+import asyncio
+import logging
+import threading
+from langchain_huggingface import HuggingFaceEndpoint, ChatHuggingFace
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from app.rag.resilience import LLMUnavailable, CircuitBreaker, AdaptiveLimiter, is_retryable, backoff_delay
+from app.core.config import (
+    LLM_REPO_ID, LLM_MAX_CONCURRENCY,
+    LLM_TIMEOUT_SECONDS, LLM_DEADLINE_SECONDS, LLM_MAX_RETRIES, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY,
+    LLM_CIRCUIT_FAILURES, LLM_CIRCUIT_RESET_SECONDS, LLM_MIN_CONCURRENCY, LLM_LATENCY_TARGET_SECONDS, LLM_QUEUE_TIMEOUT_SECONDS
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================
+#  PROMPTS
+# ============================================
+RAG_PROMPT = ChatPromptTemplate([
+    ("system", """You are a helpful AI assistant for a company's internal documentation system.
+        Your role is to answer questions based ONLY on the provided context from company documents.
+
+        Guidelines:
+        - Only use information from the provided context
+        - If the context doesn't contain enough information, clearly state that
+        - Be concise but thorough in your responses
+        - Maintain a professional and helpful tone
+        - If you're not certain about something, acknowledge it
+        - Do not make up information or use external knowledge"""
+    ),
+    ("human", """Context from company documents:
+        {context}\n
+        User Question: {question}\n
+        Please provide a clear and accurate answer based on the context above.""")
+])
+
+PROMPTS = {'rag': RAG_PROMPT}
+
+
+# ============================================
+#  PROVIDER REGISTRY
+# ============================================
+class LLMProvider:
+    """
+    One model endpoint shared by the whole process, with its compiled chains. Every call runs under
+    a deadline, is retried with jittered backoff on transient errors, goes through a circuit breaker
+    (fail fast while the endpoint is down) and an adaptive concurrency limit (shed load when it slows).
+    """
+
+    def __init__(self, repo_id: str, max_concurrency: int):
+        self.repo_id = repo_id
+        # huggingface_hub >= 1.0: the endpoint's AsyncInferenceClient keeps one httpx client for its
+        # lifetime -> one endpoint per process is what keeps the connections alive between questions
+        llm = HuggingFaceEndpoint(repo_id=repo_id, task='text-generation', timeout=LLM_TIMEOUT_SECONDS)
+        self.model = ChatHuggingFace(llm=llm)
+        self.breaker = CircuitBreaker(LLM_CIRCUIT_FAILURES, LLM_CIRCUIT_RESET_SECONDS)
+        self.limiter = AdaptiveLimiter(LLM_MIN_CONCURRENCY, max_concurrency, LLM_LATENCY_TARGET_SECONDS, LLM_QUEUE_TIMEOUT_SECONDS)
+        self._chains = {}
+        self._lock = threading.Lock()
+
+    def get_chain(self, prompt_name: str = 'rag'):
+        chain = self._chains.get(prompt_name)
+        if chain is None:
+            with self._lock:
+                chain = self._chains.get(prompt_name)
+                if chain is None:
+                    chain = PROMPTS[prompt_name] | self.model | StrOutputParser()
+                    self._chains[prompt_name] = chain
+        return chain
+
+    def check_available(self):
+        """Raise LLMUnavailable now instead of after queueing (open circuit)"""
+        if self.breaker.state == 'open':
+            self.breaker.check()
+
+    def _record(self, error: Exception) -> bool:
+        """Count a failed attempt, True when it is worth retrying"""
+        if is_retryable(error):
+            self.breaker.record_failure()
+            return True
+        self.breaker.record_success()       # the endpoint answered, the request itself was bad
+        return False
+
+    def _give_up(self, error: Exception, retryable: bool):
+        logger.warning('LLM call to %s failed: %s: %s', self.repo_id, type(error).__name__, error)
+        if retryable:
+            raise LLMUnavailable('The language model did not answer in time, please retry shortly', LLM_RETRY_MAX_DELAY) from error
+        raise error
+
+    async def ainvoke(self, inputs: dict, prompt_name: str = 'rag') -> str:
+        chain = self.get_chain(prompt_name)
+        deadline = time.monotonic() + LLM_DEADLINE_SECONDS
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            trial = self.breaker.check()
+            try:
+                async with self.limiter.slot():
+                    timeout = min(LLM_TIMEOUT_SECONDS, deadline - time.monotonic())
+                    answer = await asyncio.wait_for(chain.ainvoke(inputs), timeout=timeout)
+                self.breaker.record_success()
+                return answer
+            except LLMUnavailable:
+                raise
+            except Exception as e:
+                retryable = self._record(e)
+                delay = backoff_delay(attempt, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY)
+                if not retryable or attempt == LLM_MAX_RETRIES or time.monotonic() + delay >= deadline:
+                    self._give_up(e, retryable)
+            finally:
+                # shed by the limiter / cancelled -> the half-open trial never reached the endpoint
+                self.breaker.abandon_trial(trial)
+            await asyncio.sleep(delay)
+
+    async def astream(self, inputs: dict, prompt_name: str = 'rag'):
+        """
+        Yield the answer token by token as the model generates it. Every token has LLM_TIMEOUT_SECONDS
+        to arrive; a failed stream is retried only while nothing was yielded yet.
+        """
+        chain = self.get_chain(prompt_name)
+        deadline = time.monotonic() + LLM_DEADLINE_SECONDS
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            trial = self.breaker.check()
+            yielded = False
+            try:
+                async with self.limiter.slot() as timing:
+                    tokens = chain.astream(inputs).__aiter__()
+                    while True:
+                        timeout = LLM_TIMEOUT_SECONDS if yielded else min(LLM_TIMEOUT_SECONDS, deadline - time.monotonic())
+                        try:
+                            token = await asyncio.wait_for(tokens.__anext__(), timeout=timeout)
+                        except StopAsyncIteration:
+                            break
+                        if not yielded:
+                            timing.first_response()     # the limiter tracks time to first token, not how fast the client reads
+                            self.breaker.record_success()
+                        yielded = True
+                        yield token
+                self.breaker.record_success()
+                return
+            except LLMUnavailable:
+                raise
+            except Exception as e:
+                retryable = self._record(e)
+                delay = backoff_delay(attempt, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY)
+                if yielded or not retryable or attempt == LLM_MAX_RETRIES or time.monotonic() + delay >= deadline:
+                    self._give_up(e, retryable)
+            finally:
+                self.breaker.abandon_trial(trial)
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {'repo_id': self.repo_id, 'circuit': self.breaker.stats(), 'concurrency': self.limiter.stats()}
+
+
+_providers: dict[str, LLMProvider] = {}
+_providers_lock = threading.Lock()
+
+
+def get_provider(repo_id: str = LLM_REPO_ID) -> LLMProvider:
+    provider = _providers.get(repo_id)
+    if provider is None:
+        with _providers_lock:
+            provider = _providers.get(repo_id)
+            if provider is None:
+                provider = LLMProvider(repo_id, LLM_MAX_CONCURRENCY)
+                _providers[repo_id] = provider
+    return provider
+
+
+def warm_up_providers():
+    """Build the default provider and chain at startup so the first question doesn't pay for it"""
+    get_provider().get_chain('rag')
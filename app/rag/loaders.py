@@ -0,0 +1,109 @@
+import os
+from langchain_core.documents import Document
+from langchain_community.document_loaders import TextLoader, PyPDFLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from pypdf import PdfReader, PageObject
+from pypdf.generic import IndirectObject, NameObject
+
+# NOTE: keep this module free of vector store / model imports -> it is imported by the parser processes
+
+
+LOADERS = {'.pdf': PyPDFLoader, '.txt': TextLoader}
+PDF_CACHE_PAGES = 100           # a PdfReader keeps every object it parsed -> its cache is dropped this often
+INHERITED_PAGE_KEYS = ('/Resources', '/MediaBox', '/CropBox', '/Rotate')     # page tree attributes pages inherit
+
+
+def make_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=1000,           # Smaller chunks for better retrieval
+        chunk_overlap=200,         # Overlap to maintain context
+        separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""],
+        length_function=len
+    )
+
+
+def _get_loader(file_path: str):
+    ext = os.path.splitext(file_path)[1].lower()
+    loader_class = LOADERS.get(ext)
+    if not loader_class:
+        raise Exception(f"Unsupported file type: {ext}")
+    return loader_class(file_path)
+
+
+def count_pages(file_path: str) -> int | None:
+    """Number of pages of a PDF (the page tree's /Count, no page is parsed), None for other types"""
+    if os.path.splitext(file_path)[1].lower() != '.pdf':
+        return None
+    with open(file_path, 'rb') as f:
+        return int(PdfReader(f).trailer['/Root']['/Pages']['/Count'])
+
+
+# ============================================
+#  STREAMING LOAD + SPLIT
+# ============================================
+def _walk_pages(reader: PdfReader, node_reference, inherited: dict = None):
+    """Leaf pages of the page tree in order, with the attributes they inherit from their parents"""
+    node = node_reference.get_object()
+    inherited = inherited or {}
+    if '/Kids' in node:
+        inherited = {**inherited, **{key: node[key] for key in INHERITED_PAGE_KEYS if key in node}}
+        for kid in node['/Kids']:
+            yield from _walk_pages(reader, kid, inherited)
+        return
+    page = PageObject(reader, node_reference if isinstance(node_reference, IndirectObject) else None)
+    page.update(node)
+    for key, value in inherited.items():
+        if key not in page:
+            page[NameObject(key)] = value
+    yield page
+
+
+def _iter_pdf_pages(file_path: str):
+    """
+    PyPDFLoader.lazy_load() yields pages one by one, but its reader holds the whole file in memory,
+    builds every page object up front (reader.pages) and caches each page's parsed objects until the
+    end -> memory grows with the page count. Here the file is read on demand, the page tree is walked
+    as pages are needed and the object cache is dropped every PDF_CACHE_PAGES pages.
+    """
+    with open(file_path, 'rb') as f:
+        reader = PdfReader(f)
+        total_pages = int(reader.trailer['/Root']['/Pages']['/Count'])
+        for index, page in enumerate(_walk_pages(reader, reader.trailer['/Root'].raw_get('/Pages'))):
+            text = page.extract_text()
+            yield Document(page_content=text, metadata={'source': file_path, 'page': index, 'total_pages': total_pages})
+            if (index + 1) % PDF_CACHE_PAGES == 0:
+                reader.resolved_objects.clear()     # shared objects (fonts) are parsed again when needed
+
+
+def iter_page_chunks(file_path: str):
+    """
+    Yield (page_number, chunks) one page at a time, so only the current page is in memory.
+    split_documents splits every page on its own anyway, so the chunks are the same as load() + split.
+    """
+    splitter = make_splitter()
+    produced = False
+    is_pdf = os.path.splitext(file_path)[1].lower() == '.pdf'
+    pages = _iter_pdf_pages(file_path) if is_pdf else _get_loader(file_path).lazy_load()
+    for page_number, page in enumerate(pages, 1):
+        chunks = splitter.split_documents(documents=[page])
+        produced = produced or bool(chunks)
+        yield page_number, chunks
+    if not produced:
+        raise Exception("No chunks created from document")
+
+
+# ============================================
+#  LOAD + SPLIT
+# ============================================
+def load_and_split(file_path: str):
+    """Parse a file and split it into chunks (no document metadata yet)"""
+    # Load the document
+    document = _get_loader(file_path).load()
+    if not document:
+        raise Exception(f"No content extracted from the document")
+
+    # Split into chunks
+    chunks = make_splitter().split_documents(documents=document)
+    if not chunks:
+        raise Exception("No chunks created from document")
+    return chunks
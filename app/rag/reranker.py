@@ -0,0 +1,112 @@
+import time
+import importlib
+import threading
+from app.core.config import RERANKER, RERANKER_MODEL, RERANK_BATCH_SIZE, RERANK_LATENCY_BUDGET_MS, RERANK_PROBE_EVERY
+
+
+# ============================================
+#  SCORERS
+# ============================================
+class CrossEncoderScorer:
+    """Local sentence-transformers cross-encoder, loaded at startup (load) or on first use"""
+
+    def __init__(self, model_name: str, batch_size: int):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name)
+
+    def __call__(self, query: str, texts: list[str]) -> list[float]:
+        self.load()
+        # every (query, chunk) pair in one batched forward pass
+        return self._model.predict([(query, text) for text in texts], batch_size=self.batch_size).tolist()
+
+
+def load_scorer(spec: str):
+    """
+    'none' -> no reranking, 'cross-encoder' -> RERANKER_MODEL,
+    'package.module:function' -> any callable(query, texts) -> scores
+    """
+    if not spec or spec == 'none':
+        return None
+    if spec == 'cross-encoder':
+        return CrossEncoderScorer(RERANKER_MODEL, RERANK_BATCH_SIZE)
+    module_name, _, attribute = spec.partition(':')
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+# ============================================
+#  RERANKER
+# ============================================
+class Reranker:
+    """
+    Second stage: score N candidates in one call and keep the best k, unless it would blow the latency budget.
+    While over budget, every probe_every-th request still reranks, so the latency estimate keeps
+    following the model instead of freezing on one slow call.
+    """
+
+    def __init__(self, scorer, latency_budget_ms: int, probe_every: int = 20):
+        self.scorer = scorer
+        self.latency_budget = latency_budget_ms / 1000
+        self.probe_every = probe_every
+        self._skipped_in_row = 0
+        self.average_latency = 0.0      # moving average of the scoring call
+        self.runs = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.scorer is not None
+
+    def fits_budget(self, elapsed: float) -> bool:
+        """elapsed = time the request already spent in retrieval"""
+        fits = elapsed + self.average_latency <= self.latency_budget
+        with self._lock:
+            if fits:
+                self._skipped_in_row = 0
+            elif self.probe_every and self._skipped_in_row + 1 >= self.probe_every:
+                self._skipped_in_row = 0
+                fits = True         # probe: re-measure the scorer
+            else:
+                self._skipped_in_row += 1
+                self.skipped += 1
+        return fits
+
+    def warm_up(self):
+        """Load the model and run one untimed call, so model loading never counts as scoring latency"""
+        if not self.enabled:
+            return
+        load = getattr(self.scorer, 'load', None)
+        if load is not None:
+            load()
+        self.scorer('warm up', ['warm up'])
+
+    def rerank(self, query: str, hits: list, k: int) -> list:
+        started = time.perf_counter()
+        scores = self.scorer(query, [hit.text for hit in hits])
+        latency = time.perf_counter() - started
+        with self._lock:
+            self.runs += 1
+            self.average_latency = latency if self.runs == 1 else 0.8 * self.average_latency + 0.2 * latency
+        ranked = sorted(zip(hits, scores), key=lambda pair: pair[1], reverse=True)
+        return [hit for hit, _ in ranked[:k]]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'runs': self.runs,
+                'skipped_over_budget': self.skipped,
+                'average_latency_ms': round(self.average_latency * 1000, 1)
+            }
+
+
+reranker = Reranker(load_scorer(RERANKER), RERANK_LATENCY_BUDGET_MS, RERANK_PROBE_EVERY)
@@ -0,0 +1,174 @@
+import time
+import random
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================
+#  ERRORS
+# ============================================
+class LLMUnavailable(Exception):
+    """The model can't take this call right now -> the API answers 503 with Retry-After"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpen(LLMUnavailable):
+    pass
+
+
+class Overloaded(LLMUnavailable):
+    pass
+
+
+def is_retryable(error: Exception) -> bool:
+    """Timeouts, dropped connections, 429 and 5xx are worth another try; bad requests are not"""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status = getattr(getattr(error, 'response', None), 'status_code', None) or getattr(error, 'status', None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    return type(error).__module__.split('.')[0] in ('aiohttp', 'requests', 'httpx')     # transport errors
+
+
+# ============================================
+#  CIRCUIT BREAKER
+# ============================================
+class CircuitBreaker:
+    """
+    closed -> calls go through; failure_threshold failures in a row -> open: calls fail fast for
+    reset_seconds; then half-open: one trial call decides between closed and open again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial = None          # token of the half-open trial call in progress
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self.opened_at >= self.reset_seconds else 'open'
+
+    def check(self):
+        """Raise CircuitOpen when calls must fail fast, returns a token when this call is the half-open trial"""
+        state = self.state
+        if state == 'closed':
+            return None
+        if state == 'half-open' and self._trial is None:
+            self._trial = object()
+            return self._trial
+        self.rejected += 1
+        retry_after = max(1.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+        raise CircuitOpen('The language model is unavailable, please retry shortly', retry_after)
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial = None
+
+    def abandon_trial(self, trial):
+        # the trial ended without an outcome (shed, cancelled) -> the next call becomes the trial
+        if trial is not None and self._trial is trial:
+            self._trial = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self._trial is not None:
+                logger.warning('LLM circuit opened after %d failures', self.failures)
+            self.opened_at = time.monotonic()
+        self._trial = None
+
+    def stats(self) -> dict:
+        return {'state': self.state, 'consecutive_failures': self.failures, 'rejected': self.rejected}
+
+
+# ============================================
+#  ADAPTIVE CONCURRENCY (AIMD)
+# ============================================
+class _Timing:
+    """Latency of one call as the limiter sees it: until the first token for streams, else the whole call"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.latency = None
+
+    def first_response(self):
+        if self.latency is None:
+            self.latency = time.monotonic() - self.started
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit that follows the model's latency: +1 per limit calls answered within the
+    latency target (additive increase), x0.7 on a slow call or a retryable failure (multiplicative
+    decrease). Cancelled calls and rejected requests (4xx) say nothing about load and leave it as is.
+    A call that can't get a slot within queue_timeout is shed with Overloaded instead of queueing
+    behind calls that are already too slow.
+    """
+
+    def __init__(self, min_limit: int, max_limit: int, latency_target: float, queue_timeout: float):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.queue_timeout = queue_timeout
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.shed = 0
+        self._condition = None      # created on the event loop
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one of the limit's slots, yields a _Timing (streams call first_response() on their first token)"""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            try:
+                await asyncio.wait_for(self._condition.wait_for(lambda: self.in_flight < int(self.limit)), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.shed += 1
+                raise Overloaded('Too many questions in progress, please retry shortly', retry_after=max(1.0, self.latency_target))
+            self.in_flight += 1
+
+        timing = _Timing()
+        try:
+            yield timing
+        except Exception as e:
+            if is_retryable(e):
+                self._decrease()
+            raise
+        else:
+            timing.first_response()
+            if timing.latency <= self.latency_target:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            else:
+                self._decrease()
+        finally:
+            async with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def _decrease(self):
+        self.limit = max(self.min_limit, self.limit * 0.7)
+
+    def stats(self) -> dict:
+        return {'limit': round(self.limit, 2), 'in_flight': self.in_flight, 'shed': self.shed}
+
+
+# ============================================
+#  RETRIES
+# ============================================
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    # full jitter -> retries of many callers don't hit the endpoint in lockstep
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
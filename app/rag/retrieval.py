@@ -1,73 +1,306 @@
-from langchain_huggingface import HuggingFaceEndpoint, ChatHuggingFace
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from app.rag.vector_store import vector_store
+import time
+import asyncio
+import logging
+from contextlib import nullcontext
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from app.rag.vector_store import vector_store, embeddings, keyword_index, document_index
+from app.rag.reranker import reranker
+from app.rag.context import pack_context
+from app.core.config import (
+    RETRIEVAL_K, HYBRID_SEARCH_ENABLED, HYBRID_CANDIDATES, RRF_K, RERANK_CANDIDATES,
+    RETRIEVAL_ADAPTIVE_K, RETRIEVAL_SCORE_THRESHOLD, RETRIEVAL_MAX_K, RETRIEVAL_MMR, MMR_LAMBDA, MMR_CANDIDATES,
+    DOCUMENT_ROUTING_ENABLED, ROUTING_TOP_DOCUMENTS, SESSION_CACHE_CANDIDATES, BATCH_MAX_CONCURRENCY
+)
+from app.rag.answer_cache import answer_cache
+from app.rag.session_cache import session_cache
+from app.rag.llm import get_provider
+from app.rag.resilience import LLMUnavailable
 
 
-def retrieve_answer(question: str, allowed_levels: list[int]) -> str:
-    # check valid question or not
-    if not question or not question.strip():
-        return "Please provide a valid question"
-    
-    # Filter for allowed access levels
-    # ChromaDB filter syntax: {"access_level": {"$in": [0, 1, 2]}}
-    access_filter = {"access_level": {"$in": allowed_levels}}
-
-    # retrieve related top 5 docs
-    retriever = vector_store.as_retriever(
-        # search_type = 'mmr',      # better to use the vanilla similarity search here
-        search_kwargs={'k': 5, 'filter': access_filter}
-    )
-
-    retrieved_docs = retriever.invoke(question)
-    if not retrieved_docs:
-        return """I don't have enough information in the available documents to answer your question.
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_DEFAULTS = {
+    'adaptive_k': RETRIEVAL_ADAPTIVE_K,
+    'score_threshold': RETRIEVAL_SCORE_THRESHOLD,
+    'mmr': RETRIEVAL_MMR,
+    'mmr_lambda': MMR_LAMBDA
+}
+
+
+INVALID_QUESTION_ANSWER = "Please provide a valid question"
+
+NO_CONTEXT_ANSWER = """I don't have enough information in the available documents to answer your question.
             This could mean:
             - The information is not in the documents you have access to
             - The documents haven't been uploaded yet
             - Your question might need to be rephrased
 
             Please try asking in a different way or contact an administrator if you believe you should have access to this information."""
-    
-    # Combine retrieve chunks -> text
-    retrieved_texts = '\n\n'.join(i.page_content for i in retrieved_docs)
-
-    # model
-    llm = HuggingFaceEndpoint(
-        repo_id='mistralai/Mistral-7B-Instruct-v0.2',
-        task='text-generation'
-    )
-    model = ChatHuggingFace(llm=llm)
-
-    # prompt
-    prompt = ChatPromptTemplate([
-        ("system", """You are a helpful AI assistant for a company's internal documentation system.
-            Your role is to answer questions based ONLY on the provided context from company documents.
-
-            Guidelines:
-            - Only use information from the provided context
-            - If the context doesn't contain enough information, clearly state that
-            - Be concise but thorough in your responses
-            - Maintain a professional and helpful tone
-            - If you're not certain about something, acknowledge it
-            - Do not make up information or use external knowledge"""
-        ),
-        ("human", """Context from company documents:
-            {context}\n
-            User Question: {question}\n
-            Please provide a clear and accurate answer based on the context above.""")
-    ])
-
-    # output parser
-    parser = StrOutputParser()
-
-    # chain
-    chain = prompt | model | parser
-
-    # call chain
-    answer = chain.invoke({
-        'context': retrieved_texts,
+
+
+# ============================================
+#  RETRIEVE CONTEXT
+# ============================================
+def _reciprocal_rank_fusion(rankings: list[list[str]], k: int = RRF_K) -> list[str]:
+    """Merge ranked id lists: every list gives 1 / (k + rank) to each id it contains"""
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, 1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def _search(question: str, query_embedding: list[float], allowed_levels: list[int], k: int, include_embeddings: bool = False, document_ids: list[int] = None):
+    # Only the partitions of the allowed access levels are searched -> no access-level filter needed
+    where = {'document_id': {'$in': document_ids}} if document_ids is not None else None
+    if not HYBRID_SEARCH_ENABLED:
+        return vector_store.search(query_embedding, k=k, allowed_levels=allowed_levels, where=where, include_embeddings=include_embeddings)
+
+    # dense + keyword (BM25) candidates under the same access levels, fused by rank
+    candidates = max(HYBRID_CANDIDATES, k)
+    dense_hits = vector_store.search(query_embedding, k=candidates, allowed_levels=allowed_levels, where=where, include_embeddings=include_embeddings)
+    keyword_hits = keyword_index.search(question, k=candidates, allowed_levels=allowed_levels, document_ids=set(document_ids) if document_ids is not None else None)
+    fused_ids = _reciprocal_rank_fusion([[h.id for h in dense_hits], [chunk_id for chunk_id, _ in keyword_hits]])[:k]
+
+    # exact-term matches the dense search missed still need their text
+    hits = {h.id: h for h in dense_hits}
+    hits.update({h.id: h for h in vector_store.fetch([i for i in fused_ids if i not in hits], query_embedding)})
+    for chunk_id, _ in keyword_hits:
+        if chunk_id in hits:
+            hits[chunk_id].keyword_match = True
+    return [hits[i] for i in fused_ids if i in hits]
+
+
+def _mmr(query_embedding: list[float], hits: list, k: int, lambda_mult: float) -> list:
+    """Maximal marginal relevance on the embeddings the search already returned (no second query)"""
+    if len(hits) <= 1:
+        return hits[:k]
+    vectors = np.asarray([hit.embedding for hit in hits], dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query /= np.linalg.norm(query) + 1e-12
+
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+    selected = [int(np.argmax(relevance))]
+    closest = similarity[selected[0]].copy()     # max similarity of every candidate to the picked ones
+    while len(selected) < min(k, len(hits)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * closest
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        np.maximum(closest, similarity[best], out=closest)
+    return [hits[i] for i in selected]
+
+
+def _log_timings(timings: dict):
+    stages = [f'{stage}=skipped' if seconds is None else f'{stage}={seconds * 1000:.1f}ms' for stage, seconds in timings.items()]
+    logger.info('Retrieval stages: %s', ', '.join(stages))
+
+
+def retrieve_context(question: str, query_embedding: list[float], allowed_levels: list[int], options: dict = None, session_id: int = None, document_ids: list[int] = None):
+    """
+    Search the chunks the user may read, returns the matching chunks (may be empty).
+    options (per request, server defaults otherwise):
+        adaptive_k      -> keep every chunk above score_threshold, up to max_k
+        max_k           -> most chunks sent to the LLM (RETRIEVAL_MAX_K adaptive, RETRIEVAL_K fixed)
+        mmr             -> diversify the chunks with maximal marginal relevance (mmr_lambda)
+    With a session_id, follow-ups are answered from that session's previous candidates when they still match.
+    document_ids (request filters) limit the search to those documents.
+    """
+    options = {**RETRIEVAL_DEFAULTS, **(options or {})}
+    k = options.get('max_k') or (RETRIEVAL_MAX_K if options['adaptive_k'] else RETRIEVAL_K)
+    timings = {}
+    started = time.perf_counter()
+    if document_ids is not None and not document_ids:
+        return []       # the filters match no readable document
+    # the session's candidates may come from outside the filtered documents
+    use_session = session_id is not None and session_cache.enabled and document_ids is None
+
+    # follow-up question -> re-score the session's last candidates in memory
+    hits = session_cache.lookup(session_id, query_embedding, allowed_levels) if use_session else None
+    if hits is not None:
+        timings['session_cache'] = time.perf_counter() - started
+    else:
+        # most questions target one or two documents -> only search the chunks of the closest ones
+        if DOCUMENT_ROUTING_ENABLED:
+            document_ids = document_index.route(query_embedding, allowed_levels, ROUTING_TOP_DOCUMENTS, document_ids) or document_ids
+            timings['route'] = time.perf_counter() - started
+
+        # wider candidate pool when a reranker, MMR or the session cache picks from it later
+        stage_started = time.perf_counter()
+        pool_size = max(
+            k,
+            RERANK_CANDIDATES if reranker.enabled else 0,
+            MMR_CANDIDATES if options['mmr'] else 0,
+            SESSION_CACHE_CANDIDATES if use_session else 0
+        )
+        hits = _search(
+            question, query_embedding, allowed_levels, pool_size,
+            include_embeddings=options['mmr'] or use_session, document_ids=document_ids
+        )
+        timings['search'] = time.perf_counter() - stage_started
+        if use_session:
+            session_cache.store(session_id, allowed_levels, hits)
+
+    if reranker.enabled and len(hits) > k:
+        if reranker.fits_budget(time.perf_counter() - started):
+            stage_started = time.perf_counter()
+            hits = reranker.rerank(question, hits, len(hits))
+            timings['rerank'] = time.perf_counter() - stage_started
+        else:
+            timings['rerank'] = None        # over budget -> keep first-stage order
+
+    # trivial questions need one or two chunks, broad ones get up to max_k; the threshold is on cosine
+    # similarity, so exact-term (BM25) matches are kept whatever their cosine score
+    if options['adaptive_k']:
+        hits = [hit for i, hit in enumerate(hits) if i == 0 or hit.keyword_match or hit.score >= options['score_threshold']]
+
+    if options['mmr']:
+        stage_started = time.perf_counter()
+        hits = _mmr(query_embedding, hits, k, options['mmr_lambda'])
+        timings['mmr'] = time.perf_counter() - stage_started
+
+    _log_timings(timings)
+    return hits[:k]
+
+
+def _source_ids(retrieved_docs) -> set[int]:
+    return {i.metadata.get('document_id') for i in retrieved_docs}
+
+
+# ============================================
+#  ANSWER
+# ============================================
+async def _answer_embedded(question: str, query_embedding, allowed_levels: list[int], options: dict = None,
+                           session_id: int = None, document_ids: list[int] = None, report: dict = None) -> str:
+    """Answer a question whose embedding is already computed; report (optional) gets cached flag + stage timings"""
+    report = report if report is not None else {}
+
+    # same question (or a paraphrase) already answered for the same access levels (unfiltered answers only)
+    generation = answer_cache.generation
+    cached = answer_cache.lookup(query_embedding, allowed_levels) if document_ids is None else None
+    report['cached'] = cached is not None
+    if cached is not None:
+        return cached
+
+    # vector search is blocking -> keep it off the event loop
+    started = time.perf_counter()
+    retrieved_docs = await run_in_threadpool(retrieve_context, question, query_embedding, allowed_levels, options, session_id, document_ids)
+    report['retrieval_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    if not retrieved_docs:
+        return NO_CONTEXT_ANSWER
+
+    # call the shared, pre-compiled chain
+    llm_started = time.perf_counter()
+    answer = await get_provider().ainvoke({
+        'context': pack_context(retrieved_docs),
         'question': question
     })
+    report['llm_ms'] = round((time.perf_counter() - llm_started) * 1000, 1)
 
+    if document_ids is None:
+        answer_cache.store(query_embedding, allowed_levels, answer, _source_ids(retrieved_docs), time.perf_counter() - started, generation)
     return answer
+
+
+async def retrieve_answer(question: str, allowed_levels: list[int], options: dict = None, session_id: int = None, document_ids: list[int] = None) -> str:
+    # document_ids -> only these documents (already limited to the allowed levels), None -> all of them
+    # check valid question or not
+    if not question or not question.strip():
+        return INVALID_QUESTION_ANSWER
+
+    # embedding is blocking -> keep it off the event loop
+    query_embedding = await run_in_threadpool(embeddings.embed_query, question)
+    return await _answer_embedded(question, query_embedding, allowed_levels, options, session_id, document_ids)
+
+
+# ============================================
+#  BATCH ANSWERS
+# ============================================
+async def answer_batch(questions: list[str], allowed_levels: list[int], options: dict = None,
+                       document_ids: list[int] = None, max_concurrency: int = BATCH_MAX_CONCURRENCY, slot=None) -> list[dict]:
+    """
+    Answer many questions at once: one vectorized embedding call for all of them, then retrieval and
+    LLM calls run concurrently (at most max_concurrency questions in flight). slot (optional) -> async
+    context manager factory every question also holds while it is answered (process-wide limits).
+    Results keep the order of the questions, a failing question only fails its own item: status is
+    'failed', or 'unavailable' when the LLM could not take the call (circuit open / overloaded).
+    """
+    results = [
+        {'index': i, 'question': q, 'status': 'answered', 'answer': None, 'error': None, 'cached': False, 'timings': {}}
+        for i, q in enumerate(questions)
+    ]
+    valid = []
+    for result in results:
+        if result['question'] and result['question'].strip():
+            valid.append(result)
+        else:
+            result['status'], result['error'] = 'failed', INVALID_QUESTION_ANSWER
+
+    started = time.perf_counter()
+    try:
+        vectors = await run_in_threadpool(embeddings.embed_queries, [r['question'].strip() for r in valid])
+    except Exception as e:
+        for result in valid:
+            result['status'], result['error'] = 'failed', f'Embedding failed: {e}'
+        return results
+    embed_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def answer_one(result: dict, query_embedding):
+        item_started = time.perf_counter()
+        result['timings']['embed_ms'] = embed_ms         # shared by the whole batch
+        try:
+            async with semaphore, (slot() if slot is not None else nullcontext()):
+                result['answer'] = await _answer_embedded(
+                    result['question'].strip(), query_embedding, allowed_levels, options,
+                    document_ids=document_ids, report=result['timings']
+                )
+        except LLMUnavailable as e:
+            result['status'], result['error'] = 'unavailable', str(e)
+        except Exception as e:
+            result['status'], result['error'] = 'failed', str(e)
+        result['cached'] = result['timings'].pop('cached', False)
+        result['timings']['total_ms'] = round((time.perf_counter() - item_started) * 1000, 1)
+
+    await asyncio.gather(*(answer_one(result, vector) for result, vector in zip(valid, vectors)))
+    return results
+
+
+# ============================================
+#  STREAMING ANSWER
+# ============================================
+async def stream_answer(question: str, allowed_levels: list[int], options: dict = None, session_id: int = None, document_ids: list[int] = None):
+    """Same as retrieve_answer, but yields the answer token by token"""
+    if not question or not question.strip():
+        yield INVALID_QUESTION_ANSWER
+        return
+
+    query_embedding = await run_in_threadpool(embeddings.embed_query, question)
+
+    generation = answer_cache.generation
+    cached = answer_cache.lookup(query_embedding, allowed_levels) if document_ids is None else None
+    if cached is not None:
+        yield cached
+        return
+
+    started = time.perf_counter()
+    retrieved_docs = await run_in_threadpool(retrieve_context, question, query_embedding, allowed_levels, options, session_id, document_ids)
+    if not retrieved_docs:
+        yield NO_CONTEXT_ANSWER
+        return
+
+    tokens = []
+    async for token in get_provider().astream({
+        'context': pack_context(retrieved_docs),
+        'question': question
+    }):
+        tokens.append(token)
+        yield token
+
+    # only complete answers are worth reusing
+    if document_ids is None:
+        answer_cache.store(query_embedding, allowed_levels, ''.join(tokens), _source_ids(retrieved_docs), time.perf_counter() - started, generation)
@@ -0,0 +1,131 @@
+import time
+import threading
+import dataclasses
+from collections import OrderedDict
+import numpy as np
+from app.core.config import SESSION_CACHE_ENABLED, SESSION_CACHE_THRESHOLD, SESSION_CACHE_TTL_SECONDS, SESSION_CACHE_MAX_SESSIONS
+
+
+class _Candidates:
+    """The wider candidate set of a session's last full search"""
+
+    def __init__(self, levels: tuple, hits: list):
+        self.levels = levels
+        self.hits = hits
+        vectors = np.asarray([hit.embedding for hit in hits], dtype=np.float32)
+        self.vectors = vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+        self.document_ids = {hit.metadata.get('document_id') for hit in hits}
+        self.created_at = time.time()
+
+
+class SessionCandidateCache:
+    """
+    Follow-up questions in a chat session mostly hit the same documents. The candidates of the
+    last full search are kept per session and re-scored in memory against the next question; the
+    full index is searched again only when the best of them drops below the threshold.
+    """
+
+    def __init__(self, threshold: float, ttl_seconds: int, max_sessions: int, enabled: bool = True):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.enabled = enabled
+        self._sessions: OrderedDict[int, _Candidates] = OrderedDict()     # least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, session_id: int, query_embedding, allowed_levels) -> list | None:
+        """Cached candidates re-scored for this question (best first), None -> search the index"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            candidates = self._sessions.get(session_id)
+            if candidates is not None and (
+                time.time() - candidates.created_at >= self.ttl_seconds
+                or candidates.levels != tuple(sorted(set(allowed_levels)))     # role changed since
+            ):
+                del self._sessions[session_id]
+                candidates = None
+            if candidates is None:
+                self.misses += 1
+                return None
+
+            query = np.asarray(query_embedding, dtype=np.float32)
+            scores = candidates.vectors @ (query / (np.linalg.norm(query) + 1e-12))
+            if scores.max() < self.threshold:
+                self.misses += 1
+                return None
+            self._sessions.move_to_end(session_id)
+            self.hits += 1
+        order = np.argsort(-scores)
+        # keyword_match was for the earlier question's terms -> the new one is judged on its cosine score
+        return [dataclasses.replace(candidates.hits[i], score=float(scores[i]), keyword_match=False) for i in order]
+
+    def store(self, session_id: int, allowed_levels, hits: list):
+        if not self.enabled or not hits:
+            return
+        candidates = _Candidates(tuple(sorted(set(allowed_levels))), hits)
+        with self._lock:
+            self._sessions[session_id] = candidates
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def has(self, session_id: int, allowed_levels) -> bool:
+        """The session holds live candidates, i.e. its next search may be answered from them"""
+        if not self.enabled:
+            return False
+        with self._lock:
+            candidates = self._sessions.get(session_id)
+            return (
+                candidates is not None
+                and time.time() - candidates.created_at < self.ttl_seconds
+                and candidates.levels == tuple(sorted(set(allowed_levels)))
+            )
+
+    def copy(self, source_session_id: int, target_session_id: int):
+        """Give target the candidates of a full search another session ran for the same question"""
+        with self._lock:
+            candidates = self._sessions.get(source_session_id)
+            if candidates is None:
+                return
+            self._sessions[target_session_id] = candidates
+            self._sessions.move_to_end(target_session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def drop(self, session_id: int):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def invalidate_document(self, document_id: int):
+        """Deleted / updated document -> sessions holding its chunks search again"""
+        with self._lock:
+            for session_id in [s for s, c in self._sessions.items() if document_id in c.document_ids]:
+                del self._sessions[session_id]
+
+    def invalidate_access_level(self, access_level: int):
+        """A document added to (or moved to) this level is missing from the sessions that can see it"""
+        with self._lock:
+            for session_id in [s for s, c in self._sessions.items() if access_level in c.levels]:
+                del self._sessions[session_id]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'sessions': len(self._sessions),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+session_cache = SessionCandidateCache(
+    threshold=SESSION_CACHE_THRESHOLD,
+    ttl_seconds=SESSION_CACHE_TTL_SECONDS,
+    max_sessions=SESSION_CACHE_MAX_SESSIONS,
+    enabled=SESSION_CACHE_ENABLED
+)
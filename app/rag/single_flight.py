@@ -0,0 +1,47 @@
+import asyncio
+
+
+# ============================================
+#  SINGLE-FLIGHT
+# ============================================
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one in-flight computation: the first caller starts it,
+    later callers await the same task. The task is shielded, so a caller that goes away (cancelled
+    request) does not cancel the work the others are waiting for. Finished keys are forgotten, so
+    this only coalesces requests that overlap in time -> no stale results.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._inflight: dict = {}       # key -> asyncio.Task, event loop thread only
+        self.started = 0
+        self.coalesced = 0
+
+    async def run(self, key, factory):
+        """factory() -> awaitable, only called when no computation for key is in flight"""
+        if not self.enabled:
+            return await factory()
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()        # mark as retrieved even if every caller went away
+
+    def stats(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'in_flight': len(self._inflight),
+            'computations': self.started,
+            'coalesced_requests': self.coalesced
+        }
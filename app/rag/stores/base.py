@@ -0,0 +1,80 @@
+from dataclasses import dataclass
+import numpy as np
+
+
+ACCESS_LEVELS = (0, 1, 2)       # 0-admin only    1-admin+staff    2-public
+
+
+@dataclass
+class SearchHit:
+    id: str
+    text: str
+    metadata: dict
+    score: float                # cosine similarity, higher is better
+    embedding: list | None = None
+    keyword_match: bool = False     # found by the BM25 index -> relevant even with a low cosine score
+
+
+# ============================================
+#  VECTOR STORE INTERFACE
+# ============================================
+class VectorStore:
+    """
+    What ingestion and retrieval need from a vector store backend.
+    `where` filters use the Chroma dialect: {'field': value}, {'field': {'$in': [...]}}, {'$and': [...]}
+    """
+
+    def __init__(self, embedding_function):
+        self.embedding_function = embedding_function
+
+    def add_documents(self, documents, ids: list[str]) -> list[str]:
+        texts = [d.page_content for d in documents]
+        vectors = self.embedding_function.embed_documents(texts)
+        self.add_embedded(ids, texts, vectors, [d.metadata for d in documents])
+        return ids
+
+    def add_embedded(self, ids, texts, vectors, metadatas):
+        """Insert or replace chunks whose vectors are already computed"""
+        raise NotImplementedError
+
+    def delete(self, ids: list[str] = None, where: dict = None):
+        raise NotImplementedError
+
+    def get(self, ids: list[str] = None, where: dict = None, include: list[str] = ('documents', 'metadatas')) -> dict:
+        """{'ids': [...], <field>: [...] for every included field}"""
+        raise NotImplementedError
+
+    def update_metadata(self, ids: list[str], metadatas: list[dict]):
+        """Rewrite metadata without re-embedding"""
+        raise NotImplementedError
+
+    def search(self, query_embedding, k: int, allowed_levels: list[int], where: dict = None, include_embeddings: bool = False) -> list[SearchHit]:
+        """Top-k chunks of the allowed access levels, best score first"""
+        raise NotImplementedError
+
+    def save(self):
+        """Persist pending writes (no-op for backends that write through)"""
+
+    def close(self):
+        """Flush and release the backend (at shutdown)"""
+        self.save()
+
+    def count(self) -> int:
+        """Live chunks"""
+        return len(self.get(include=[])['ids'])
+
+    def stats(self) -> dict:
+        return {'backend': type(self).__name__}
+
+    def fetch(self, ids: list[str], query_embedding) -> list[SearchHit]:
+        """Load chunks by id as hits, scored against the query like a search would"""
+        if not ids:
+            return []
+        result = self.get(ids=ids, include=['documents', 'metadatas', 'embeddings'])
+        query = np.asarray(query_embedding, dtype=np.float32)
+        hits = []
+        for chunk_id, text, metadata, vector in zip(result['ids'], result['documents'], result['metadatas'], result['embeddings']):
+            vector = np.asarray(vector, dtype=np.float32)
+            score = float(vector @ query / ((np.linalg.norm(vector) * np.linalg.norm(query)) or 1.0))
+            hits.append(SearchHit(id=chunk_id, text=text, metadata=metadata, score=score, embedding=vector.tolist()))
+        return hits
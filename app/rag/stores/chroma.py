@@ -0,0 +1,103 @@
+from app.rag.stores.base import VectorStore, SearchHit, ACCESS_LEVELS
+
+
+# ============================================
+#  CHROMA BACKEND (ONE COLLECTION PER ACCESS LEVEL)
+# ============================================
+class PartitionedVectorStore(VectorStore):
+    """
+    One Chroma collection per access level. A search only visits the partitions the user may
+    read and merges their top-k by score, so public users never scan (or filter out) admin vectors,
+    and each partition can be tuned / compacted on its own.
+    """
+
+    def __init__(self, client, embedding_function, name: str = 'company_documents'):
+        super().__init__(embedding_function)
+        self.client = client
+        self.partitions = {
+            level: client.get_or_create_collection(name=f'{name}_level_{level}', metadata={'hnsw:space': 'cosine'})
+            for level in ACCESS_LEVELS
+        }
+
+    def _group_by_level(self, ids, *columns):
+        groups = {}
+        for row in zip(ids, *columns):
+            level = row[-1]['access_level']     # metadatas is always the last column
+            groups.setdefault(level, []).append(row)
+        return {level: list(zip(*rows)) for level, rows in groups.items()}
+
+    def add_embedded(self, ids, texts, vectors, metadatas):
+        for level, (l_ids, l_texts, l_vectors, l_metadatas) in self._group_by_level(ids, texts, vectors, metadatas).items():
+            self.partitions[level].upsert(ids=list(l_ids), documents=list(l_texts), embeddings=list(l_vectors), metadatas=list(l_metadatas))
+
+    def delete(self, ids: list[str] = None, where: dict = None):
+        for collection in self.partitions.values():
+            collection.delete(ids=ids, where=where)
+
+    def get(self, ids: list[str] = None, where: dict = None, include: list[str] = ('documents', 'metadatas')) -> dict:
+        merged = {'ids': [], **{field: [] for field in include}}
+        for collection in self.partitions.values():
+            result = collection.get(ids=ids, where=where, include=list(include))
+            merged['ids'].extend(result['ids'])
+            for field in include:
+                merged[field].extend(result[field] if result[field] is not None else [])
+        return merged
+
+    def update_metadata(self, ids: list[str], metadatas: list[dict]):
+        """Rewrite metadata without re-embedding; chunks whose access level changed move partition"""
+        current = self.get(ids=ids, include=['documents', 'metadatas', 'embeddings'])
+        stored = {i: (text, vector, meta) for i, text, vector, meta in zip(current['ids'], current['documents'], current['embeddings'], current['metadatas'])}
+        in_place_ids, in_place_metadatas, moved = [], [], []
+        for chunk_id, metadata in zip(ids, metadatas):
+            if chunk_id not in stored:
+                continue
+            if stored[chunk_id][2]['access_level'] == metadata['access_level']:
+                in_place_ids.append(chunk_id)
+                in_place_metadatas.append(metadata)
+            else:
+                moved.append((chunk_id, metadata))
+
+        for level, (l_ids, l_metadatas) in self._group_by_level(in_place_ids, in_place_metadatas).items():
+            self.partitions[level].update(ids=list(l_ids), metadatas=list(l_metadatas))
+        if moved:
+            moved_ids = [chunk_id for chunk_id, _ in moved]
+            self.delete(ids=moved_ids)
+            self.add_embedded(moved_ids, [stored[i][0] for i in moved_ids], [stored[i][1] for i in moved_ids], [m for _, m in moved])
+
+    def search(self, query_embedding, k: int, allowed_levels: list[int], where: dict = None, include_embeddings: bool = False) -> list[SearchHit]:
+        include = ['documents', 'metadatas', 'distances'] + (['embeddings'] if include_embeddings else [])
+        hits = []
+        for level in allowed_levels:
+            collection = self.partitions.get(level)
+            if collection is None or collection.count() == 0:
+                continue
+            result = collection.query(query_embeddings=[query_embedding], n_results=k, where=where, include=include)
+            vectors = result['embeddings'][0] if include_embeddings else [None] * len(result['ids'][0])
+            for chunk_id, text, metadata, distance, vector in zip(
+                result['ids'][0], result['documents'][0], result['metadatas'][0], result['distances'][0], vectors
+            ):
+                hits.append(SearchHit(id=chunk_id, text=text, metadata=metadata, score=1.0 - distance, embedding=vector))
+
+        # merge the partitions' top-k
+        hits.sort(key=lambda hit: hit.score, reverse=True)
+        return hits[:k]
+
+    def count(self) -> int:
+        return sum(c.count() for c in self.partitions.values())
+
+    def stats(self) -> dict:
+        return {'backend': 'chroma', 'chunks_per_access_level': {level: c.count() for level, c in self.partitions.items()}}
+
+
+def migrate_legacy_collection(client, store: PartitionedVectorStore, name: str = 'company_documents', page_size: int = 1000):
+    """Move chunks from the old single collection into the access-level partitions (runs once)"""
+    if name not in [c if isinstance(c, str) else c.name for c in client.list_collections()]:
+        return
+    legacy = client.get_collection(name)
+    while True:
+        page = legacy.get(limit=page_size, include=['documents', 'metadatas', 'embeddings'])
+        if not page['ids']:
+            break
+        store.add_embedded(page['ids'], page['documents'], page['embeddings'], page['metadatas'])
+        legacy.delete(ids=page['ids'])
+    client.delete_collection(name)
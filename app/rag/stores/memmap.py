@@ -0,0 +1,496 @@
+import os
+import json
+import glob
+import logging
+import threading
+import numpy as np
+from app.rag.stores.base import VectorStore, SearchHit
+
+
+logger = logging.getLogger(__name__)
+
+
+FILTER_COLUMNS = {'document_id': '_document_ids', 'access_level': '_access_levels'}     # metadata a where filter can use
+CODE_TYPES = {'float16': np.float16, 'int8': np.int8}
+BLOCK_BYTES = 2 ** 20           # codes are widened to float32 this much at a time, small enough to stay in the L2 cache
+COMPACT_MIN_DEAD = 1000         # rewrite the files once deleted rows outnumber live ones (and at least this many)
+
+
+# ============================================
+#  NUMPY BACKEND (MEMORY-MAPPED, BRUTE FORCE)
+# ============================================
+class MemmapVectorStore(VectorStore):
+    """
+    Exact cosine search over a memory-mapped float32 matrix. Rows are normalized on insert, so a search
+    is one matrix-vector product plus a top-k partition. Filters run on small in-memory columns
+    (access level, document id, alive); texts and full metadata live in an append-only JSON-lines file
+    and are only read for the hits. Startup maps the matrix and loads the columns, nothing is rebuilt.
+
+    With quantization ('float16' / 'int8', optionally on the first truncate_dim dimensions) a compact
+    copy of the matrix is scanned first; only its best k * rescore_factor rows are re-scored exactly from
+    the full-precision matrix. The codes are stored next to the float32 file, so disk use grows; what
+    goes down is RAM / page-cache pressure, as a search only touches the full matrix for the shortlist.
+    int8 also scans faster than the exact search; float16 does not (NumPy widens it to float32 without
+    SIMD), it only saves memory.
+
+    Files (the generation changes when deleted rows are compacted away):
+        vectors-<gen>.f32   rows x dim float32, grown by doubling
+        records-<gen>.jsonl [id, text, metadata] per line, rows point at their line by byte offset
+        codes-<gen>-<q><dim>  quantized (truncated) rows, rebuilt from the vectors when missing
+        columns.npz         ids, offsets, filter columns and int8 scales, replaced atomically on save()
+    """
+
+    def __init__(self, directory: str, embedding_function, initial_capacity: int = 1024,
+                 quantization: str = 'none', truncate_dim: int = 0, rescore_factor: int = 4):
+        super().__init__(embedding_function)
+        if quantization not in ('none', *CODE_TYPES):
+            raise ValueError(f'Unknown quantization {quantization!r}')
+        self.directory = directory
+        self.initial_capacity = initial_capacity
+        self.quantization = quantization
+        self.truncate_dim = truncate_dim
+        self.rescore_factor = rescore_factor
+        self._columns_path = os.path.join(directory, 'columns.npz')
+        self._lock = threading.RLock()
+        self._generation = 0
+        self.dim = None
+        self._vectors = None                # memmap (capacity, dim)
+        self._codes = None                  # memmap (capacity, code_dim) when quantized
+        self._size = 0                      # rows in use, live or deleted
+        self._ids: list[str] = []           # row -> chunk id
+        self._rows: dict[str, int] = {}     # chunk id -> row, live rows only
+        self._offsets = np.zeros(0, dtype=np.int64)
+        self._document_ids = np.zeros(0, dtype=np.int64)
+        self._access_levels = np.zeros(0, dtype=np.int8)
+        self._alive = np.zeros(0, dtype=bool)
+        self._scales = np.zeros(0, dtype=np.float32)    # int8 code -> value, per row
+        self._dirty = False
+        self._load()
+
+    @property
+    def code_dim(self) -> int:
+        return min(self.truncate_dim or self.dim, self.dim)
+
+    # ---------- files ----------
+    def _vectors_path(self, generation: int = None) -> str:
+        return os.path.join(self.directory, f'vectors-{self._generation if generation is None else generation}.f32')
+
+    def _records_path(self, generation: int = None) -> str:
+        return os.path.join(self.directory, f'records-{self._generation if generation is None else generation}.jsonl')
+
+    def _codes_path(self, generation: int = None) -> str:
+        generation = self._generation if generation is None else generation
+        return os.path.join(self.directory, f'codes-{generation}-{self.quantization}{self.code_dim}.bin')
+
+    def _map(self, capacity: int):
+        self._vectors = np.memmap(self._vectors_path(), dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+
+    def _map_codes(self, capacity: int) -> bool:
+        """Map (and size) the codes file, True when it did not exist yet"""
+        path = self._codes_path()
+        created = not os.path.exists(path)
+        code_type = CODE_TYPES[self.quantization]
+        with open(path, 'ab') as f:
+            f.truncate(capacity * self.code_dim * np.dtype(code_type).itemsize)
+        self._codes = np.memmap(path, dtype=code_type, mode='r+', shape=(capacity, self.code_dim))
+        return created
+
+    def _quantize(self, vectors):
+        """(codes, int8 scales or None) of normalized full-precision rows"""
+        vectors = np.asarray(vectors)[:, :self.code_dim]
+        if self.quantization == 'float16':
+            return vectors.astype(np.float16), None
+        scales = np.abs(vectors).max(axis=1) / 127 + 1e-12
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales
+
+    def _encode_rows(self, start: int, end: int, page_size: int = 4096):
+        """Quantize rows start..end of the (normalized) full-precision matrix into the codes"""
+        for page in range(start, end, page_size):
+            codes, scales = self._quantize(self._vectors[page:min(page + page_size, end)])
+            self._codes[page:page + len(codes)] = codes
+            if scales is not None:
+                self._scales[page:page + len(codes)] = scales
+
+    def _load(self):
+        if not os.path.exists(self._columns_path):
+            return
+        data = np.load(self._columns_path, allow_pickle=False)
+        self._generation = int(data['generation'])
+        self.dim = int(data['dim'])
+        self._ids = json.loads(str(data['ids']))
+        self._size = len(self._ids)
+        capacity = os.path.getsize(self._vectors_path()) // (self.dim * 4)
+        self._map(capacity)
+        self._offsets = self._resized(data['offsets'], capacity)
+        self._document_ids = self._resized(data['document_ids'], capacity)
+        self._access_levels = self._resized(data['access_levels'], capacity)
+        self._alive = self._resized(data['alive'], capacity)
+        self._scales = self._resized(data['scales'] if 'scales' in data.files else np.zeros(0, dtype=np.float32), capacity)
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self._ids) if self._alive[row]}
+
+        # first start with this quantization (or after changing it) -> encode the stored vectors once
+        if self.quantization != 'none' and self._map_codes(capacity):
+            self._encode_rows(0, self._size)
+            self._dirty = True
+
+        # files of an interrupted compaction
+        current = (self._vectors_path(), self._records_path(), self._codes_path() if self.quantization != 'none' else None)
+        for pattern in ('vectors-*.f32', 'records-*.jsonl', 'codes-*.bin'):
+            for path in glob.glob(os.path.join(self.directory, pattern)):
+                if path not in current:
+                    os.remove(path)
+
+    @staticmethod
+    def _resized(column, capacity: int):
+        resized = np.zeros(capacity, dtype=column.dtype)
+        kept = min(len(column), capacity)
+        resized[:kept] = column[:kept]
+        return resized
+
+    def _grow(self, required: int):
+        if self._vectors is not None and required <= len(self._vectors):
+            return
+        capacity = max(self.initial_capacity, len(self._alive))
+        while capacity < required:
+            capacity *= 2
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        if self._codes is not None:
+            self._codes.flush()
+            self._codes = None
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._vectors_path(), 'ab') as f:
+            f.truncate(capacity * self.dim * 4)     # new rows read as zeros
+        self._map(capacity)
+        if self.quantization != 'none':
+            self._map_codes(capacity)
+        self._offsets = self._resized(self._offsets, capacity)
+        self._document_ids = self._resized(self._document_ids, capacity)
+        self._access_levels = self._resized(self._access_levels, capacity)
+        self._alive = self._resized(self._alive, capacity)
+        self._scales = self._resized(self._scales, capacity)
+
+    def _append_records(self, ids, texts, metadatas, path: str = None) -> list[int]:
+        offsets = []
+        with open(path or self._records_path(), 'ab') as f:
+            position = f.tell()
+            for record in zip(ids, texts, metadatas):
+                line = (json.dumps(record) + '\n').encode()
+                offsets.append(position)
+                position += len(line)
+                f.write(line)
+        return offsets
+
+    def _read_records(self, rows) -> list:
+        """[id, text, metadata] per row"""
+        if not len(rows):
+            return []
+        with open(self._records_path(), 'rb') as f:
+            records = []
+            for row in rows:
+                f.seek(self._offsets[row])
+                records.append(json.loads(f.readline()))
+            return records
+
+    # ---------- filters ----------
+    def _where_mask(self, where: dict):
+        mask = np.ones(self._size, dtype=bool)
+        for field, condition in where.items():
+            if field == '$and':
+                for clause in condition:
+                    mask &= self._where_mask(clause)
+                continue
+            if field not in FILTER_COLUMNS:
+                raise ValueError(f"Cannot filter on '{field}', only on {', '.join(FILTER_COLUMNS)}")
+            column = getattr(self, FILTER_COLUMNS[field])[:self._size]
+            operator, value = next(iter(condition.items())) if isinstance(condition, dict) else ('$eq', condition)
+            if operator == '$eq':
+                mask &= column == value
+            elif operator == '$ne':
+                mask &= column != value
+            elif operator == '$in':
+                mask &= np.isin(column, list(value))
+            elif operator == '$nin':
+                mask &= ~np.isin(column, list(value))
+            else:
+                raise ValueError(f'Unsupported filter operator {operator}')
+        return mask
+
+    def _select(self, ids: list[str] = None, where: dict = None):
+        """Live rows matching ids (kept in the given order) and / or the filter"""
+        if ids is not None:
+            rows = np.array([self._rows[i] for i in ids if i in self._rows], dtype=np.int64)
+            return rows[self._where_mask(where)[rows]] if where and len(rows) else rows
+        mask = self._alive[:self._size].copy()
+        if where:
+            mask &= self._where_mask(where)
+        return np.flatnonzero(mask)
+
+    # ---------- updates ----------
+    def add_embedded(self, ids, texts, vectors, metadatas):
+        if not len(ids):
+            return
+        vectors = np.array(vectors, dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            # upsert -> the previous version of an id stops being live
+            self._kill([self._rows[i] for i in ids if i in self._rows])
+
+            start, end = self._size, self._size + len(ids)
+            self._grow(end)
+            self._vectors[start:end] = vectors
+            if self._codes is not None:
+                self._encode_rows(start, end)
+            self._offsets[start:end] = self._append_records(ids, texts, metadatas)
+            self._document_ids[start:end] = [m['document_id'] for m in metadatas]
+            self._access_levels[start:end] = [m['access_level'] for m in metadatas]
+            self._alive[start:end] = True
+            self._ids.extend(ids)
+            for row, chunk_id in enumerate(ids, start):
+                previous = self._rows.get(chunk_id)
+                if previous is not None:
+                    self._alive[previous] = False       # same id twice in one batch -> last one wins
+                self._rows[chunk_id] = row
+            self._size = end
+            self._dirty = True
+
+    def _kill(self, rows):
+        for row in rows:
+            self._alive[row] = False
+            self._rows.pop(self._ids[row], None)
+        self._dirty = True
+
+    def delete(self, ids: list[str] = None, where: dict = None):
+        with self._lock:
+            if self._size:
+                self._kill(self._select(ids, where).tolist())
+
+    def update_metadata(self, ids: list[str], metadatas: list[dict]):
+        with self._lock:
+            pairs = [(self._rows[i], m) for i, m in zip(ids, metadatas) if i in self._rows]
+            if not pairs:
+                return
+            rows = [row for row, _ in pairs]
+            texts = [record[1] for record in self._read_records(rows)]
+            self._offsets[rows] = self._append_records([self._ids[row] for row in rows], texts, [m for _, m in pairs])
+            self._document_ids[rows] = [m['document_id'] for _, m in pairs]
+            self._access_levels[rows] = [m['access_level'] for _, m in pairs]
+            self._dirty = True
+
+    # ---------- reads ----------
+    def get(self, ids: list[str] = None, where: dict = None, include: list[str] = ('documents', 'metadatas')) -> dict:
+        with self._lock:
+            rows = self._select(ids, where) if self._size else np.zeros(0, dtype=np.int64)
+            result = {'ids': [self._ids[row] for row in rows]}
+            if 'documents' in include or 'metadatas' in include:
+                records = self._read_records(rows)
+                if 'documents' in include:
+                    result['documents'] = [record[1] for record in records]
+                if 'metadatas' in include:
+                    result['metadatas'] = [record[2] for record in records]
+            if 'embeddings' in include:
+                result['embeddings'] = list(np.array(self._vectors[rows])) if len(rows) else []
+            return result
+
+    def search(self, query_embedding, k: int, allowed_levels: list[int], where: dict = None, include_embeddings: bool = False) -> list[SearchHit]:
+        """
+        Only the filtering and the final record reads hold the lock; the scan runs on a snapshot of the
+        matrices (NumPy releases the GIL), so searches run in parallel and don't wait for ingestion.
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) + 1e-12)
+        while True:
+            with self._lock:
+                n = self._size
+                if not n:
+                    return []
+                mask = self._alive[:n] & np.isin(self._access_levels[:n], allowed_levels)
+                if where:
+                    mask &= self._where_mask(where)
+                candidates = np.flatnonzero(mask)
+                if not len(candidates):
+                    return []
+                # rows below n are never rewritten in place, grown / compacted matrices are new objects
+                generation, vectors, codes, scales = self._generation, self._vectors, self._codes, self._scales
+
+            # approximate pass on the codes, only the best k * rescore_factor rows are scored exactly
+            if codes is not None:
+                approximate = self._scores(codes, candidates, query[:self.code_dim], n)
+                if self.quantization == 'int8':
+                    approximate *= scales[candidates]
+                shortlist = min(len(candidates), k * self.rescore_factor)
+                candidates = np.sort(candidates[np.argpartition(-approximate, shortlist - 1)[:shortlist]])    # sorted -> sequential reads
+
+            scores = self._scores(vectors, candidates, query, n)
+            top = min(k, len(candidates))
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[np.argsort(-scores[best])]
+            rows, row_scores = candidates[best], scores[best]
+
+            with self._lock:
+                if self._generation != generation:
+                    continue        # compacted meanwhile -> row numbers changed, search again
+                # deleted while scoring -> dropped
+                keep = self._alive[rows]
+                rows, row_scores = rows[keep], row_scores[keep]
+                return [
+                    SearchHit(
+                        id=chunk_id, text=text, metadata=metadata, score=float(score),
+                        embedding=vectors[row].tolist() if include_embeddings else None
+                    )
+                    for row, score, (chunk_id, text, metadata) in zip(rows, row_scores, self._read_records(rows))
+                ]
+
+    def _scores(self, matrix, candidates, query, size: int, page_size: int = 4096):
+        """
+        Dot products of the candidate rows with the query, page_size rows at a time. Codes are widened
+        into one float32 block that stays in the CPU cache, so the scan streams only the compact codes
+        from memory and the product itself is still a BLAS float32 one
+        """
+        block = None
+        if matrix.dtype != np.float32:
+            page_size = max(64, BLOCK_BYTES // (4 * matrix.shape[1]))
+            block = np.empty((page_size, matrix.shape[1]), dtype=np.float32)
+
+        def dot(rows, out):
+            if block is not None:
+                np.copyto(block[:len(rows)], rows, casting='unsafe')
+                rows = block[:len(rows)]
+            np.dot(rows, query, out=out)
+
+        # most rows allowed -> scanning the whole matrix sequentially beats gathering the rows first
+        if len(candidates) > size // 2:
+            scores = np.empty(size, dtype=np.float32)
+            for start in range(0, size, page_size):
+                end = min(start + page_size, size)
+                dot(matrix[start:end], scores[start:end])
+            return scores[candidates]
+        scores = np.empty(len(candidates), dtype=np.float32)
+        for start in range(0, len(candidates), page_size):
+            rows = candidates[start:start + page_size]
+            dot(matrix[rows], scores[start:start + len(rows)])
+        return scores
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._rows)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                'backend': 'memmap',
+                'chunks': len(self._rows),
+                'rows': self._size,
+                'dim': self.dim,
+                'quantization': self.quantization,
+                'full_precision_mb': round(self._size * (self.dim or 0) * 4 / 2 ** 20, 1)
+            }
+            if self._codes is not None:
+                stats['code_dim'] = self.code_dim
+                stats['codes_mb'] = round(self._size * self.code_dim * self._codes.itemsize / 2 ** 20, 1)
+            return stats
+
+    # ---------- persistence ----------
+    def save(self):
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+            if self._codes is not None:
+                self._codes.flush()
+            if not self._dirty:
+                return
+            dead = self._size - len(self._rows)
+            if dead >= COMPACT_MIN_DEAD and dead > len(self._rows):
+                try:
+                    self._compact()
+                except Exception:
+                    # the current generation is untouched -> keep serving it, compact on a later save
+                    logger.exception('Compacting %s failed', self.directory)
+            self._write_columns()
+            self._dirty = False
+
+    def _write_columns(self):
+        n = self._size
+        tmp_path = self._columns_path + '.tmp.npz'
+        np.savez(
+            tmp_path,
+            generation=np.array(self._generation),
+            dim=np.array(self.dim),
+            ids=np.array(json.dumps(self._ids)),
+            offsets=self._offsets[:n],
+            document_ids=self._document_ids[:n],
+            access_levels=self._access_levels[:n],
+            alive=self._alive[:n],
+            scales=self._scales[:n]
+        )
+        os.replace(tmp_path, self._columns_path)
+
+    def _compact(self, page_size: int = 4096):
+        """
+        Copy the live rows into the next generation's files. The new generation is built aside and only
+        swapped in once columns.npz points at it; until then (or if anything fails) the current one stays.
+        """
+        generation = self._generation + 1
+        old_paths = [self._vectors_path(), self._records_path()] + ([self._codes_path()] if self._codes is not None else [])
+        new_paths = [self._vectors_path(generation), self._records_path(generation)] + ([self._codes_path(generation)] if self._codes is not None else [])
+        live = np.flatnonzero(self._alive[:self._size])
+        count = len(live)
+        capacity = self.initial_capacity
+        while capacity < count:
+            capacity *= 2
+
+        try:
+            with open(new_paths[0], 'wb') as f:
+                f.truncate(capacity * self.dim * 4)
+            open(new_paths[1], 'wb').close()
+            vectors = np.memmap(new_paths[0], dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+            codes = None
+            if self._codes is not None:
+                with open(new_paths[2], 'wb') as f:
+                    f.truncate(capacity * self.code_dim * self._codes.itemsize)
+                codes = np.memmap(new_paths[2], dtype=self._codes.dtype, mode='r+', shape=(capacity, self.code_dim))
+            scales = np.zeros(capacity, dtype=np.float32)
+            offsets = np.zeros(capacity, dtype=np.int64)
+            ids = []
+            for start in range(0, count, page_size):
+                end = min(start + page_size, count)
+                rows = live[start:end]
+                vectors[start:end] = self._vectors[rows]
+                if codes is not None:
+                    codes[start:end] = self._codes[rows]
+                    scales[start:end] = self._scales[rows]
+                records = self._read_records(rows)
+                offsets[start:end] = self._append_records(*zip(*records), path=new_paths[1])
+                ids.extend(chunk_id for chunk_id, _, _ in records)
+            vectors.flush()
+            if codes is not None:
+                codes.flush()
+        except Exception:
+            for path in new_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+
+        previous = (self._generation, self._vectors, self._codes, self._size, self._ids, self._rows,
+                    self._offsets, self._document_ids, self._access_levels, self._alive, self._scales)
+        self._generation, self._vectors, self._codes, self._size = generation, vectors, codes, count
+        self._ids, self._rows = ids, {chunk_id: row for row, chunk_id in enumerate(ids)}
+        self._offsets = offsets
+        self._document_ids = self._resized(self._document_ids[live], capacity)
+        self._access_levels = self._resized(self._access_levels[live], capacity)
+        self._alive = self._resized(np.ones(count, dtype=bool), capacity)
+        self._scales = scales
+        try:
+            self._write_columns()
+        except Exception:
+            (self._generation, self._vectors, self._codes, self._size, self._ids, self._rows,
+             self._offsets, self._document_ids, self._access_levels, self._alive, self._scales) = previous
+            for path in new_paths:
+                os.remove(path)
+            raise
+        del previous
+        for path in old_paths:
+            os.remove(path)
@@ -0,0 +1,187 @@
+import os
+import zlib
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from app.rag.stores.base import VectorStore, SearchHit
+from app.rag.stores.memmap import MemmapVectorStore
+
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================
+#  SHARD WORKER PROCESS
+# ============================================
+def _serve_shard(connection, directory: str, options: dict):
+    """Runs in the shard process: one memmap store, answering (method, args, kwargs) requests in order"""
+    store = MemmapVectorStore(directory, None, **options)
+    while True:
+        try:
+            method, args, kwargs = connection.recv()
+        except EOFError:        # parent is gone
+            break
+        try:
+            connection.send((True, getattr(store, method)(*args, **kwargs)))
+        except Exception as e:
+            connection.send((False, f'{type(e).__name__}: {e}'))
+        if method == 'close':
+            break
+    store.save()
+
+
+READ_METHODS = ('get', 'search', 'stats')      # safe to send again to a restarted shard
+
+
+class ShardUnavailable(RuntimeError):
+    """A shard process died; it was restarted from its last saved state"""
+
+
+class _Shard:
+    def __init__(self, context, directory: str, options: dict):
+        self.context = context
+        self.directory = directory
+        self.options = options
+        self.restarts = 0
+        self._lock = threading.Lock()       # one request at a time on the pipe
+        self._start()
+
+    def _start(self):
+        self.connection, child = self.context.Pipe()
+        self.process = self.context.Process(target=_serve_shard, args=(child, self.directory, self.options), daemon=True)
+        self.process.start()
+        child.close()
+
+    def _restart(self):
+        logger.warning('Vector shard %s died (exit code %s), restarting it', self.directory, self.process.exitcode)
+        self.connection.close()
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=10)
+        self.restarts += 1
+        self._start()
+
+    def _send(self, method: str, args, kwargs):
+        self.connection.send((method, args, kwargs))
+        return self.connection.recv()
+
+    def call(self, method: str, *args, **kwargs):
+        """
+        A dead worker is restarted on the same directory. Reads are sent again; writes raise
+        ShardUnavailable, since the writes it had not saved yet are gone and the caller has to redo them.
+        """
+        with self._lock:
+            if method == 'close' and not self.process.is_alive():
+                return None
+            try:
+                if not self.process.is_alive():
+                    raise EOFError('shard process is not running')
+                ok, result = self._send(method, args, kwargs)
+            except (EOFError, OSError) as e:        # OSError covers BrokenPipeError / ConnectionResetError
+                self._restart()
+                if method not in READ_METHODS:
+                    raise ShardUnavailable(f'Vector shard {self.directory} died during {method}, it was restarted from its last save: {e}') from e
+                ok, result = self._send(method, args, kwargs)
+        if not ok:
+            raise RuntimeError(f'Vector shard failed: {result}')
+        return result
+
+
+# ============================================
+#  SHARDED BACKEND (SCATTER-GATHER)
+# ============================================
+class ShardedVectorStore(VectorStore):
+    """
+    Chunks are spread over local worker processes by a hash of their document_id, every shard
+    being a memmap store of its own. Writes go to the owning shard; searches are sent to all
+    shards at once (or only the owners of the filtered documents) and their top-k merged by score.
+    """
+
+    def __init__(self, directory: str, embedding_function, shards: int, **shard_options):
+        super().__init__(embedding_function)
+        # spawn -> the shard processes only import the memmap store, not the app / embedding model
+        context = multiprocessing.get_context('spawn')
+        self.shards = [_Shard(context, os.path.join(directory, f'shard-{i}'), shard_options) for i in range(shards)]
+        self._executor = ThreadPoolExecutor(max_workers=shards, thread_name_prefix='vector-shard')
+
+    def _shard_of(self, document_id) -> int:
+        # crc32 instead of hash() -> the same shard in every process and after restarts
+        return zlib.crc32(str(document_id).encode()) % len(self.shards)
+
+    def _shards_for(self, where: dict = None) -> list[int]:
+        """Shards that can hold rows matching the filter (all of them unless it names document ids)"""
+        condition = (where or {}).get('document_id')
+        if condition is None:
+            return list(range(len(self.shards)))
+        if isinstance(condition, dict):
+            if '$in' not in condition:
+                return list(range(len(self.shards)))
+            return sorted({self._shard_of(document_id) for document_id in condition['$in']})
+        return [self._shard_of(condition)]
+
+    def _scatter(self, shard_numbers, method: str, *args, **kwargs) -> list:
+        if len(shard_numbers) == 1:
+            return [self.shards[shard_numbers[0]].call(method, *args, **kwargs)]
+        futures = [self._executor.submit(self.shards[i].call, method, *args, **kwargs) for i in shard_numbers]
+        return [future.result() for future in futures]
+
+    def _route(self, method: str, ids, *columns):
+        """Send every row (id, *columns, metadata) to the shard owning its document"""
+        groups = {}
+        for row in zip(ids, *columns):
+            groups.setdefault(self._shard_of(row[-1]['document_id']), []).append(row)
+        futures = [self._executor.submit(self.shards[i].call, method, *map(list, zip(*rows))) for i, rows in groups.items()]
+        for future in futures:
+            future.result()
+
+    # ---------- updates ----------
+    def add_embedded(self, ids, texts, vectors, metadatas):
+        self._route('add_embedded', ids, texts, np.asarray(vectors, dtype=np.float32), metadatas)
+
+    def delete(self, ids: list[str] = None, where: dict = None):
+        self._scatter(self._shards_for(where), 'delete', ids=ids, where=where)
+
+    def update_metadata(self, ids: list[str], metadatas: list[dict]):
+        # re-ingestion keeps the document id -> the chunks stay on their shard
+        self._route('update_metadata', ids, metadatas)
+
+    # ---------- reads ----------
+    def get(self, ids: list[str] = None, where: dict = None, include: list[str] = ('documents', 'metadatas')) -> dict:
+        merged = {'ids': [], **{field: [] for field in include}}
+        for result in self._scatter(self._shards_for(where), 'get', ids=ids, where=where, include=list(include)):
+            for field in merged:
+                merged[field].extend(result[field])
+        return merged
+
+    def search(self, query_embedding, k: int, allowed_levels: list[int], where: dict = None, include_embeddings: bool = False) -> list[SearchHit]:
+        results = self._scatter(
+            self._shards_for(where), 'search', list(query_embedding), k, allowed_levels,
+            where=where, include_embeddings=include_embeddings
+        )
+        # merge the shards' top-k
+        hits = [hit for shard_hits in results for hit in shard_hits]
+        hits.sort(key=lambda hit: hit.score, reverse=True)
+        return hits[:k]
+
+    # ---------- persistence ----------
+    def save(self):
+        self._scatter(list(range(len(self.shards))), 'save')
+
+    def close(self):
+        self._scatter(list(range(len(self.shards))), 'close')
+        for shard in self.shards:
+            shard.process.join(timeout=10)
+
+    def count(self) -> int:
+        return sum(self._scatter(list(range(len(self.shards))), 'count'))
+
+    def stats(self) -> dict:
+        shards = self._scatter(list(range(len(self.shards))), 'stats')
+        return {
+            'backend': 'sharded',
+            'chunks': sum(s['chunks'] for s in shards),
+            'restarts': sum(shard.restarts for shard in self.shards),
+            'shards': shards
+        }
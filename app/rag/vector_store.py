@@ -1,13 +1,78 @@
+import atexit
 from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
+from app.rag.embeddings import PooledEmbeddings, CachedEmbeddings, QueryCachedEmbeddings
+from app.rag.embedding_cache import DiskEmbeddingCache, QueryEmbeddingCache
+from app.rag.keyword_index import KeywordIndex, reconcile_with_vector_store
+from app.rag.document_index import DocumentRoutingIndex, rebuild_from_vector_store as rebuild_routing_from_vector_store
+from app.rag.stores.base import VectorStore
+from app.rag.stores.memmap import MemmapVectorStore
+from app.rag.stores.sharded import ShardedVectorStore
+from app.core.config import (
+    EMBED_BATCH_SIZE, EMBED_PROCESSES,
+    EMBEDDING_CACHE_ENABLED, EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_ENTRIES,
+    QUERY_CACHE_ENABLED, QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL_SECONDS,
+    KEYWORD_INDEX_DIR, KEYWORD_MAX_DF, DOCUMENT_ROUTING_ENABLED, ROUTING_INDEX_DIR, VECTOR_BACKEND, VECTOR_STORE_DIR,
+    VECTOR_QUANTIZATION, VECTOR_TRUNCATE_DIM, VECTOR_RESCORE_FACTOR, VECTOR_SHARDS
+)
 
 
-# Initialize vector store
-vector_store = Chroma(
-    collection_name='company_documents',
-    embedding_function=HuggingFaceEmbeddings(),
-    persist_directory='chroma_db'
-)
+# Embedding model -> shared by ingestion, retrieval and the answer cache
+base_embeddings = HuggingFaceEmbeddings()
+pooled_embeddings = PooledEmbeddings(base_embeddings, batch_size=EMBED_BATCH_SIZE, processes=EMBED_PROCESSES)
+embeddings = pooled_embeddings
+
+# Re-uploads, reindexing and restarts reuse vectors computed before
+embedding_cache = None
+if EMBEDDING_CACHE_ENABLED:
+    embedding_cache = DiskEmbeddingCache(EMBEDDING_CACHE_DIR, base_embeddings.model_name, EMBEDDING_CACHE_MAX_ENTRIES)
+    atexit.register(embedding_cache.flush)
+    embeddings = CachedEmbeddings(embeddings, embedding_cache)
+
+# Repeated / retried questions skip the query embedding
+query_cache = None
+if QUERY_CACHE_ENABLED:
+    query_cache = QueryEmbeddingCache(QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL_SECONDS)
+    embeddings = QueryCachedEmbeddings(embeddings, query_cache)
+
+
+# ============================================
+#  VECTOR STORE BACKEND
+# ============================================
+def create_vector_store(backend: str = VECTOR_BACKEND) -> VectorStore:
+    """
+    'chroma'  -> one Chroma collection per access level
+    'memmap'  -> in-process NumPy index
+    'sharded' -> VECTOR_SHARDS memmap indexes in worker processes, split by document
+    """
+    memmap_options = {'quantization': VECTOR_QUANTIZATION, 'truncate_dim': VECTOR_TRUNCATE_DIM, 'rescore_factor': VECTOR_RESCORE_FACTOR}
+    if backend == 'memmap':
+        return MemmapVectorStore(VECTOR_STORE_DIR, embeddings, **memmap_options)
+    if backend == 'sharded':
+        return ShardedVectorStore(VECTOR_STORE_DIR, embeddings, VECTOR_SHARDS, **memmap_options)
+    if backend == 'chroma':
+        import chromadb
+        from app.rag.stores.chroma import PartitionedVectorStore, migrate_legacy_collection
+        client = chromadb.PersistentClient(path='chroma_db')
+        store = PartitionedVectorStore(client, embeddings)
+        migrate_legacy_collection(client, store)
+        return store
+    raise ValueError(f'Unknown VECTOR_BACKEND {backend!r}')
+
+
+vector_store = create_vector_store()
+atexit.register(vector_store.close)
+
+# Keyword (BM25) index maintained next to the vectors, for hybrid retrieval
+keyword_index = KeywordIndex(KEYWORD_INDEX_DIR, max_df=KEYWORD_MAX_DF)
+reconcile_with_vector_store(keyword_index, vector_store)
+atexit.register(keyword_index.close)        # saves are debounced -> write the last changes
+
+# One centroid per document -> retrieval can narrow the chunk search to the closest documents
+document_index = DocumentRoutingIndex(ROUTING_INDEX_DIR)
+if not DOCUMENT_ROUTING_ENABLED:
+    document_index.clear()      # not maintained while routing is off -> rebuilt once it is turned on
+elif not len(document_index):
+    rebuild_routing_from_vector_store(document_index, vector_store)
 
 
 def all_docs():
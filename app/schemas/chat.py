@@ -1,5 +1,6 @@
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
+from typing import Optional
 
 
 class ChatSessionOut(BaseModel):
@@ -11,8 +12,29 @@ class ChatSessionOut(BaseModel):
         from_attributes = True
 
 
+class RetrievalOptions(BaseModel):
+    adaptive_k: Optional[bool] = None                                   # keep chunks above score_threshold, up to max_k
+    score_threshold: Optional[float] = Field(default=None, ge=0, le=1)
+    max_k: Optional[int] = Field(default=None, ge=1, le=20)
+    mmr: Optional[bool] = None                                          # diversify chunks (maximal marginal relevance)
+    mmr_lambda: Optional[float] = Field(default=None, ge=0, le=1)      # 1 = relevance only, 0 = diversity only
+
+
+class ChatFilters(BaseModel):
+    document_ids: Optional[list[int]] = None
+    uploaded_after: Optional[datetime] = None
+    file_types: Optional[list[str]] = None          # extensions, e.g. ['pdf']
+
+    @field_validator('file_types')
+    @classmethod
+    def normalize_file_types(cls, v):
+        return [t.strip().lower().lstrip('.') for t in v] if v is not None else v
+
+
 class ChatMessageCreate(BaseModel):
     content: str
+    retrieval: Optional[RetrievalOptions] = None
+    filters: Optional[ChatFilters] = None           # narrow the search to some of the documents the user may read
     
     @field_validator('content')
     @classmethod
@@ -22,6 +44,30 @@ class ChatMessageCreate(BaseModel):
         return v.strip()
 
 
+class ChatBatchCreate(BaseModel):
+    questions: list[str] = Field(min_length=1)
+    session_id: Optional[int] = None                # also save the questions + answers in this session
+    retrieval: Optional[RetrievalOptions] = None
+    filters: Optional[ChatFilters] = None
+
+
+class BatchAnswerOut(BaseModel):
+    index: int
+    question: str
+    status: str = 'answered'                        # answered | failed | unavailable (LLM down -> ask again later)
+    answer: Optional[str] = None
+    error: Optional[str] = None
+    cached: bool = False
+    timings: dict[str, float]                       # embed_ms (whole batch), retrieval_ms, llm_ms, total_ms
+
+
+class ChatBatchOut(BaseModel):
+    total: int
+    failed: int
+    seconds: float
+    results: list[BatchAnswerOut]
+
+
 class ChatMessageOut(BaseModel):
     id: int
     role: int  # 0=Human, 1=AI, 2=System
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 
 class DocumentOut(BaseModel):
@@ -11,6 +11,21 @@ class DocumentOut(BaseModel):
     created_at: datetime
     updated_at: datetime
     is_deleted: bool
+    status: Optional[str] = None
+    progress: Optional[int] = None
+    error: Optional[str] = None
+    
+    class Config:
+        from_attributes = True
+
+
+class DocumentStatusOut(BaseModel):
+    id: int
+    filename: str
+    status: Optional[str] = None
+    progress: Optional[int] = None
+    error: Optional[str] = None
+    updated_at: datetime
     
     class Config:
         from_attributes = True
@@ -19,3 +34,18 @@ class DocumentOut(BaseModel):
 class DocumentListOut(BaseModel):
     total: int
     list_documents: List[DocumentOut]
+
+
+class BulkUploadItemOut(BaseModel):
+    filename: str
+    document_id: Optional[int] = None
+    access_level: Optional[int] = None
+    status: str                     # queued    rejected
+    error: Optional[str] = None
+
+
+class BulkUploadOut(BaseModel):
+    total: int
+    queued: int
+    rejected: int
+    results: List[BulkUploadItemOut]
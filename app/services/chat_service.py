@@ -1,9 +1,27 @@
-from fastapi import HTTPException
+import time
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from anyio import CancelScope
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
+from app.db.session import Local_session
+from app.core.config import CHAT_MAX_CONCURRENCY, SINGLE_FLIGHT_ENABLED, BATCH_MAX_QUESTIONS, BATCH_MAX_CONCURRENCY, BATCH_SHARED_CONCURRENCY
 from app.models.chat import ChatSession, ChatMessage
 from app.models.user import User
-from app.schemas.chat import ChatMessageCreate
-from app.rag.retrieval import retrieve_answer
+from app.models.document import Document
+from app.schemas.chat import ChatMessageCreate, ChatBatchCreate
+from app.rag.retrieval import retrieve_answer, stream_answer, answer_batch
+from app.rag.answer_cache import answer_cache
+from app.rag.session_cache import session_cache
+from app.rag.single_flight import SingleFlight
+from app.rag.resilience import LLMUnavailable
+from app.rag.llm import get_provider
+from app.rag.vector_store import vector_store, embedding_cache, query_cache
+from app.rag.reranker import reranker
 
 
 # ============================================
@@ -29,38 +47,239 @@ def get_user_access_levels(user: User):
         return [2]      # Users can question answer from public documents
 
 
-def send_chat_message_helper(session_id, message: ChatMessageCreate, db: Session, current_user):
+# Only this many questions go through retrieval + LLM at once, the rest wait here without holding a thread
+chat_semaphore = asyncio.Semaphore(CHAT_MAX_CONCURRENCY)
+
+# Batch questions of all batches together only get this many of those slots -> interactive chat is not starved
+batch_semaphore = asyncio.Semaphore(BATCH_SHARED_CONCURRENCY)
+
+# Identical questions asked at the same time (e.g. right after an announcement) -> one retrieval + LLM call
+answer_flight = SingleFlight(enabled=SINGLE_FLIGHT_ENABLED)
+
+
+def _save_user_message(session_id, question: str, db: Session, current_user):
     # Verify Session Exists and belongs to user
     chat_session = db.query(ChatSession).filter(ChatSession.id == session_id, ChatSession.user_id == current_user.id).first()
     if not chat_session:
         raise HTTPException(status_code=404, detail='Chat session Not found or User not found')
-    
-    # Validate Question -> Already validated from schemas
-    question = message.content.strip()
-    
-    # Save the user query
-    user_message = ChatMessage(session_id=session_id, role=0, context=question)
+
     # save user message to database
+    user_message = ChatMessage(session_id=session_id, role=0, context=question)
     db.add(user_message)
     db.commit()
+    return user_message.id
+
+
+def _delete_message(message_id: int, db: Session):
+    # the question was never answered (LLM unavailable) -> don't leave it dangling in the history
+    db.query(ChatMessage).filter(ChatMessage.id == message_id).delete()
+    db.commit()
+
+
+def _save_ai_message(session_id, answer: str, db: Session):
+    ai_message = ChatMessage(session_id=session_id, role=1, context=answer)
+    db.add(ai_message)
+    db.commit()
+    db.refresh(ai_message)
+    return ai_message
+
+
+def _retrieval_options(message: ChatMessageCreate | ChatBatchCreate):
+    # only the knobs the client set, the rest keep the server defaults
+    return message.retrieval.model_dump(exclude_none=True) if message.retrieval else None
+
+
+def _filtered_document_ids(message: ChatMessageCreate | ChatBatchCreate, allowed_levels: list[int], db: Session):
+    """Ids of the readable documents matching the message filters, None when there are no filters"""
+    filters = message.filters
+    if filters is None or not filters.model_dump(exclude_none=True):
+        return None
+    # the access levels stay in the query -> filters can only narrow what the role may see
+    query = db.query(Document.id).filter(Document.is_deleted == False, Document.access_level.in_(allowed_levels))
+    if filters.document_ids is not None:
+        query = query.filter(Document.id.in_(filters.document_ids))
+    if filters.uploaded_after is not None:
+        query = query.filter(Document.created_at >= filters.uploaded_after)
+    if filters.file_types is not None:
+        query = query.filter(or_(*[Document.filename.ilike(f'%.{file_type}') for file_type in filters.file_types]))
+    return [document_id for (document_id,) in query.all()]
+
+
+def _flight_key(question: str, allowed_levels: list[int], options: dict, document_ids: list[int], session_id=None) -> tuple:
+    # same normalized question, same readable documents, same retrieval knobs -> same answer
+    return (
+        ' '.join(question.lower().split()),
+        tuple(sorted(set(allowed_levels))),
+        json.dumps(options, sort_keys=True),
+        tuple(sorted(document_ids)) if document_ids is not None else None,
+        session_id
+    )
+
+
+def _unavailable(error: LLMUnavailable) -> HTTPException:
+    # the model is down / overloaded -> tell the client when to come back instead of queueing it
+    return HTTPException(status_code=503, detail=str(error), headers={'Retry-After': str(max(1, round(error.retry_after)))})
+
+
+def _check_llm_available():
+    try:
+        get_provider().check_available()
+    except LLMUnavailable as e:
+        raise _unavailable(e)
+
+
+async def send_chat_message_helper(session_id, message: ChatMessageCreate, db: Session, current_user):
+    # Validate Question -> Already validated from schemas
+    question = message.content.strip()
+    _check_llm_available()
+    
+    # Save the user query (blocking DB work -> threadpool)
+    question_id = await run_in_threadpool(_save_user_message, session_id, question, db, current_user)
 
     # get allowed document access levels based on user role
     allowed_levels = get_user_access_levels(current_user)
+    document_ids = await run_in_threadpool(_filtered_document_ids, message, allowed_levels, db)
     
-    # retrieve answer using RAG
+    # retrieve answer using RAG (the request that arrives first computes it, concurrent duplicates wait for it)
+    options = _retrieval_options(message)
+
+    # a follow-up answered from this session's cached candidates is only shared within the session;
+    # otherwise the first session's full search is copied into every waiting session's cache
+    own_candidates = document_ids is None and session_cache.has(session_id, allowed_levels)
+    key = _flight_key(question, allowed_levels, options, document_ids, session_id if own_candidates else None)
+
+    async def answer_question():
+        async with chat_semaphore:
+            return session_id, await retrieve_answer(question, allowed_levels, options, session_id=session_id, document_ids=document_ids)
+
     try:
-        answer = retrieve_answer(question, allowed_levels)
+        computed_by, answer = await answer_flight.run(key, answer_question)
+        if computed_by != session_id and document_ids is None:
+            session_cache.copy(computed_by, session_id)
+    except LLMUnavailable as e:
+        await run_in_threadpool(_delete_message, question_id, db)
+        raise _unavailable(e)
     except Exception as e:
         answer = f'Sorry I got an error: {str(e)}'
 
     # save the AI response
-    ai_message = ChatMessage(session_id=session_id, role=1, context=answer)
+    return await run_in_threadpool(_save_ai_message, session_id, answer, db)
 
-    db.add(ai_message)
+
+# ============================================
+# BATCH QUESTIONS
+# ============================================
+def _check_session_owner(session_id, db: Session, current_user):
+    chat_session = db.query(ChatSession).filter(ChatSession.id == session_id, ChatSession.user_id == current_user.id).first()
+    if not chat_session:
+        raise HTTPException(status_code=404, detail='Chat session Not found or User not found')
+
+
+def _save_batch_messages(session_id, results: list[dict], db: Session):
+    # question + answer pairs in batch order, one commit
+    for result in results:
+        if result['status'] == 'unavailable':
+            continue        # never answered (LLM down) -> not kept in the history, like a single question
+        answer = result['answer'] if result['error'] is None else f"Sorry I got an error: {result['error']}"
+        db.add(ChatMessage(session_id=session_id, role=0, context=result['question']))
+        db.add(ChatMessage(session_id=session_id, role=1, context=answer))
     db.commit()
-    db.refresh(ai_message)
-    
-    return ai_message
+
+
+@asynccontextmanager
+async def _batch_slot():
+    # a batch question first waits for one of the few batch slots, then takes a chat slot like any question
+    async with batch_semaphore:
+        async with chat_semaphore:
+            yield
+
+
+async def answer_batch_helper(batch: ChatBatchCreate, db: Session, current_user):
+    if len(batch.questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=413, detail=f'At most {BATCH_MAX_QUESTIONS} questions per batch')
+    _check_llm_available()
+    if batch.session_id is not None:
+        await run_in_threadpool(_check_session_owner, batch.session_id, db, current_user)
+
+    allowed_levels = get_user_access_levels(current_user)
+    document_ids = await run_in_threadpool(_filtered_document_ids, batch, allowed_levels, db)
+
+    started = time.perf_counter()
+    results = await answer_batch(
+        [question.strip() for question in batch.questions], allowed_levels, _retrieval_options(batch),
+        document_ids=document_ids, max_concurrency=BATCH_MAX_CONCURRENCY, slot=_batch_slot
+    )
+    seconds = time.perf_counter() - started
+
+    if batch.session_id is not None:
+        await run_in_threadpool(_save_batch_messages, batch.session_id, results, db)
+    return {
+        'total': len(results),
+        'failed': sum(1 for result in results if result['error'] is not None),
+        'seconds': round(seconds, 3),
+        'results': results
+    }
+
+
+# ============================================
+# STREAM CHAT MESSAGE (SERVER-SENT EVENTS)
+# ============================================
+def _sse(event: str, data: dict) -> str:
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def _save_streamed_answer(session_id, answer: str, question_id: int) -> int | None:
+    # The request's db session may already be closed while the stream is still running
+    db = Local_session()
+    try:
+        if answer is None:
+            _delete_message(question_id, db)
+            return None
+        return _save_ai_message(session_id, answer, db).id
+    finally:
+        db.close()
+
+
+def stream_chat_message_helper(session_id, message: ChatMessageCreate, db: Session, current_user, request: Request):
+    question = message.content.strip()
+    _check_llm_available()
+
+    # Save the user query
+    question_id = _save_user_message(session_id, question, db, current_user)
+
+    allowed_levels = get_user_access_levels(current_user)
+    document_ids = _filtered_document_ids(message, allowed_levels, db)
+
+    async def event_stream():
+        tokens = []
+        unavailable = False
+        try:
+            async with chat_semaphore:
+                async for token in stream_answer(question, allowed_levels, _retrieval_options(message), session_id=session_id, document_ids=document_ids):
+                    if await request.is_disconnected():
+                        break
+                    tokens.append(token)
+                    yield _sse('token', {'content': token})
+        except LLMUnavailable as e:
+            # headers are already sent -> the 503 travels in the error event; like the 503 of a plain
+            # message, the unanswered question is removed instead of saving an empty answer
+            unavailable = not tokens
+            yield _sse('error', {'detail': str(e), 'status': 503, 'retry_after': max(1, round(e.retry_after))})
+        except Exception as e:
+            tokens.append(f'Sorry I got an error: {str(e)}')
+            yield _sse('error', {'detail': tokens[-1]})
+        finally:
+            # persist whatever was generated, even when the client went away mid-answer
+            with CancelScope(shield=True):
+                answer = None if unavailable else ''.join(tokens)
+                message_id = await run_in_threadpool(_save_streamed_answer, session_id, answer, question_id)
+        yield _sse('done', {'message_id': message_id, 'session_id': session_id})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 
 # ============================================
@@ -120,6 +339,7 @@ def delete_chat_session_helper(session_id: int, db: Session, current_user: User)
     # Delete the session
     db.delete(session)
     db.commit()
+    session_cache.drop(session_id)
     
     return {"message": f"Chat session {session_id} deleted successfully"}
 
@@ -161,3 +381,21 @@ def get_all_sessions_helper(db: Session, current_user: User):
         })
     
     return result
+
+
+# ============================================
+# RAG CACHE STATS (ADMIN ONLY)
+# ============================================
+def get_rag_stats_helper(current_user: User):
+    if current_user.role != 0:
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    return {
+        'answer_cache': answer_cache.stats(),
+        'embedding_cache': embedding_cache.stats() if embedding_cache else {'enabled': False},
+        'query_cache': query_cache.stats() if query_cache else {'enabled': False},
+        'session_cache': session_cache.stats(),
+        'single_flight': answer_flight.stats(),
+        'reranker': reranker.stats(),
+        'vector_store': vector_store.stats(),
+        'llm': get_provider().stats()
+    }
@@ -1,19 +1,25 @@
 import os
+import json
+import queue
 import shutil
+import zipfile
 from fastapi import HTTPException, UploadFile
 from sqlalchemy.orm import Session
 from app.models.document import Document
 from app.models.user import User
-from app.rag.ingestion import ingest_document
 from app.rag.ingestion import remove_document_from_vector_store
+from app.services.ingestion_jobs import ingestion_queue
+from app.core.config import BULK_ZIP_MAX_MEMBERS, BULK_ZIP_MAX_BYTES
+
+
+ALLOWED_EXTENSIONS = ['.pdf', '.txt']
+UPLOAD_FOLDER = 'uploads'
 
 
 # ============================================
 #  ADMIN & STAFF -> UPLOAD DOCUMENT
 # ============================================
 def upload_document(file: UploadFile, access_level: int, db: Session, user: User):
-    ALLOWED_EXTENSIONS = ['.pdf', '.txt']
-    
     # Extension Allowed or Not
     ext = os.path.splitext(file.filename)[1].lower()
     if not ext in ALLOWED_EXTENSIONS:
@@ -32,7 +38,6 @@ def upload_document(file: UploadFile, access_level: int, db: Session, user: User
         raise HTTPException(status_code=400, detail='File already exists')
     
     # create destination location
-    UPLOAD_FOLDER = 'uploads'
     os.makedirs(name=UPLOAD_FOLDER, exist_ok=True)
 
     file_path = os.path.join(UPLOAD_FOLDER, file.filename)
@@ -40,17 +45,221 @@ def upload_document(file: UploadFile, access_level: int, db: Session, user: User
         shutil.copyfileobj(file.file, f)
 
     # create database record
-    new_doc = Document(filename=file.filename, filepath=file_path, access_level=access_level, uploaded_by=user.id)
+    new_doc = Document(filename=file.filename, filepath=file_path, access_level=access_level, uploaded_by=user.id, status='queued', progress=0)
     db.add(new_doc)
     db.commit()
     db.refresh(new_doc)
 
-    # CREATE VECTOR STORE WHILE UPLOAD DOCUMENT
-    ingest_document(file_path, new_doc.id, access_level)
+    # CREATE VECTOR STORE IN THE BACKGROUND -> document id is the job id to poll
+    try:
+        ingestion_queue.submit(new_doc.id, file_path, access_level)
+    except queue.Full:
+        db.delete(new_doc)
+        db.commit()
+        os.remove(file_path)
+        raise HTTPException(status_code=503, detail='Ingestion queue is full, please try again later')
 
     return new_doc
 
 
+# ============================================
+#  ADMIN & STAFF -> UPDATE DOCUMENT (NEW VERSION OF THE FILE)
+# ============================================
+def update_document(doc_id: int, file: UploadFile, access_level: int | None, db: Session, user: User):
+    doc = db.query(Document).filter(Document.id == doc_id, Document.is_deleted == False).first()
+    if not doc:
+        raise HTTPException(status_code=404, detail='Document Not Found')
+
+    # Staff can not touch admin only documents
+    new_level = doc.access_level if access_level is None else access_level
+    if user.role == 1 and (doc.access_level == 0 or new_level == 0):
+        raise HTTPException(status_code=403, detail='Staff can not update admin only document')
+    if new_level not in [0, 1, 2]:
+        raise HTTPException(status_code=400, detail='Access level for user, staffs and admins')
+
+    # the stored file keeps its name, so the type has to stay the same
+    ext = os.path.splitext(file.filename)[1].lower()
+    if ext != os.path.splitext(doc.filepath)[1].lower():
+        raise HTTPException(status_code=400, detail=f'Expected a {os.path.splitext(doc.filepath)[1]} file')
+    if doc.status in ('queued', 'processing'):
+        raise HTTPException(status_code=409, detail='Document is still being ingested')
+
+    # the new version waits next to the stored file; the worker swaps it in, and the new access level
+    # is only written to the database once the chunks carry it -> a failed update changes nothing
+    staged_path = doc.filepath + '.new'
+    with open(staged_path, 'wb') as f:
+        shutil.copyfileobj(file.file, f)
+
+    # queued -> no other update can start before the worker picks the job up
+    previous_state = doc.status, doc.progress, doc.error
+    doc.status, doc.progress, doc.error = 'queued', 0, None
+    db.commit()
+
+    # only the changed chunks are embedded again
+    try:
+        ingestion_queue.submit(doc.id, doc.filepath, new_level, update=True, staged_path=staged_path, previous_access_level=doc.access_level)
+    except queue.Full:
+        os.remove(staged_path)
+        doc.status, doc.progress, doc.error = previous_state
+        db.commit()
+        raise HTTPException(status_code=503, detail='Ingestion queue is full, please try again later')
+
+    db.refresh(doc)
+    return doc
+
+
+# ============================================
+#  ADMIN & STAFF -> BULK UPLOAD (MANY FILES / ZIP)
+# ============================================
+MANIFEST_ERROR = 'Manifest must be a JSON object of filename -> access level'
+
+
+def _parse_manifest(raw) -> dict | None:
+    """filename -> access level, None when it is not valid JSON or not an object"""
+    try:
+        levels = json.loads(raw)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    return levels if isinstance(levels, dict) else None
+
+
+def _check_archive(members: list[zipfile.ZipInfo]) -> str | None:
+    # sizes come from the central directory; reading a member stops at its declared size -> they can't lie
+    if len(members) > BULK_ZIP_MAX_MEMBERS:
+        return f'ZIP archive has more than {BULK_ZIP_MAX_MEMBERS} files'
+    if sum(i.file_size for i in members) > BULK_ZIP_MAX_BYTES:
+        return f'ZIP archive unpacks to more than {BULK_ZIP_MAX_BYTES} bytes'
+    return None
+
+
+def _expand_uploads(files: list[UploadFile], manifest: dict):
+    """
+    Yield (filename, file object, error) for plain uploads and for every member of uploaded ZIP archives.
+    A broken archive (bad ZIP, bad manifest.json, too big) is rejected as one item with file object None.
+    """
+    for file in files:
+        if os.path.splitext(file.filename)[1].lower() != '.zip':
+            yield file.filename, file.file, None
+            continue
+        try:
+            archive = zipfile.ZipFile(file.file)
+        except zipfile.BadZipFile:
+            yield file.filename, None, 'Invalid ZIP archive'
+            continue
+        with archive:
+            members = [i for i in archive.infolist() if not i.is_dir() and not i.filename.startswith('__MACOSX/')]
+            error = _check_archive(members)
+            names = [i.filename for i in members]
+            # a manifest.json inside the archive sets access levels for its own files
+            if error is None and 'manifest.json' in names:
+                with archive.open('manifest.json') as f:
+                    levels = _parse_manifest(f.read())
+                if levels is None:
+                    error = f'manifest.json: {MANIFEST_ERROR}'
+                else:
+                    manifest.update({k: v for k, v in levels.items() if k not in manifest})
+                    names.remove('manifest.json')
+            if error is not None:
+                yield file.filename, None, error
+                continue
+            for name in names:
+                with archive.open(name) as member:
+                    yield os.path.basename(name), member, None
+
+
+def _manifest_level(value) -> int | None:
+    # manifest values come from JSON -> 2, 2.0 and "2" are fine; "high", 1.5 or true are not
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return None
+
+
+def bulk_upload_documents(files: list[UploadFile], access_level: int | None, manifest: str | None, db: Session, user: User):
+    # manifest -> {"filename": access_level}, falls back to the access_level form field
+    levels = _parse_manifest(manifest) if manifest else {}
+    if levels is None:
+        raise HTTPException(status_code=400, detail=MANIFEST_ERROR)
+
+    os.makedirs(name=UPLOAD_FOLDER, exist_ok=True)
+    existing = {name for (name,) in db.query(Document.filename).all()}
+    results = []
+    accepted = []       # (result, Document)
+
+    try:
+        for filename, fileobj, error in _expand_uploads(files, levels):
+            level = _manifest_level(levels[filename]) if filename in levels else access_level
+            result = {'filename': filename, 'access_level': level, 'status': 'rejected'}
+            results.append(result)
+
+            ext = os.path.splitext(filename)[1].lower()
+            if error is not None:
+                result['error'] = error
+            elif ext not in ALLOWED_EXTENSIONS:
+                result['error'] = f'{ext} file Not Allowed'
+            elif level not in [0, 1, 2]:
+                result['error'] = 'Access level for user, staffs and admins'
+            elif user.role == 1 and level == 0:
+                result['error'] = 'Staff can not upload admin only document'
+            elif filename in existing:
+                result['error'] = 'File already exists'
+            else:
+                file_path = os.path.join(UPLOAD_FOLDER, filename)
+                existing.add(filename)
+                doc = Document(filename=filename, filepath=file_path, access_level=level, uploaded_by=user.id, status='queued', progress=0)
+                accepted.append((result, doc))
+                with open(file_path, 'wb') as f:
+                    shutil.copyfileobj(fileobj, f)
+                db.add(doc)
+
+        # all database records in one transaction
+        db.commit()
+    except BaseException as e:
+        # nothing of a failed request stays behind -> no orphaned files a later upload would overwrite
+        db.rollback()
+        for _, doc in accepted:
+            if os.path.exists(doc.filepath):
+                os.remove(doc.filepath)
+        if isinstance(e, zipfile.BadZipFile):       # a corrupt member (bad CRC, truncated data)
+            raise HTTPException(status_code=400, detail=f'Invalid ZIP archive: {e}')
+        raise
+
+    # parse in parallel + batched vector upserts in the background -> poll /doc/status/{document_id}
+    if accepted:
+        try:
+            ingestion_queue.submit_bulk([(doc.filepath, doc.id, doc.access_level) for _, doc in accepted])
+        except queue.Full:
+            for _, doc in accepted:
+                os.remove(doc.filepath)
+                db.delete(doc)
+            db.commit()
+            raise HTTPException(status_code=503, detail='Ingestion queue is full, please try again later')
+
+    for result, doc in accepted:
+        result.update(status='queued', document_id=doc.id)
+
+    queued = len(accepted)
+    return {
+        'total': len(results),
+        'queued': queued,
+        'rejected': len(results) - queued,
+        'results': results
+    }
+
+
+# ============================================
+# ADMIN & STAFF -> INGESTION STATUS
+# ============================================
+def get_ingestion_status(doc_id: int, db: Session, user: User):
+    # same visibility rules as search
+    return search_document(doc_id, db, user)
+
+
 # ============================================
 # ADMIN & STAFF -> SEARCH DOCUMENTS
 # ============================================
@@ -0,0 +1,172 @@
+import os
+import queue
+import logging
+import threading
+from app.db.session import Local_session
+from app.models.document import Document
+from app.core.config import INGEST_WORKERS, INGEST_QUEUE_SIZE
+from app.rag.ingestion import ingest_document, reingest_document, ingest_documents_bulk, remove_document_from_vector_store
+
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================
+#  BACKGROUND INGESTION QUEUE
+# ============================================
+class IngestionQueue:
+    """Bounded job queue + worker threads that run parse -> chunk -> embed -> store outside the request"""
+
+    def __init__(self, workers: int, max_queued: int):
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'ingestion-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, document_id: int, file_path: str, access_level: int, **options):
+        """
+        Raises queue.Full when too many jobs are already waiting.
+        options -> update=True re-ingests only the changed chunks of the new version waiting at
+        staged_path (+ previous_access_level)
+        """
+        self._queue.put_nowait((self._run, (document_id, file_path, access_level, options)))
+
+    def submit_bulk(self, files: list[tuple[str, int, int]]):
+        """One job for many (file_path, document_id, access_level), parsed in parallel. Raises queue.Full"""
+        self._queue.put_nowait((self._run_bulk, (files,)))
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _worker(self):
+        while True:
+            handler, args = self._queue.get()
+            try:
+                handler(*args)
+            except Exception:
+                logger.exception('Ingestion job failed')
+            finally:
+                self._queue.task_done()
+
+    def _run(self, document_id: int, file_path: str, access_level: int, options: dict):
+        _update_document(document_id, status='processing', progress=0, error=None)
+        update = options.pop('update', False)
+        try:
+            progress_callback = lambda percent: _update_document(document_id, progress=percent)
+            if update:
+                _reingest_new_version(file_path, document_id, access_level, progress_callback, **options)
+            else:
+                ingest_document(file_path, document_id, access_level, progress_callback=progress_callback)
+        except Exception as e:
+            error = getattr(e, 'detail', None) or str(e)
+            if update:
+                error = f'Update failed, the previous version is still in use: {error}'
+            _update_document(document_id, status='failed', error=error)
+            return
+
+        # the (new) access level is only recorded once every chunk carries it
+        # document was deleted while we were ingesting it -> don't leave orphan chunks behind
+        if not _update_document(document_id, status='completed', progress=100, access_level=access_level):
+            remove_document_from_vector_store(document_id)
+
+    def _run_bulk(self, files: list[tuple[str, int, int]]):
+        for _, document_id, _ in files:
+            _update_document(document_id, status='processing', progress=0, error=None)
+        done = set()
+
+        def on_document_done(document_id: int, result: dict):
+            done.add(document_id)
+            if 'error' in result:
+                _update_document(document_id, status='failed', error=result['error'])
+            elif not _update_document(document_id, status='completed', progress=100):
+                remove_document_from_vector_store(document_id)
+
+        try:
+            ingest_documents_bulk(files, on_document_done=on_document_done)
+        except Exception as e:
+            for _, document_id, _ in files:
+                if document_id not in done:
+                    remove_document_from_vector_store(document_id)
+                    _update_document(document_id, status='failed', error=str(e))
+            raise
+
+
+def _reingest_new_version(file_path: str, document_id: int, access_level: int, progress_callback, staged_path: str = None, previous_access_level: int = None):
+    """
+    Swap the staged upload in for the stored file; on failure the old file comes back (its chunks are rolled back).
+    No staged_path -> re-sync the chunks with the stored file as it is.
+    """
+    if staged_path is None:
+        reingest_document(file_path, document_id, access_level, progress_callback=progress_callback, previous_access_level=previous_access_level)
+        return
+    backup_path = file_path + '.previous'
+    os.replace(file_path, backup_path)
+    os.replace(staged_path, file_path)
+    try:
+        reingest_document(file_path, document_id, access_level, progress_callback=progress_callback, previous_access_level=previous_access_level)
+    except Exception:
+        os.replace(backup_path, file_path)
+        raise
+    os.remove(backup_path)
+
+
+def recover_interrupted_jobs():
+    """
+    Jobs only live in memory: documents a restart caught queued or processing are picked up again.
+    Chunk ids are content hashes, so ingesting a half stored document again just completes it.
+    An update whose new version was not swapped in yet is dropped (its new access level was never
+    stored); one caught half way is rolled back to the previous file.
+    """
+    db = Local_session()
+    try:
+        interrupted = db.query(Document).filter(Document.is_deleted == False, Document.status.in_(('queued', 'processing'))).all()
+        fresh = []
+        for doc in interrupted:
+            staged_path, backup_path = doc.filepath + '.new', doc.filepath + '.previous'
+            if os.path.exists(backup_path):
+                os.replace(backup_path, doc.filepath)
+                if os.path.exists(staged_path):
+                    os.remove(staged_path)
+                logger.warning('Update of document %s was interrupted, restoring the previous version (upload the new one again)', doc.id)
+                doc.status, doc.progress = 'queued', 0
+                ingestion_queue.submit(doc.id, doc.filepath, doc.access_level, update=True)
+            elif os.path.exists(staged_path):
+                os.remove(staged_path)
+                doc.status, doc.error = 'failed', 'Update interrupted by a restart, upload the new version again'
+            elif not os.path.exists(doc.filepath):
+                doc.status, doc.error = 'failed', 'File missing after a restart, upload it again'
+            else:
+                doc.status, doc.progress = 'queued', 0
+                fresh.append((doc.filepath, doc.id, doc.access_level))
+        db.commit()
+        if fresh:
+            ingestion_queue.submit_bulk(fresh)      # one job -> any number of documents fits in the queue
+        if interrupted:
+            logger.info('Recovered %d interrupted ingestion jobs', len(interrupted))
+    finally:
+        db.close()
+
+
+def _update_document(document_id: int, **fields) -> bool:
+    # workers have no request -> own short-lived db session per update
+    db = Local_session()
+    try:
+        doc = db.query(Document).filter(Document.id == document_id).first()
+        if not doc:
+            return False
+        for name, value in fields.items():
+            setattr(doc, name, value)
+        db.commit()
+        return True
+    finally:
+        db.close()
+
+
+ingestion_queue = IngestionQueue(workers=INGEST_WORKERS, max_queued=INGEST_QUEUE_SIZE)
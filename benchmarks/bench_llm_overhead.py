@@ -0,0 +1,83 @@
+"""
+Per-request LLM overhead before and after the provider registry: building the endpoint, chat model,
+prompt and chain for every question (as retrieve_answer used to) against reusing the process-wide
+provider and its compiled chain. With --live, the questions are also sent to the endpoint, so the
+new TCP + TLS connection per question shows up too (needs HUGGINGFACEHUB_API_TOKEN).
+
+    python -m benchmarks.bench_llm_overhead --requests 20 --live
+"""
+import time
+import asyncio
+import argparse
+import numpy as np
+from langchain_huggingface import HuggingFaceEndpoint, ChatHuggingFace
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from app.rag.llm import RAG_PROMPT, get_provider
+from app.core.config import LLM_REPO_ID
+
+
+INPUTS = {'context': 'The office is closed on public holidays.', 'question': 'Is the office open on public holidays?'}
+
+
+def per_request_chain():
+    """What every question paid before: a new endpoint client, chat model, prompt and chain"""
+    llm = HuggingFaceEndpoint(repo_id=LLM_REPO_ID, task='text-generation')
+    return ChatPromptTemplate(RAG_PROMPT.messages) | ChatHuggingFace(llm=llm) | StrOutputParser()
+
+
+def pooled_chain():
+    return get_provider().get_chain('rag')
+
+
+def summary(name: str, seconds: list[float]) -> dict:
+    milliseconds = np.array(seconds) * 1000
+    return {
+        'variant': name,
+        'mean ms': round(float(milliseconds.mean()), 2),
+        'p50 ms': round(float(np.percentile(milliseconds, 50)), 2),
+        'p95 ms': round(float(np.percentile(milliseconds, 95)), 2)
+    }
+
+
+def time_setup(factory, requests: int) -> list[float]:
+    seconds = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        factory()
+        seconds.append(time.perf_counter() - started)
+    return seconds
+
+
+async def time_calls(call, requests: int) -> list[float]:
+    seconds = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        await call()
+        seconds.append(time.perf_counter() - started)
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--live', action='store_true', help='also call the endpoint (setup + request + answer)')
+    args = parser.parse_args()
+
+    pooled_chain()      # the app builds the provider at startup (warm_up_providers)
+    results = [
+        summary('setup, per request', time_setup(per_request_chain, args.requests)),
+        summary('setup, registry', time_setup(pooled_chain, args.requests))
+    ]
+    if args.live:
+        results.append(summary('call, per request', asyncio.run(time_calls(lambda: per_request_chain().ainvoke(INPUTS), args.requests))))
+        results.append(summary('call, registry', asyncio.run(time_calls(lambda: get_provider().ainvoke(INPUTS), args.requests))))
+
+    columns = list(results[0])
+    print('  '.join(f'{column:>18}' for column in columns))
+    for result in results:
+        print('  '.join(f'{result[column]!s:>18}' for column in columns))
+
+
+if __name__ == '__main__':
+    main()
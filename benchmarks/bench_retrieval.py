@@ -0,0 +1,99 @@
+"""
+Latency of the per-request retrieval options on a synthetic memmap index: fixed k, adaptive k
+(score threshold) and MMR, through the real retrieve_context. Questions are passed as precomputed
+vectors, so only retrieval is timed (the embedding model is still loaded on import, as in the app).
+
+    python -m benchmarks.bench_retrieval --rows 50000 --score-threshold 0.6
+
+'similarity' is the mean cosine similarity between the chunks returned for one question
+(lower -> more diverse context).
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+# the app reads its configuration on import -> point it at a throwaway memmap index first
+INDEX_DIR = tempfile.mkdtemp(prefix='bench-retrieval-')
+os.environ.update({
+    'VECTOR_BACKEND': 'memmap',
+    'VECTOR_STORE_DIR': os.path.join(INDEX_DIR, 'vectors'),
+    'KEYWORD_INDEX_DIR': os.path.join(INDEX_DIR, 'keywords'),
+    'ROUTING_INDEX_DIR': os.path.join(INDEX_DIR, 'routing'),
+    'EMBEDDING_CACHE_ENABLED': 'false'
+})
+os.environ.setdefault('HYBRID_SEARCH_ENABLED', 'false')     # the synthetic chunks have no real text to match
+os.environ.setdefault('RERANKER', 'none')
+
+from app.rag import retrieval       # noqa: E402
+from app.rag.vector_store import vector_store       # noqa: E402
+from benchmarks.bench_vector_store import make_corpus       # noqa: E402
+
+
+VARIANTS = {
+    'fixed k': {'adaptive_k': False, 'mmr': False},
+    'adaptive k': {'adaptive_k': True, 'mmr': False},
+    'mmr': {'adaptive_k': False, 'mmr': True},
+    'adaptive + mmr': {'adaptive_k': True, 'mmr': True}
+}
+
+
+def mean_similarity(vectors) -> float:
+    """Mean pairwise cosine similarity of the returned chunks"""
+    if len(vectors) < 2:
+        return 1.0
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    similarity = vectors @ vectors.T
+    return float((similarity.sum() - len(vectors)) / (len(vectors) * (len(vectors) - 1)))
+
+
+def run(name: str, options: dict, queries, vectors_by_id: dict) -> dict:
+    latencies, chunks, similarities = [], [], []
+    for query in queries:
+        started = time.perf_counter()
+        hits = retrieval.retrieve_context('benchmark question', query.tolist(), [0, 1, 2], options=options)
+        latencies.append(time.perf_counter() - started)
+        chunks.append(len(hits))
+        similarities.append(mean_similarity([vectors_by_id[hit.id] for hit in hits]))
+    latencies = np.array(latencies) * 1000
+    return {
+        'variant': name,
+        'p50 ms': round(float(np.percentile(latencies, 50)), 2),
+        'p95 ms': round(float(np.percentile(latencies, 95)), 2),
+        'chunks': round(float(np.mean(chunks)), 1),
+        'similarity': round(float(np.mean(similarities)), 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--dim', type=int, default=768)
+    parser.add_argument('--documents', type=int, default=500)
+    parser.add_argument('--score-threshold', type=float, default=None, help='adaptive k threshold (server default otherwise)')
+    parser.add_argument('--max-k', type=int, default=None)
+    args = parser.parse_args()
+
+    try:
+        ids, texts, vectors, metadatas, queries = make_corpus(args.rows, args.dim, args.documents)
+        for start in range(0, len(ids), 1000):
+            vector_store.add_embedded(ids[start:start + 1000], texts[start:start + 1000], vectors[start:start + 1000], metadatas[start:start + 1000])
+        vectors_by_id = dict(zip(ids, vectors))
+
+        overrides = {key: value for key, value in (('score_threshold', args.score_threshold), ('max_k', args.max_k)) if value is not None}
+        results = [run(name, {**options, **overrides}, queries, vectors_by_id) for name, options in VARIANTS.items()]
+    finally:
+        vector_store.close()
+        shutil.rmtree(INDEX_DIR, ignore_errors=True)
+
+    columns = list(results[0])
+    print('  '.join(f'{column:>15}' for column in columns))
+    for result in results:
+        print('  '.join(f'{result[column]!s:>15}' for column in columns))
+
+
+if __name__ == '__main__':
+    main()
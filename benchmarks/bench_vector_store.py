@@ -0,0 +1,144 @@
+"""
+Vector store benchmark on synthetic embeddings: insert throughput, startup time, search latency,
+memory and recall@k against an exact NumPy search, for the memmap backend and Chroma.
+Quantized memmap variants are named memmap:<float16|int8>[:<truncate_dim>].
+
+    python -m benchmarks.bench_vector_store --rows 100000 --dim 384 --backends memmap memmap:int8 memmap:int8:128 chroma
+
+'scan MB' is the matrix a search reads (the codes when quantized), 'disk MB' everything on disk.
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+from app.rag.stores.memmap import MemmapVectorStore
+
+
+ALLOWED_LEVELS = [1, 2]         # a staff user -> the access level filter is part of every search
+
+
+# ============================================
+#  DATA
+# ============================================
+def make_corpus(rows: int, dim: int, documents: int, decay: float = 0.0, seed: int = 0):
+    """
+    Chunks clustered around their document's topic, like real embeddings of related text.
+    decay > 0 concentrates the signal in the leading dimensions (Matryoshka-trained models), which is
+    what makes truncate_dim work; without it every dimension matters equally.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((documents, dim))
+    document_of = rng.integers(0, documents, rows)
+    vectors = centers[document_of] + 0.8 * rng.standard_normal((rows, dim))
+    if decay:
+        vectors *= np.exp(-np.arange(dim) / decay)
+    vectors = vectors.astype(np.float32)
+    ids = [f'{document_id}-{i}' for i, document_id in enumerate(document_of)]
+    texts = [f'chunk {i} of document {document_id}' for i, document_id in enumerate(document_of)]
+    metadatas = [{'document_id': int(d), 'access_level': int(d) % 3, 'chunk_index': i} for i, d in enumerate(document_of)]
+    queries = vectors[rng.integers(0, rows, 200)] + 0.5 * vectors.std(axis=0) * rng.standard_normal((200, dim)).astype(np.float32)
+    return ids, texts, vectors, metadatas, queries
+
+
+def exact_top_k(ids, vectors, metadatas, queries, k: int) -> list[set]:
+    """Ids of the true top-k readable chunks per query"""
+    allowed = np.flatnonzero(np.isin([m['access_level'] for m in metadatas], ALLOWED_LEVELS))
+    matrix = vectors[allowed] / np.linalg.norm(vectors[allowed], axis=1, keepdims=True)
+    truth = []
+    for query in queries:
+        scores = matrix @ (query / np.linalg.norm(query))
+        truth.append({ids[allowed[row]] for row in np.argpartition(-scores, k - 1)[:k]})
+    return truth
+
+
+# ============================================
+#  BACKENDS
+# ============================================
+def open_store(backend: str, directory: str, rescore_factor: int):
+    name, _, variant = backend.partition(':')
+    if name == 'memmap':
+        quantization, _, truncate_dim = variant.partition(':')
+        return MemmapVectorStore(
+            directory, None, quantization=quantization or 'none', truncate_dim=int(truncate_dim or 0), rescore_factor=rescore_factor
+        )
+    if backend == 'chroma':
+        import chromadb
+        from app.rag.stores.chroma import PartitionedVectorStore
+        return PartitionedVectorStore(chromadb.PersistentClient(path=directory), None)
+    raise ValueError(f'Unknown backend {backend!r}')
+
+
+def disk_mb(directory: str) -> float:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names) / 2 ** 20
+
+
+def run(backend: str, corpus, truth, k: int, batch_size: int, rescore_factor: int) -> dict:
+    ids, texts, vectors, metadatas, queries = corpus
+    directory = tempfile.mkdtemp(prefix='bench-vectors-')
+    try:
+        store = open_store(backend, directory, rescore_factor)
+        started = time.perf_counter()
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            store.add_embedded(ids[start:end], texts[start:end], vectors[start:end], metadatas[start:end])
+        store.save()
+        insert_seconds = time.perf_counter() - started
+        store.close()
+
+        started = time.perf_counter()
+        store = open_store(backend, directory, rescore_factor)
+        startup_seconds = time.perf_counter() - started
+
+        latencies, recalls = [], []
+        for query, expected in zip(queries, truth):
+            started = time.perf_counter()
+            hits = store.search(query.tolist(), k, ALLOWED_LEVELS)
+            latencies.append(time.perf_counter() - started)
+            recalls.append(len(expected & {hit.id for hit in hits}) / k)
+        stats = store.stats()
+        store.close()
+        size_on_disk = disk_mb(directory)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    latencies = np.array(latencies) * 1000
+    return {
+        'backend': backend,
+        'insert/s': round(len(ids) / insert_seconds),
+        'startup ms': round(startup_seconds * 1000, 1),
+        'p50 ms': round(float(np.percentile(latencies, 50)), 2),
+        'p95 ms': round(float(np.percentile(latencies, 95)), 2),
+        'qps': round(1000 / float(latencies.mean())),
+        'scan MB': stats.get('codes_mb', stats.get('full_precision_mb', '-')),
+        'disk MB': round(size_on_disk, 1),
+        f'recall@{k}': round(float(np.mean(recalls)), 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--documents', type=int, default=500)
+    parser.add_argument('--decay', type=float, default=0.0, help='signal decay over the dimensions, e.g. 64 for Matryoshka-like vectors')
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--rescore-factor', type=int, default=4, help='quantized variants re-score k * this many rows exactly')
+    parser.add_argument('--backends', nargs='+', default=['memmap', 'memmap:float16', 'memmap:int8', 'chroma'])
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.rows, args.dim, args.documents, args.decay)
+    ids, _, vectors, metadatas, queries = corpus
+    truth = exact_top_k(ids, vectors, metadatas, queries, args.k)
+    results = [run(backend, corpus, truth, args.k, args.batch_size, args.rescore_factor) for backend in args.backends]
+
+    columns = list(results[0])
+    print('  '.join(f'{column:>15}' for column in columns))
+    for result in results:
+        print('  '.join(f'{result[column]!s:>15}' for column in columns))
+
+
+if __name__ == '__main__':
+    main()
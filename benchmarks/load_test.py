@@ -0,0 +1,124 @@
+"""
+Load test against a running server: saturate chat with concurrent questions and check that login
+and listing chat sessions (both open to every role) stay responsive meanwhile, compared with the
+same probes on an idle server. Every question is different, so single-flight and the answer cache
+don't absorb the load. Probe responses that are not 2xx are counted, not raised.
+
+    uvicorn main:app &
+    python -m benchmarks.load_test --url http://localhost:8000 --email user@example.com --password secret --chat-concurrency 100
+"""
+import os
+import time
+import asyncio
+import argparse
+import itertools
+from collections import Counter
+import httpx
+import numpy as np
+
+
+PROBES = {
+    'login': ('POST', '/auth/login'),
+    'chat sessions': ('GET', '/chat/sessions')
+}
+
+
+async def login(client, url: str, email: str, password: str) -> str:
+    response = await client.post(f'{url}/auth/login', data={'username': email, 'password': password})
+    response.raise_for_status()
+    return response.json()['access_token']
+
+
+async def probe(client, url: str, name: str, credentials: dict, headers: dict) -> tuple[float, int | str]:
+    """(seconds, status code or error name) of one probe request"""
+    method, path = PROBES[name]
+    started = time.perf_counter()
+    try:
+        if method == 'POST':
+            response = await client.post(f'{url}{path}', data=credentials)
+        else:
+            response = await client.get(f'{url}{path}', headers=headers)
+        status = response.status_code
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    return time.perf_counter() - started, status
+
+
+async def probe_loop(client, url: str, credentials: dict, headers: dict, interval: float, stop: asyncio.Event) -> dict:
+    results = {name: [] for name in PROBES}
+    while not stop.is_set():
+        for name in PROBES:
+            results[name].append(await probe(client, url, name, credentials, headers))
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+    return results
+
+
+async def chat_worker(client, url: str, headers: dict, chat_session_id: int, numbers, stop: asyncio.Event, statuses: Counter):
+    while not stop.is_set():
+        question = f'Question {next(numbers)}: what does the handbook say about this topic?'
+        try:
+            response = await client.post(f'{url}/chat/session/{chat_session_id}/message', json={'content': question}, headers=headers)
+            statuses[response.status_code] += 1
+        except httpx.HTTPError as e:
+            statuses[type(e).__name__] += 1
+
+
+def summary(results: list[tuple[float, int | str]]) -> str:
+    if not results:
+        return '-'
+    milliseconds = np.array([seconds for seconds, _ in results]) * 1000
+    statuses = dict(Counter(status for _, status in results))
+    return (f'p50 {np.percentile(milliseconds, 50):7.1f}  p95 {np.percentile(milliseconds, 95):7.1f}  '
+            f'max {milliseconds.max():7.1f} ms  statuses {statuses}')
+
+
+async def main(args):
+    credentials = {'username': args.email, 'password': args.password}
+    # separate connection pools -> the probes never queue behind the chat requests on the client side
+    async with httpx.AsyncClient(timeout=None) as probes, \
+            httpx.AsyncClient(timeout=None, limits=httpx.Limits(max_connections=None, max_keepalive_connections=None)) as chats:
+        headers = {'Authorization': f'Bearer {await login(probes, args.url, args.email, args.password)}'}
+        response = await probes.post(f'{args.url}/chat/session', headers=headers)
+        response.raise_for_status()
+        chat_session_id = response.json()['id']
+
+        # idle baseline
+        stop = asyncio.Event()
+        idle = asyncio.create_task(probe_loop(probes, args.url, credentials, headers, args.probe_interval, stop))
+        await asyncio.sleep(args.baseline)
+        stop.set()
+        idle = await idle
+
+        # chat saturated
+        stop, statuses, numbers = asyncio.Event(), Counter(), itertools.count()
+        workers = [
+            asyncio.create_task(chat_worker(chats, args.url, headers, chat_session_id, numbers, stop, statuses))
+            for _ in range(args.chat_concurrency)
+        ]
+        await asyncio.sleep(args.ramp_up)       # let the chat requests pile up first
+        busy = asyncio.create_task(probe_loop(probes, args.url, credentials, headers, args.probe_interval, stop))
+        await asyncio.sleep(args.duration)
+        stop.set()
+        busy = await busy
+        await asyncio.gather(*workers)
+
+    for name in PROBES:
+        print(f'{name:>15}  idle       {summary(idle[name])}')
+        print(f'{"":>15}  saturated  {summary(busy[name])}')
+    print(f'chat responses: {dict(statuses)}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--email', default=os.getenv('INITIAL_USER_EMAIL'))
+    parser.add_argument('--password', default=os.getenv('INITIAL_USER_PASSWORD'))
+    parser.add_argument('--chat-concurrency', type=int, default=100, help='questions in flight at once')
+    parser.add_argument('--baseline', type=float, default=10, help='seconds of probes on the idle server')
+    parser.add_argument('--ramp-up', type=float, default=5)
+    parser.add_argument('--duration', type=float, default=30, help='seconds of probes while chat is saturated')
+    parser.add_argument('--probe-interval', type=float, default=0.5)
+    asyncio.run(main(parser.parse_args()))
@@ -1,15 +1,38 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, APIRouter
 from app.api import auth, documents, chat
 from app.db.init_db import prepare_database
-from app.rag.vector_store import all_docs
+from app.rag.vector_store import all_docs, pooled_embeddings
+from app.rag.llm import warm_up_providers
+from app.rag.reranker import reranker
+from app.services.ingestion_jobs import ingestion_queue, recover_interrupted_jobs
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # shutdown -> stop the embedding worker processes (EMBED_PROCESSES) instead of leaving them behind
+    pooled_embeddings.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 # Create DB and table & insert default values of multiple users [admin, staffs, end_users]
 prepare_database()
 
+# Build the shared LLM client and compiled chain once, before the first question
+warm_up_providers()
+
+# Load the reranker model now -> its load time never ends up in the latency estimate
+reranker.warm_up()
+
+# Worker threads that ingest uploaded documents in the background
+ingestion_queue.start()
+
+# Jobs don't survive a restart -> pick up documents that were still queued / being ingested
+recover_interrupted_jobs()
+
 
 app.include_router(router=auth.router, prefix='/auth', tags=['Authentication'])
 app.include_router(router=documents.router, prefix='/doc', tags=['Documents'])
@@ -258,7 +258,7 @@ def upload_document(file, access_level: int) -> bool:
         url = f"{API_BASE_URL}/doc/upload"
         response = requests.post(url, files=files, data=data, headers=get_headers())
         
-        if response.status_code == 200:
+        if response.status_code in (200, 202):      # 202 -> accepted, ingesting in the background
             return True
         else:
             display_error(response, f"Uploading document: {file.name}")
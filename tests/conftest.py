@@ -0,0 +1,25 @@
+import os
+import tempfile
+import pytest
+
+# app.core.config exports the token on import -> a placeholder lets tests import app modules offline
+os.environ.setdefault('HUGGINGFACEHUB_API_TOKEN', 'test-token')
+
+# app modules open their indexes on import -> keep them in a throwaway directory, not the working tree
+INDEX_DIR = tempfile.mkdtemp(prefix='tests-index-')
+for name, directory in (('VECTOR_STORE_DIR', 'vectors'), ('KEYWORD_INDEX_DIR', 'keywords'), ('ROUTING_INDEX_DIR', 'routing')):
+    os.environ.setdefault(name, os.path.join(INDEX_DIR, directory))
+os.environ.setdefault('VECTOR_BACKEND', 'memmap')
+os.environ.setdefault('EMBEDDING_CACHE_ENABLED', 'false')
+
+
+@pytest.fixture
+def make_corpus():
+    """The benchmarks' corpus generator with test-sized defaults -> (ids, texts, vectors, metadatas, queries)"""
+    pytest.importorskip('numpy')
+    from benchmarks.bench_vector_store import make_corpus
+
+    def make(rows: int = 2000, dim: int = 64, documents: int = 30, decay: float = 0.0, seed: int = 0):
+        return make_corpus(rows, dim, documents, decay, seed)
+
+    return make
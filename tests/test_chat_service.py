@@ -0,0 +1,150 @@
+import time
+import asyncio
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip('fastapi')
+pytest.importorskip('pymysql')                  # app.db.session builds its MySQL engine on import
+pytest.importorskip('sentence_transformers')    # the embedding model is loaded on import, as in the app
+from sqlalchemy import create_engine    # noqa: E402
+from sqlalchemy.orm import sessionmaker     # noqa: E402
+from app.db.session import Base     # noqa: E402
+from app.models.chat import ChatSession, ChatMessage    # noqa: E402
+from app.schemas.chat import ChatMessageCreate, ChatBatchCreate     # noqa: E402
+from app.rag import retrieval       # noqa: E402
+from app.rag.resilience import CircuitOpen      # noqa: E402
+from app.services import chat_service       # noqa: E402
+
+
+class FakeProvider:
+    def check_available(self):
+        pass
+
+
+class OpenCircuitProvider:
+    def check_available(self):
+        raise CircuitOpen('LLM circuit open', retry_after=12)
+
+
+class FakeRetrieval:
+    """
+    Stands in for retrieve_answer: counts upstream calls and only answers once ready() (every caller
+    has saved its question) or after timeout seconds, so the concurrent requests overlap
+    """
+
+    def __init__(self, ready=None, timeout: float = 2.0):
+        self.ready = ready or (lambda: True)
+        self.timeout = timeout
+        self.calls = []
+
+    async def __call__(self, question, allowed_levels, options=None, session_id=None, document_ids=None):
+        self.calls.append((question, allowed_levels))
+        deadline = time.monotonic() + self.timeout
+        while not self.ready() and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)       # the last caller goes from saving its question to the flight
+        return f'answer {len(self.calls)}'
+
+
+@pytest.fixture
+def chat(tmp_path, monkeypatch):
+    engine = create_engine(f'sqlite:///{tmp_path / "chat.db"}', connect_args={'check_same_thread': False})
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    upstream = FakeRetrieval()
+    monkeypatch.setattr(chat_service, 'retrieve_answer', upstream)
+    monkeypatch.setattr(chat_service, 'get_provider', FakeProvider)
+    yield Session, upstream
+    engine.dispose()
+
+
+def ask_concurrently(Session, upstream: FakeRetrieval, questions: list[str], users: list) -> list:
+    """One chat session + db session per caller, like one request each; returns the saved AI messages"""
+    with Session() as db:
+        session_ids = []
+        for user in users:
+            chat_session = ChatSession(user_id=user.id)
+            db.add(chat_session)
+            db.commit()
+            session_ids.append(chat_session.id)
+
+    async def ask(session_id, question, user):
+        with Session() as db:
+            return await chat_service.send_chat_message_helper(session_id, ChatMessageCreate(content=question), db, user)
+
+    def all_saved():
+        with Session() as db:
+            return db.query(ChatMessage).filter(ChatMessage.role == 0).count() == len(questions)
+
+    async def main():
+        return await asyncio.gather(*(ask(*call) for call in zip(session_ids, questions, users)))
+
+    upstream.ready = all_saved
+
+    return asyncio.run(main())
+
+
+def test_concurrent_identical_questions_make_one_upstream_call(chat):
+    Session, upstream = chat
+    questions = ['What changed in the leave policy?', '  what CHANGED in the   leave policy?', 'what changed in the leave policy?'] * 4
+    users = [SimpleNamespace(id=i, role=2) for i in range(len(questions))]
+
+    messages = ask_concurrently(Session, upstream, questions, users)
+
+    assert len(upstream.calls) == 1
+    assert [message.context for message in messages] == ['answer 1'] * len(questions)
+    with Session() as db:
+        ai_messages = db.query(ChatMessage).filter(ChatMessage.role == 1).all()
+    # every caller gets its own answer row, in its own chat session
+    assert len({message.id for message in ai_messages}) == len(questions)
+    assert sorted(message.session_id for message in ai_messages) == sorted(message.session_id for message in messages)
+
+
+def test_concurrent_questions_from_different_roles_are_answered_separately(chat):
+    Session, upstream = chat
+    users = [SimpleNamespace(id=i, role=role) for i, role in enumerate((0, 1, 2, 2))]
+
+    ask_concurrently(Session, upstream, ['What changed?'] * len(users), users)
+
+    assert sorted(levels for _, levels in upstream.calls) == [[0, 1, 2], [1, 2], [2]]
+
+
+def test_flight_key_normalizes_the_question_but_not_the_access_levels():
+    key = chat_service._flight_key('What changed?', [1, 2], None, None)
+    assert chat_service._flight_key('  what   CHANGED?\n', [2, 1], None, None) == key
+    assert chat_service._flight_key('What changed?', [2], None, None) != key
+    assert chat_service._flight_key('What changed?', [0, 1, 2], None, None) != key
+    assert chat_service._flight_key('What changed?', [1, 2], None, [3]) != key
+
+
+def test_batch_fails_fast_with_503_when_the_circuit_is_open(chat, monkeypatch):
+    monkeypatch.setattr(chat_service, 'get_provider', OpenCircuitProvider)
+
+    with pytest.raises(chat_service.HTTPException) as error:
+        asyncio.run(chat_service.answer_batch_helper(ChatBatchCreate(questions=['a?', 'b?']), None, SimpleNamespace(id=1, role=2)))
+    assert error.value.status_code == 503
+    assert error.value.headers == {'Retry-After': '12'}
+
+
+def test_batch_items_the_llm_could_not_take_are_marked_and_not_saved(chat, monkeypatch):
+    Session, _ = chat
+
+    async def answer_embedded(question, query_embedding, allowed_levels, options, document_ids=None, report=None):
+        if question == 'second?':
+            raise CircuitOpen('LLM circuit open', retry_after=12)
+        return f'answer to {question}'
+
+    monkeypatch.setattr(retrieval.embeddings, 'embed_queries', lambda questions: [[0.0]] * len(questions))
+    monkeypatch.setattr(retrieval, '_answer_embedded', answer_embedded)
+    user = SimpleNamespace(id=1, role=2)
+    with Session() as db:
+        chat_session = ChatSession(user_id=user.id)
+        db.add(chat_session)
+        db.commit()
+        batch = ChatBatchCreate(questions=['first?', 'second?'], session_id=chat_session.id)
+        response = asyncio.run(chat_service.answer_batch_helper(batch, db, user))
+        saved = [message.context for message in db.query(ChatMessage).order_by(ChatMessage.id)]
+
+    assert [result['status'] for result in response['results']] == ['answered', 'unavailable']
+    assert response['results'][1]['answer'] is None
+    assert saved == ['first?', 'answer to first?']
@@ -0,0 +1,50 @@
+import pytest
+
+pytest.importorskip('numpy')
+from app.rag.keyword_index import KeywordIndex, reconcile_with_vector_store    # noqa: E402
+from app.rag.stores.memmap import MemmapVectorStore     # noqa: E402
+
+
+def chunks(start: int, end: int):
+    ids = [f'1-{i}' for i in range(start, end)]
+    texts = [f'clause {i} of the travel policy' for i in range(start, end)]
+    metadatas = [{'document_id': 1, 'access_level': 2, 'chunk_index': i} for i in range(start, end)]
+    return ids, texts, metadatas
+
+
+def test_index_saved_before_a_crash_is_rebuilt_from_the_vector_store(tmp_path):
+    store = MemmapVectorStore(str(tmp_path / 'vectors'), None)
+    index = KeywordIndex(str(tmp_path / 'keywords'), save_interval=3600)
+    ids, texts, metadatas = chunks(0, 10)
+    store.add_embedded(ids, texts, [[1.0, float(i)] for i in range(10)], metadatas)
+    index.add(ids, texts, metadatas)
+    index.save()
+
+    # a second ingestion inside the debounce window, then a crash before the scheduled write
+    ids, texts, metadatas = chunks(10, 15)
+    store.add_embedded(ids, texts, [[1.0, float(i)] for i in range(10, 15)], metadatas)
+    index.add(ids, texts, metadatas)
+    index.save()
+    index._save_timer.cancel()
+    store.save()
+
+    restarted = KeywordIndex(str(tmp_path / 'keywords'))
+    assert len(restarted) == 10
+    reconcile_with_vector_store(restarted, store)
+    assert len(restarted) == 15
+    assert [chunk_id for chunk_id, _ in restarted.search('clause 12', 1, [2])] == ['1-12']
+    assert len(KeywordIndex(str(tmp_path / 'keywords'))) == 15     # the rebuild was written
+
+
+def test_matching_index_is_kept(tmp_path):
+    store = MemmapVectorStore(str(tmp_path / 'vectors'), None)
+    index = KeywordIndex(str(tmp_path / 'keywords'))
+    ids, texts, metadatas = chunks(0, 5)
+    store.add_embedded(ids, texts, [[1.0, float(i)] for i in range(5)], metadatas)
+    index.add(ids, texts, metadatas)
+    index.close()
+
+    restarted = KeywordIndex(str(tmp_path / 'keywords'))
+    numbers = dict(restarted._chunk_numbers)
+    reconcile_with_vector_store(restarted, store)
+    assert restarted._chunk_numbers == numbers
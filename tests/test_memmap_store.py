@@ -0,0 +1,79 @@
+import os
+import pytest
+
+np = pytest.importorskip('numpy')
+from app.rag.stores.memmap import MemmapVectorStore
+
+
+ALL_LEVELS = [0, 1, 2]
+
+
+def brute_force(vectors, query, k: int, rows=None):
+    """Row numbers of the exact top-k by cosine similarity"""
+    rows = np.arange(len(vectors)) if rows is None else np.asarray(rows)
+    matrix = vectors[rows] / np.linalg.norm(vectors[rows], axis=1, keepdims=True)
+    scores = matrix @ (query / np.linalg.norm(query))
+    return rows[np.argsort(-scores)[:k]].tolist()
+
+
+@pytest.fixture
+def filled(tmp_path, make_corpus):
+    ids, texts, vectors, metadatas, _ = make_corpus()
+    store = MemmapVectorStore(str(tmp_path / 'vectors'), None, initial_capacity=256)
+    store.add_embedded(ids, texts, vectors, metadatas)
+    return store, (ids, texts, vectors, metadatas)
+
+
+def test_search_is_exact(filled):
+    store, (ids, _, vectors, _) = filled
+    for query in np.random.default_rng(1).standard_normal((20, vectors.shape[1])):
+        hits = store.search(query, 10, ALL_LEVELS)
+        assert [hit.id for hit in hits] == [ids[row] for row in brute_force(vectors, query, 10)]
+        assert [hit.score for hit in hits] == sorted((hit.score for hit in hits), reverse=True)
+
+
+def test_access_levels_and_document_filter(filled):
+    store, (ids, _, vectors, metadatas) = filled
+    query = vectors[0]
+    hits = store.search(query, 10, [2])
+    assert hits and all(hit.metadata['access_level'] == 2 for hit in hits)
+
+    documents = [metadatas[0]['document_id'], metadatas[1]['document_id']]
+    hits = store.search(query, 10, ALL_LEVELS, where={'document_id': {'$in': documents}})
+    allowed = [row for row, metadata in enumerate(metadatas) if metadata['document_id'] in documents]
+    assert [hit.id for hit in hits] == [ids[row] for row in brute_force(vectors, query, 10, allowed)]
+
+
+def test_upsert_and_delete(filled):
+    store, (ids, texts, vectors, metadatas) = filled
+    store.add_embedded(ids[:1], ['replaced'], -vectors[:1], metadatas[:1])
+    assert store.get(ids=ids[:1])['documents'] == ['replaced']
+    assert store.stats()['chunks'] == len(ids)
+
+    document_id = metadatas[0]['document_id']
+    store.delete(where={'document_id': document_id})
+    assert store.get(where={'document_id': document_id})['ids'] == []
+    assert all(hit.metadata['document_id'] != document_id for hit in store.search(vectors[0], 20, ALL_LEVELS))
+
+
+def test_reopen_keeps_rows(filled):
+    store, (ids, _, vectors, _) = filled
+    store.save()
+    reopened = MemmapVectorStore(store.directory, None)
+    assert reopened.stats()['chunks'] == len(ids)
+    assert [hit.id for hit in reopened.search(vectors[5], 10, ALL_LEVELS)] == [hit.id for hit in store.search(vectors[5], 10, ALL_LEVELS)]
+
+
+def test_compaction_drops_dead_rows(tmp_path, make_corpus):
+    ids, texts, vectors, metadatas, _ = make_corpus(rows=3000)
+    store = MemmapVectorStore(str(tmp_path / 'vectors'), None, initial_capacity=256)
+    store.add_embedded(ids, texts, vectors, metadatas)
+    store.delete(ids=ids[:2000])
+    store.save()
+
+    assert store.stats()['rows'] == 1000
+    assert sorted(os.listdir(store.directory)) == ['columns.npz', 'records-1.jsonl', 'vectors-1.f32']
+    live = list(range(2000, 3000))
+    query = vectors[2500]
+    assert [hit.id for hit in store.search(query, 10, ALL_LEVELS)] == [ids[row] for row in brute_force(vectors, query, 10, live)]
+    assert [hit.id for hit in MemmapVectorStore(store.directory, None).search(query, 10, ALL_LEVELS)][0] == ids[2500]
@@ -0,0 +1,91 @@
+import gc
+import tracemalloc
+import pytest
+
+pytest.importorskip('pypdf')
+pytest.importorskip('langchain_community')
+from app.rag import loaders
+
+
+def write_pdf(path, pages: int, lines_per_page: int = 20, inherit_resources: bool = False):
+    """Uncompressed PDF with a few lines of Helvetica text on every page (font set on the page tree root if inherit_resources)"""
+    resources = b'/Resources << /Font << /F1 3 0 R >> >>'
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [%s] /Count %d %s >>' % (
+            b' '.join(b'%d 0 R' % (4 + 2 * i) for i in range(pages)), pages, resources if inherit_resources else b''
+        ),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>'
+    ]
+    for i in range(pages):
+        lines = b' '.join(b"(Page %d line %d: the quick brown fox jumps over the lazy dog %d times.) '" % (i + 1, j, i * j) for j in range(lines_per_page))
+        content = b'BT /F1 9 Tf 40 800 Td 11 TL ' + lines + b' ET'
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] %s /Contents %d 0 R >>' % (b'' if inherit_resources else resources, 5 + 2 * i))
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(content), content))
+
+    with open(path, 'wb') as f:
+        f.write(b'%PDF-1.4\n')
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(f.tell())
+            f.write(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+        xref = f.tell()
+        f.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+        f.write(b''.join(b'%010d 00000 n \n' % offset for offset in offsets))
+        f.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref))
+
+
+def chunk_texts(path) -> list[list[str]]:
+    return [[chunk.page_content for chunk in chunks] for _, chunks in loaders.iter_page_chunks(path)]
+
+
+def test_streaming_yields_every_page_in_order(tmp_path):
+    path = str(tmp_path / 'small.pdf')
+    write_pdf(path, pages=3)
+    pages = [(page_number, chunks) for page_number, chunks in loaders.iter_page_chunks(path)]
+    assert [page_number for page_number, _ in pages] == [1, 2, 3]
+    assert all(chunk.page_content.startswith(f'Page {n} line 0') for n, chunks in pages for chunk in chunks[:1])
+    assert loaders.count_pages(path) == 3
+
+
+def test_pages_inherit_resources_from_the_page_tree(tmp_path):
+    inherited, own = str(tmp_path / 'inherited.pdf'), str(tmp_path / 'own.pdf')
+    write_pdf(inherited, pages=2, inherit_resources=True)
+    write_pdf(own, pages=2)
+    reader = loaders.PdfReader(inherited)
+    pages = list(loaders._walk_pages(reader, reader.trailer['/Root'].raw_get('/Pages')))
+    assert [page['/Resources']['/Font']['/F1']['/BaseFont'] for page in pages] == ['/Helvetica'] * 2
+
+    # same text and the same chunks whether the font is set on the pages or on the page tree
+    texts = [page.page_content for page in loaders._iter_pdf_pages(inherited)]
+    assert texts == [page.page_content for page in loaders._iter_pdf_pages(own)]
+    assert all(text.startswith(f'Page {n} line 0') for n, text in enumerate(texts, 1))
+    assert chunk_texts(inherited) == chunk_texts(own)
+
+
+def test_peak_memory_does_not_grow_with_pages_read(tmp_path):
+    # 5,000 pages; memory is sampled on the first page after the 10th and after the last cache drop,
+    # so both samples hold the same state (one parsed page) unless earlier pages are kept around
+    path = str(tmp_path / 'manual.pdf')
+    write_pdf(path, pages=5000, lines_per_page=5)
+    window = loaders.PDF_CACHE_PAGES
+    early, late = 10 * window + 1, (5000 - 1) // window * window + 1
+    assert early < late
+
+    samples = {}
+    chunk_count = 0
+    tracemalloc.start()
+    try:
+        for page_number, chunks in loaders.iter_page_chunks(path):
+            chunk_count += len(chunks)
+            if page_number in (early, late):
+                gc.collect()
+                samples[page_number] = tracemalloc.get_traced_memory()[0]
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert chunk_count >= 5000
+    growth = samples[late] - samples[early]
+    assert growth < 1024 * 1024, f'memory grew by {growth / 2**20:.1f} MiB between page {early} and page {late}'
+    assert peak < 16 * 1024 * 1024, f'peak {peak / 2**20:.1f} MiB'
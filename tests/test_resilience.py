@@ -0,0 +1,139 @@
+import time
+import asyncio
+import pytest
+from app.rag.resilience import (
+    CircuitBreaker, CircuitOpen, AdaptiveLimiter, Overloaded, is_retryable, backoff_delay
+)
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f'HTTP {status_code}')
+        self.response = type('Response', (), {'status_code': status_code})()
+
+
+# ---------- retries ----------
+@pytest.mark.parametrize('error, retryable', [
+    (asyncio.TimeoutError(), True),
+    (ConnectionResetError(), True),
+    (HTTPError(503), True),
+    (HTTPError(429), True),
+    (HTTPError(400), False),
+    (ValueError('bad prompt'), False)
+])
+def test_is_retryable(error, retryable):
+    assert is_retryable(error) is retryable
+
+
+def test_backoff_is_jittered_and_capped():
+    delays = [backoff_delay(attempt, 0.5, 4) for attempt in range(10) for _ in range(20)]
+    assert all(0 <= delay <= 4 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+# ---------- circuit breaker ----------
+def open_breaker(breaker: CircuitBreaker):
+    for _ in range(breaker.failure_threshold):
+        assert breaker.check() is None
+        breaker.record_failure()
+
+
+def test_circuit_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=30)
+    breaker.record_failure()
+    breaker.record_success()        # a success in between resets the count
+    open_breaker(breaker)
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpen) as raised:
+        breaker.check()
+    assert raised.value.retry_after > 1
+    assert breaker.stats()['rejected'] == 1
+
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    open_breaker(breaker)
+    time.sleep(0.06)
+    assert breaker.state == 'half-open'
+    trial = breaker.check()
+    assert trial is not None
+    with pytest.raises(CircuitOpen):
+        breaker.check()         # only one trial at a time
+
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.check() is None
+
+
+def test_failed_trial_opens_again():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    open_breaker(breaker)
+    time.sleep(0.06)
+    breaker.check()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+
+
+def test_abandoned_trial_frees_the_slot():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.05)
+    open_breaker(breaker)
+    time.sleep(0.06)
+    trial = breaker.check()
+    breaker.abandon_trial(trial)
+    assert breaker.check() is not None
+
+
+# ---------- adaptive concurrency ----------
+def test_limiter_sheds_when_every_slot_is_taken():
+    limiter = AdaptiveLimiter(min_limit=1, max_limit=2, latency_target=10, queue_timeout=0.05)
+
+    async def hold(seconds: float):
+        async with limiter.slot():
+            await asyncio.sleep(seconds)
+
+    async def main():
+        holders = [asyncio.ensure_future(hold(0.2)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        with pytest.raises(Overloaded):
+            await hold(0)
+        await asyncio.gather(*holders)
+
+    asyncio.run(main())
+    assert limiter.stats() == {'limit': 2, 'in_flight': 0, 'shed': 1}
+
+
+def test_limiter_shrinks_on_slow_calls_and_failures_and_grows_back():
+    limiter = AdaptiveLimiter(min_limit=1, max_limit=8, latency_target=0.02, queue_timeout=1)
+
+    async def call(seconds: float = 0, error: Exception = None):
+        async with limiter.slot():
+            await asyncio.sleep(seconds)
+            if error:
+                raise error
+
+    async def main():
+        await call(0.05)        # slower than the target
+        assert limiter.limit == pytest.approx(8 * 0.7)
+        with pytest.raises(TimeoutError):
+            await call(error=TimeoutError())
+        assert limiter.limit == pytest.approx(8 * 0.7 * 0.7)
+        with pytest.raises(ValueError):
+            await call(error=ValueError('bad request'))       # says nothing about load
+        assert limiter.limit == pytest.approx(8 * 0.7 * 0.7)
+        for _ in range(50):
+            await call()
+        assert limiter.limit == 8
+
+    asyncio.run(main())
+
+
+def test_limiter_never_goes_below_the_minimum():
+    limiter = AdaptiveLimiter(min_limit=2, max_limit=4, latency_target=0, queue_timeout=1)
+
+    async def main():
+        for _ in range(10):
+            async with limiter.slot():
+                await asyncio.sleep(0.001)
+
+    asyncio.run(main())
+    assert limiter.limit == 2
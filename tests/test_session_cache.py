@@ -0,0 +1,27 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+from app.rag.session_cache import SessionCandidateCache
+from app.rag.stores.base import SearchHit
+
+
+def hit(chunk_id: str, vector, keyword_match: bool = False) -> SearchHit:
+    return SearchHit(id=chunk_id, text=chunk_id, metadata={'document_id': 1}, score=0.0, embedding=list(vector), keyword_match=keyword_match)
+
+
+def test_follow_up_is_rescored_without_the_previous_keyword_matches():
+    cache = SessionCandidateCache(threshold=0.5, ttl_seconds=60, max_sessions=10)
+    cache.store(7, [2], [hit('close', [1, 0]), hit('keyword', [0, 1], keyword_match=True)])
+
+    hits = cache.lookup(7, [1, 0.1], [2])
+    assert [h.id for h in hits] == ['close', 'keyword']
+    assert hits[0].score == pytest.approx(0.995, abs=1e-3)
+    assert not any(h.keyword_match for h in hits)
+
+
+def test_lookup_misses_below_the_threshold_or_for_other_levels():
+    cache = SessionCandidateCache(threshold=0.9, ttl_seconds=60, max_sessions=10)
+    cache.store(7, [2], [hit('a', [1, 0])])
+    assert cache.lookup(7, [0, 1], [2]) is None
+    assert cache.lookup(7, [1, 0], [1, 2]) is None       # role changed -> candidates dropped
+    assert cache.stats()['misses'] == 2
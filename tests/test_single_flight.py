@@ -0,0 +1,90 @@
+import asyncio
+from app.rag.single_flight import SingleFlight
+
+
+class FakeLLM:
+    """Stands in for the upstream LLM: counts calls, answers after a delay so requests overlap"""
+
+    def __init__(self, delay: float = 0.05, error: Exception = None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def answer(self, question: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return f'answer to {question}'
+
+
+def test_identical_concurrent_questions_make_one_llm_call():
+    flight, llm = SingleFlight(), FakeLLM()
+
+    async def ask():
+        return await flight.run(('what changed?', (2,)), lambda: llm.answer('what changed?'))
+
+    async def main():
+        return await asyncio.gather(*(ask() for _ in range(50)))
+
+    answers = asyncio.run(main())
+    assert llm.calls == 1
+    assert answers == ['answer to what changed?'] * 50
+    assert flight.stats() == {'enabled': True, 'in_flight': 0, 'computations': 1, 'coalesced_requests': 49}
+
+
+def test_different_keys_are_not_coalesced():
+    flight, llm = SingleFlight(), FakeLLM()
+
+    async def main():
+        return await asyncio.gather(*(flight.run(level, lambda: llm.answer('q')) for level in (0, 1, 2)))
+
+    asyncio.run(main())
+    assert llm.calls == 3
+
+
+def test_finished_keys_are_computed_again():
+    flight, llm = SingleFlight(), FakeLLM(delay=0)
+
+    async def main():
+        await flight.run('q', lambda: llm.answer('q'))
+        await flight.run('q', lambda: llm.answer('q'))
+
+    asyncio.run(main())
+    assert llm.calls == 2
+
+
+def test_disabled_calls_every_time():
+    flight, llm = SingleFlight(enabled=False), FakeLLM()
+
+    async def main():
+        await asyncio.gather(*(flight.run('q', lambda: llm.answer('q')) for _ in range(5)))
+
+    asyncio.run(main())
+    assert llm.calls == 5
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    flight, llm = SingleFlight(), FakeLLM()
+
+    async def main():
+        first = asyncio.ensure_future(flight.run('q', lambda: llm.answer('q')))
+        second = asyncio.ensure_future(flight.run('q', lambda: llm.answer('q')))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == 'answer to q'
+    assert llm.calls == 1
+
+
+def test_error_reaches_every_waiter():
+    flight, llm = SingleFlight(), FakeLLM(error=TimeoutError('upstream timed out'))
+
+    async def main():
+        return await asyncio.gather(*(flight.run('q', lambda: llm.answer('q')) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert llm.calls == 1
+    assert all(isinstance(result, TimeoutError) for result in results)
+    assert flight.stats()['in_flight'] == 0
@@ -0,0 +1,83 @@
+import os
+import pytest
+
+np = pytest.importorskip('numpy')
+from app.rag.stores.memmap import MemmapVectorStore
+
+
+ALL_LEVELS = [0, 1, 2]
+
+
+def recall_at_k(store, exact, queries, k: int = 10) -> float:
+    """Share of the exact store's top-k the quantized store finds"""
+    found = 0
+    for query in queries:
+        expected = {hit.id for hit in exact.search(query, k, ALL_LEVELS)}
+        found += len(expected & {hit.id for hit in store.search(query, k, ALL_LEVELS)})
+    return found / (k * len(queries))
+
+
+@pytest.fixture
+def corpus(make_corpus):
+    ids, texts, vectors, metadatas, _ = make_corpus(rows=4000, dim=128, decay=16)
+    queries = vectors[::97] + 0.3 * np.random.default_rng(1).standard_normal((len(vectors[::97]), 128)).astype(np.float32)
+    return ids, texts, vectors, metadatas, queries
+
+
+def build(directory, corpus, **options):
+    ids, texts, vectors, metadatas, _ = corpus
+    store = MemmapVectorStore(str(directory), None, **options)
+    store.add_embedded(ids, texts, vectors, metadatas)
+    return store
+
+
+@pytest.mark.parametrize('quantization, truncate_dim, min_recall', [
+    ('float16', 0, 0.99),
+    ('int8', 0, 0.98),
+    ('float16', 32, 0.9),
+    ('int8', 32, 0.9)
+])
+def test_recall_against_the_uncompressed_index(tmp_path, corpus, quantization, truncate_dim, min_recall):
+    exact = build(tmp_path / 'exact', corpus)
+    store = build(tmp_path / 'quantized', corpus, quantization=quantization, truncate_dim=truncate_dim, rescore_factor=4)
+    assert recall_at_k(store, exact, corpus[4]) >= min_recall
+
+
+def test_hits_are_rescored_exactly(tmp_path, corpus):
+    exact = build(tmp_path / 'exact', corpus)
+    store = build(tmp_path / 'quantized', corpus, quantization='int8', truncate_dim=32)
+    query = corpus[4][0]
+    exact_scores = {hit.id: hit.score for hit in exact.search(query, 50, ALL_LEVELS)}
+    for hit in store.search(query, 10, ALL_LEVELS):
+        assert hit.score == pytest.approx(exact_scores[hit.id], abs=1e-5)
+
+
+def test_codes_are_smaller_than_the_vectors(tmp_path, corpus):
+    store = build(tmp_path / 'quantized', corpus, quantization='int8', truncate_dim=32)
+    assert store.stats()['code_dim'] == 32
+    assert store._codes.nbytes * 16 == store._vectors.nbytes        # 1 byte x 32 dimensions vs 4 bytes x 128
+
+
+def test_turning_quantization_on_encodes_stored_vectors(tmp_path, corpus):
+    exact = build(tmp_path / 'vectors', corpus)
+    exact.save()
+    store = MemmapVectorStore(exact.directory, None, quantization='float16')
+    assert os.path.exists(store._codes_path())
+    assert recall_at_k(store, exact, corpus[4]) >= 0.99
+
+
+def test_compaction_keeps_the_codes(tmp_path, corpus):
+    ids = corpus[0]
+    store = build(tmp_path / 'quantized', corpus, quantization='int8')
+    store.delete(ids=ids[:3000])
+    store.save()
+    assert 'codes-1-int8128.bin' in os.listdir(store.directory)
+    reopened = MemmapVectorStore(store.directory, None, quantization='int8')
+    live = set(ids[3000:])
+    assert all(hit.id in live for hit in reopened.search(corpus[2][3500], 10, ALL_LEVELS))
+    assert reopened.search(corpus[2][3500], 1, ALL_LEVELS)[0].id == ids[3500]
+
+
+def test_unknown_quantization_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        MemmapVectorStore(str(tmp_path), None, quantization='int4')